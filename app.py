@@ -3,31 +3,67 @@
 # stats.wwdt.me is relased under the terms of the Apache License 2.0
 """Flask application startup file"""
 
-from collections import OrderedDict
-from datetime import date, datetime
+from datetime import date
+from functools import partial
 import json
+import time
 import traceback
+from typing import Dict
 
-from dateutil import parser
-from flask import current_app, Flask, redirect, render_template, Response, url_for
+import click
+from flask import current_app, Flask, redirect, render_template, request, url_for
 from flask.logging import create_logger
 import mysql.connector
 import pytz
-from slugify import slugify
 from werkzeug.exceptions import HTTPException
-from wwdtm import (guest as ww_guest, host as ww_host,
-                   location as ww_location, panelist as ww_panelist,
-                   scorekeeper as ww_scorekeeper, show as ww_show)
 from wwdtm import VERSION as WWDTM_VERSION
-from stats import dicts, random, utility
-from stats.shows import on_this_day
-from stats.locations import formatting
+from stats import dicts, utility, view_models
+from stats.assets import AssetManifest
+from stats.circuit_breaker import (CircuitBreaker, CircuitOpenError, STALE_HEADER,
+                                   StaleResponseCache)
+from stats.compression import ResponseCompressor
+from stats.data_version import DataVersionTracker
+from stats.replicas import (DATABASE_ERRORS, Replica, ReplicaRouter,
+                            SELECTION_LEAST_LATENCY)
+from stats.services import ServiceRegistry
+from stats.sqlite_backend import SQLiteConnection
+from stats.sqlite_check import passed_check, record_check
+from stats.templating import compile_templates, create_bytecode_cache
+from stats.view_models import ViewModelCache
+from stats.views import register_blueprints
 
 #region Global Constants
 APP_VERSION = "4.7.0.1"
 
 DEFAULT_RECENT_DAYS_AHEAD = 2
 DEFAULT_RECENT_DAYS_BACK = 30
+DEFAULT_DATA_VERSION_CHECK_INTERVAL = 60
+DEFAULT_COMPRESSION_MIN_SIZE = 1024
+DEFAULT_COMPRESSION_GZIP_LEVEL = 6
+DEFAULT_COMPRESSION_BROTLI_QUALITY = 5
+DEFAULT_COMPRESSION_CACHE_ENTRIES = 128
+DEFAULT_COMPRESSION_CACHE_TTL = 300
+DEFAULT_FRAGMENT_CACHE_ENTRIES = 4096
+DEFAULT_PAGE_SIZE = 25
+DEFAULT_SQLITE_PATH = "wwdtm.sqlite3"
+DEFAULT_GUEST_LEADERBOARD_PATH = "guest_leaderboard.sqlite3"
+DEFAULT_REPLICA_HEALTH_CHECK_INTERVAL = 30
+DEFAULT_REPLICA_EJECT_AFTER_FAILURES = 3
+DEFAULT_REPLICA_EJECT_SECONDS = 60
+DEFAULT_REPLICA_MAX_LATENCY_MS = 500
+DEFAULT_CIRCUIT_FAILURE_THRESHOLD = 5
+DEFAULT_CIRCUIT_FAILURE_WINDOW = 30
+DEFAULT_CIRCUIT_LATENCY_THRESHOLD_MS = 2000
+DEFAULT_CIRCUIT_OPEN_SECONDS = 30
+DEFAULT_STALE_RESPONSE_ENTRIES = 512
+DEFAULT_STALE_RESPONSE_MAX_MB = 16
+DEFAULT_SLOW_LOG_PATH = "slow_log.jsonl"
+DEFAULT_MEMORY_SNAPSHOT_INTERVAL = 50
+DEFAULT_MEMORY_TOP_SITES = 10
+DEFAULT_SLOW_REQUEST_THRESHOLD_MS = 500
+DEFAULT_SLOW_QUERY_THRESHOLD_MS = 100
+DEFAULT_REPLAY_CACHE_SIZES = (64, 256, 1024)
+DEFAULT_IMPORT_REPORT_LIMIT = 20
 #endregion
 
 #region Flask App Initialization
@@ -37,8 +73,9 @@ app_logger = create_logger(app)
 
 # Override base Jinja options
 app.jinja_options = Flask.jinja_options.copy()
-app.jinja_options.update({"trim_blocks": True, "lstrip_blocks": True})
-app.create_jinja_environment()
+app.jinja_options.update({"trim_blocks": True,
+                          "lstrip_blocks": True,
+                          "extensions": ["stats.fragment_cache.FragmentCacheExtension"]})
 
 #endregion
 
@@ -62,51 +99,166 @@ def load_config():
 
     return config_dict
 
-#endregion
+def load_int_setting(name: str, default: int) -> int:
+    """Returns an integer value for a given settings key, or the default
+    value if the key is missing or contains an invalid value"""
+    try:
+        if name in config["settings"]:
+            return int(config["settings"][name])
 
-#region Common Functions
-def redirect_url(url: str):
-    """Returns a redirect response for a given URL"""
-
-    # Use a custom response class to force set response headers
-    # and handle the redirect to prevent browsers from caching redirect
-    response = current_app.response_class(response=None,
-                                          status=302,
-                                          mimetype="text/plain")
-
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = 0
-    response.headers["Location"] = url
-    return response
-
-def retrieve_show_dates(reverse_order: bool = False):
-    """Retrieve a list of available show dates"""
-    database_connection.reconnect()
-    show_dates = ww_show.info.retrieve_all_dates_tuple(database_connection)
-    if show_dates and reverse_order:
-        show_dates.reverse()
-
-    return show_dates
-
-def retrieve_show_years(reverse_order: bool = True):
-    """Retrieve a list of available show years"""
-    database_connection.reconnect()
-    years = ww_show.info.retrieve_years(database_connection)
-    if years and reverse_order:
-        years.reverse()
-
-    return years
-
-def retrieve_show_years_months(reverse_order: bool = False):
-    """Retrieve a list of available show years and months"""
-    database_connection.reconnect()
-    years_months = ww_show.info.retrieve_all_show_years_months_tuple(database_connection)
-    if years_months and reverse_order:
-        years_months.reverse()
-
-    return years_months
+        return default
+    except TypeError:
+        app_logger.warning("Invalid value type in settings.%s. "
+                           "Using default value of %s", name, default)
+        return default
+    except ValueError:
+        app_logger.warning("Invalid value in settings.%s. "
+                           "Using default value of %s", name, default)
+        return default
+
+def preforking_server() -> bool:
+    """Returns whether the application is being loaded by the uWSGI master
+    process before it forks its workers, rather than by each worker with
+    lazy-apps or by the development server"""
+    try:
+        # pylint: disable=import-outside-toplevel
+        import uwsgi
+    except ImportError:
+        return False
+
+    return not any(uwsgi.opt.get(option) in (True, b"true", b"1", "true", "1")
+                   for option in ("lazy", "lazy-apps"))
+
+def open_mysql_connection(connection_args: Dict):
+    """Open a MySQL connection using the given connection arguments"""
+    connection = mysql.connector.connect(**connection_args)
+    connection.autocommit = True
+    return connection
+
+def checked_versions() -> Dict[str, str]:
+    """Returns the libwwdtm and application versions recorded by
+    check-sqlite"""
+    return {"wwdtm": WWDTM_VERSION, "app": APP_VERSION}
+
+def connect_database() -> ReplicaRouter:
+    """Returns a router for the configured database backend. The sqlite
+    backend reads from a local snapshot created by export-sqlite once
+    check-sqlite has passed against it for the installed libwwdtm and
+    application versions, while the mysql backend routes reads across the
+    replicas listed in database_replicas, or the primary database if none
+    are listed."""
+    replicas = []
+    use_sqlite = config["settings"].get("database_backend", "mysql") == "sqlite"
+    sqlite_path = config.get("sqlite", {}).get("path", DEFAULT_SQLITE_PATH)
+    if use_sqlite and not passed_check(sqlite_path, checked_versions()):
+        app_logger.warning("check-sqlite has not passed against %s for libwwdtm %s; "
+                           "reading from MySQL instead", sqlite_path, WWDTM_VERSION)
+        use_sqlite = False
+
+    if use_sqlite:
+        replicas.append(Replica("sqlite",
+                                partial(SQLiteConnection,
+                                        sqlite_path,
+                                        time_zone=config["settings"]["app_time_zone"])))
+    else:
+        for replica_config in config.get("database_replicas") or [{}]:
+            connection_args = dict(config["database"])
+            connection_args.update(replica_config)
+            name = connection_args.pop("name", None) or connection_args["host"]
+            weight = int(connection_args.pop("weight", 1))
+            replicas.append(Replica(name,
+                                    partial(open_mysql_connection, connection_args),
+                                    weight=weight))
+
+    max_latency = load_int_setting("replica_max_latency_ms",
+                                   DEFAULT_REPLICA_MAX_LATENCY_MS) / 1000
+    if config["settings"].get("circuit_breaker_enabled", True):
+        circuit_breaker = CircuitBreaker(
+            failure_threshold=load_int_setting("circuit_failure_threshold",
+                                               DEFAULT_CIRCUIT_FAILURE_THRESHOLD),
+            failure_window=load_int_setting("circuit_failure_window",
+                                            DEFAULT_CIRCUIT_FAILURE_WINDOW),
+            latency_threshold=load_int_setting("circuit_latency_threshold_ms",
+                                               DEFAULT_CIRCUIT_LATENCY_THRESHOLD_MS) / 1000,
+            open_seconds=load_int_setting("circuit_open_seconds",
+                                          DEFAULT_CIRCUIT_OPEN_SECONDS))
+        circuit_breaker.init_app(app)
+    else:
+        circuit_breaker = None
+
+    router = ReplicaRouter(
+        replicas,
+        selection=config["settings"].get("replica_selection", SELECTION_LEAST_LATENCY),
+        health_check_interval=load_int_setting("replica_health_check_interval",
+                                               DEFAULT_REPLICA_HEALTH_CHECK_INTERVAL),
+        eject_after_failures=load_int_setting("replica_eject_after_failures",
+                                              DEFAULT_REPLICA_EJECT_AFTER_FAILURES),
+        eject_seconds=load_int_setting("replica_eject_seconds",
+                                       DEFAULT_REPLICA_EJECT_SECONDS),
+        max_latency=max_latency,
+        circuit_breaker=circuit_breaker)
+    router.init_app(app)
+    return router
+
+def compression_cache_key(response):
+    """Returns the key used to cache the compressed body of a response:
+    the request URL and the current data version. Stale responses, and
+    responses served while the data version cannot be checked, are not
+    cached."""
+    if STALE_HEADER in response.headers:
+        return None
 
+    try:
+        return (request.url, data_version.current())
+    except (CircuitOpenError, ) + DATABASE_ERRORS:
+        return None
+
+#endregion
+
+#region Service Factory Functions
+# pylint: disable=import-outside-toplevel
+def create_guest_leaderboard():
+    """Returns the guest leaderboard"""
+    from stats.guests.leaderboard import GuestLeaderboard
+    return GuestLeaderboard(database_connection,
+                            data_version,
+                            path=config["settings"].get("guest_leaderboard_path",
+                                                        DEFAULT_GUEST_LEADERBOARD_PATH))
+
+def create_location_index_cache():
+    """Returns the location index cache"""
+    from stats.locations.index import LocationIndexCache
+    return LocationIndexCache(database_connection, data_version)
+
+def create_panelist_comparison_cache():
+    """Returns the panelist comparison cache"""
+    from stats.panelists.comparison import PanelistComparisonCache
+    return PanelistComparisonCache(database_connection, data_version)
+
+def create_panelist_milestones_cache():
+    """Returns the panelist milestones cache"""
+    from stats.panelists.milestones import PanelistMilestonesCache
+    return PanelistMilestonesCache(database_connection, data_version)
+
+def create_recent_shows_cache():
+    """Returns the recent shows cache"""
+    from stats.shows.recent import RecentShowsCache
+    return RecentShowsCache(database_connection,
+                            data_version,
+                            time_zone=config["settings"]["app_time_zone"],
+                            days_ahead=load_int_setting("recent_days_ahead",
+                                                        DEFAULT_RECENT_DAYS_AHEAD),
+                            days_back=load_int_setting("recent_days_back",
+                                                       DEFAULT_RECENT_DAYS_BACK))
+
+def create_year_in_review_cache():
+    """Returns the year in review cache"""
+    from stats.shows.year_in_review import YearInReviewCache
+    return YearInReviewCache(database_connection,
+                             data_version,
+                             time_zone=config["settings"]["app_time_zone"])
+
+# pylint: enable=import-outside-toplevel
 #endregion
 
 #region Filters
@@ -126,6 +278,18 @@ def handle_exception(error):
     if isinstance(error, HTTPException):
         return error
 
+    # Serve the last good copy of the page, if there is one, while the
+    # database is unavailable
+    if isinstance(error, (CircuitOpenError, ) + DATABASE_ERRORS):
+        response = stale_response_cache.response() if stale_response_cache else None
+        if response:
+            return response
+
+        if isinstance(error, CircuitOpenError):
+            response = current_app.make_response((render_template("errors/503.html"), 503))
+            response.headers["Retry-After"] = str(error.retry_after)
+            return response
+
     # Handle everything else with a basic 500 error page
     error_traceback = traceback.format_exc()
     app_logger.error(error_traceback)
@@ -157,48 +321,10 @@ def search_page():
 @app.route("/")
 def index():
     """Default page that includes details for recent shows"""
-    database_connection.reconnect()
-
-    try:
-        if "recent_days_ahead" in config["settings"]:
-            days_ahead = int(config["settings"]["recent_days_ahead"])
-        else:
-            days_ahead = DEFAULT_RECENT_DAYS_AHEAD
-    except TypeError:
-        app_logger.warning("Invalid value type in settings.recent_days_ahead. "
-                           "Using default value of %s", DEFAULT_RECENT_DAYS_AHEAD)
-        days_ahead = DEFAULT_RECENT_DAYS_AHEAD
-    except ValueError:
-        app_logger.warning("Invalid value in settings.recent_days_ahead. "
-                           "Using default value of %s", DEFAULT_RECENT_DAYS_AHEAD)
-        days_ahead = DEFAULT_RECENT_DAYS_AHEAD
-
-    try:
-        if "recent_days_back" in config["settings"]:
-            days_back = int(config["settings"]["recent_days_back"])
-        else:
-            days_back = DEFAULT_RECENT_DAYS_BACK
-    except TypeError:
-        app_logger.warning("Invalid value type in settings.recent_days_back. "
-                           "Using default value of %s", DEFAULT_RECENT_DAYS_AHEAD)
-        days_back = DEFAULT_RECENT_DAYS_BACK
-    except ValueError:
-        app_logger.warning("Invalid value in settings.recent_days_back. "
-                           "Using default value of %s", DEFAULT_RECENT_DAYS_AHEAD)
-        days_back = DEFAULT_RECENT_DAYS_BACK
-
-    try:
-        recent_shows = ww_show.details.retrieve_recent(database_connection,
-                                                       include_days_ahead=days_ahead,
-                                                       include_days_back=days_back)
-        recent_shows.reverse()
-    except AttributeError:
-        recent_shows = ww_show.details.retrieve_recent(database_connection)
-        recent_shows.reverse()
+    recent_shows = services["recent_shows_cache"].retrieve()
 
     return render_template("pages/index.html",
-                           shows=recent_shows,
-                           format_location_name=formatting.format_location_name)
+                           shows=view_models.shows_view(recent_shows))
 
 #endregion
 
@@ -215,600 +341,274 @@ def site_history():
 
 #endregion
 
-#region Sitemap XML Route
-@app.route("/sitemap.xml")
-def sitemap_xml():
-    """Default Sitemap XML"""
-    show_years = retrieve_show_years(reverse_order=False)
-    sitemap = render_template("sitemaps/sitemap.xml",
-                              show_years=show_years)
-    return Response(sitemap, mimetype="text/xml")
-
-@app.route("/sitemap-guests.xml")
-def sitemap_guest_xml():
-    """Supplementary Sitemap XML for Guest Pages"""
-    database_connection.reconnect()
-    guests = ww_guest.info.retrieve_all(database_connection)
-    sitemap = render_template("sitemaps/guests.xml",
-                              guests=guests)
-    return Response(sitemap, mimetype="text/xml")
-
-@app.route("/sitemap-hosts.xml")
-def sitemap_host_xml():
-    """Supplementary Sitemap XML for Host Pages"""
-    database_connection.reconnect()
-    hosts = ww_host.info.retrieve_all(database_connection)
-    sitemap = render_template("sitemaps/hosts.xml",
-                              hosts=hosts)
-    return Response(sitemap, mimetype="text/xml")
-
-@app.route("/sitemap-locations.xml")
-def sitemap_location_xml():
-    """Supplementary Sitemap XML for Location Pages"""
-    database_connection.reconnect()
-    locations = ww_location.info.retrieve_all(database_connection,
-                                              sort_by_venue=True)
-    sitemap = render_template("sitemaps/locations.xml",
-                              locations=locations)
-    return Response(sitemap, mimetype="text/xml")
-
-@app.route("/sitemap-panelists.xml")
-def sitemap_panelist_xml():
-    """Supplementary Sitemap XML for Panelist Pages"""
-    database_connection.reconnect()
-    panelists = ww_panelist.info.retrieve_all(database_connection)
-    sitemap = render_template("sitemaps/panelists.xml",
-                              panelists=panelists)
-    return Response(sitemap, mimetype="text/xml")
-
-@app.route("/sitemap-scorekeepers.xml")
-def sitemap_scorekeeper_xml():
-    """Supplementary Sitemap XML for Scorekeeper Pages"""
-    database_connection.reconnect()
-    scorekeepers = ww_scorekeeper.info.retrieve_all(database_connection)
-    sitemap = render_template("sitemaps/scorekeepers.xml",
-                              scorekeepers=scorekeepers)
-    return Response(sitemap, mimetype="text/xml")
-
-@app.route("/sitemap-shows.xml")
-def sitemap_shows_xml():
-    """Supplementary Sitemap XML for Show Pages"""
-    show_dates = retrieve_show_dates(reverse_order=False)
-    show_years_months = retrieve_show_years_months(reverse_order=False)
-    sitemap = render_template("sitemaps/shows.xml",
-                              show_dates=show_dates,
-                              show_years_months=show_years_months)
-    return Response(sitemap, mimetype="text/xml")
-
-#endregion
-
-#region Guest Routes
-@app.route("/guest")
-def get_guest():
-    """Redirect /guest to /guests"""
-    return redirect(url_for("get_guests"), code=301)
-
-@app.route("/guests")
-def get_guests():
-    """Presents a list of Not My Job guests"""
-    database_connection.reconnect()
-    guests_list = ww_guest.info.retrieve_all(database_connection)
-
-    if not guests_list:
-        return redirect(url_for("index"))
-
-    return render_template("guests/guests.html", guests=guests_list)
-
-@app.route("/guests/<string:guest>")
-def get_guest_details(guest: str):
-    """Presents appearance details for a Not My Job guest"""
-    guest_slug = slugify(guest)
-    if guest and guest != guest_slug:
-        return redirect(url_for("get_guest_details", guest=guest_slug))
-
-    database_connection.reconnect()
-    guest_details = ww_guest.details.retrieve_by_slug(guest_slug,
-                                                      database_connection)
-
-    if not guest_details:
-        return redirect(url_for("get_guests"))
-
-    # Template expects a list of guests(s)
-    guests = []
-    guests.append(guest_details)
-    return render_template("guests/single.html",
-                           guest_name=guest_details["name"],
-                           guests=guests)
-
-@app.route("/guests/all")
-def get_guests_all():
-    """Presents appearance details for all Not My Job guests"""
-    database_connection.reconnect()
-    guests = ww_guest.details.retrieve_all(database_connection)
-
-    if not guests:
-        return redirect(url_for("get_guests"))
-
-    return render_template("guests/all.html", guests=guests)
-
-@app.route("/guests/random")
-def get_guests_random():
-    """Presents a random guest from the database"""
-    database_connection.reconnect()
-    guest_slug = random.random_guest_slug(database_connection)
-
-    return redirect_url(url_for("get_guest_details",
-                                guest=guest_slug
-                               ))
-
-#endregion
-
-
-#region Host Routes
-@app.route("/host")
-def get_host():
-    """Redirect /host to /hosts"""
-    return redirect(url_for("get_hosts"), code=301)
-
-@app.route("/hosts")
-def get_hosts():
-    """Presents a list of show hosts"""
-    database_connection.reconnect()
-    hosts_list = ww_host.info.retrieve_all(database_connection)
-
-    if not hosts_list:
-        return redirect(url_for("index"))
-
-    return render_template("hosts/hosts.html", hosts=hosts_list)
-
-@app.route("/hosts/<string:host>")
-def get_host_details(host: str):
-    """Presents appearance details for a show host"""
-    database_connection.reconnect()
-    host_slug = slugify(host)
-    if host and host != host_slug:
-        return redirect(url_for("get_host_details", host=host_slug))
-
-    host_details = ww_host.details.retrieve_by_slug(host_slug,
-                                                    database_connection)
-
-    if not host_details:
-        return redirect(url_for("get_hosts"))
-
-    # Template expects a list of hosts(s)
-    hosts = []
-    hosts.append(host_details)
-    return render_template("hosts/single.html",
-                           host_name=host_details["name"],
-                           hosts=hosts)
-
-@app.route("/hosts/all")
-def get_hosts_all():
-    """Presents appearance details for all show hosts"""
-    database_connection.reconnect()
-    hosts = ww_host.details.retrieve_all(database_connection)
-
-    if not hosts:
-        return redirect(url_for("get_hosts"))
-
-    return render_template("hosts/all.html", hosts=hosts)
-
-@app.route("/hosts/random")
-def get_hosts_random():
-    """Presents a random host from the database"""
-    database_connection.reconnect()
-    host_slug = random.random_host_slug(database_connection)
-
-    return redirect_url(url_for("get_host_details",
-                                host=host_slug
-                               ))
-
-#endregion
-
-
-#region Location Routes
-@app.route("/location")
-def get_location():
-    """Redirect /location to /locations"""
-    return redirect(url_for("get_locations"), code=301)
-
-@app.route("/locations")
-def get_locations():
-    """Presents a list of locations"""
-    database_connection.reconnect()
-    location_list = ww_location.info.retrieve_all(database_connection,
-                                                  sort_by_venue=True)
-
-    if not location_list:
-        return redirect(url_for("index"))
-
-    return render_template("locations/locations.html",
-                           locations=location_list,
-                           format_location_name=formatting.format_location_name)
-
-@app.route("/locations/<string:location>")
-def get_location_details(location: str):
-    """Presents location details and recordings for a location"""
-    database_connection.reconnect()
-    location_slug = slugify(location)
-    if location and location != location_slug:
-        return redirect(url_for("get_location_details",
-                                location=location_slug))
-
-    location_details = ww_location.details.retrieve_recordings_by_slug(location_slug,
-                                                                       database_connection)
-
-    if not location_details:
-        return redirect(url_for("get_locations"))
-
-    # Redirect back to /locations for certain placeholder locations
-    if "id" in location_details and (location_details["id"] == 3 or
-                                     location_details["id"] == 38):
-        return redirect(url_for("get_locations"))
-
-    # Template expects a list of location(s)
-    locations = []
-    locations.append(location_details)
-    location_name = formatting.format_location_name(location_details)
-    return render_template("locations/single.html",
-                           locations=locations,
-                           location_name=location_name,
-                           format_location_name=formatting.format_location_name)
-
-@app.route("/locations/all")
-def get_locations_all():
-    """Presents location details and recordings for all locations"""
-    database_connection.reconnect()
-    locations = ww_location.details.retrieve_all_recordings(database_connection,
-                                                            sort_by_venue=True)
-
-    if not locations:
-        return redirect(url_for("get_locations"))
-
-    return render_template("locations/all.html",
-                           locations=locations,
-                           format_location_name=formatting.format_location_name)
-
-@app.route("/locations/random")
-def get_locations_random():
-    """Presents a random location from the database"""
-    database_connection.reconnect()
-    location_slug = random.random_location_slug(database_connection)
-
-    return redirect_url(url_for("get_location_details",
-                                location=location_slug
-                               ))
-
-#endregion
-
-
-#region Panelist Routes
-@app.route("/panelist")
-def get_panelist():
-    """Redirect /panelist to /panelists"""
-    return redirect(url_for("get_panelists"), code=301)
-
-@app.route("/panelists")
-def get_panelists():
-    """Presents a list of panelists"""
-    database_connection.reconnect()
-    panelist_list = ww_panelist.info.retrieve_all(database_connection)
-
-    if not panelist_list:
-        return redirect(url_for("index"))
-
-    return render_template("panelists/panelists.html", panelists=panelist_list)
-
-@app.route("/panelists/<string:panelist>")
-def get_panelist_details(panelist: str):
-    """Presents statistics and appearance details for a panelist"""
-    database_connection.reconnect()
-    panelist_slug = slugify(panelist)
-    if panelist and panelist != panelist_slug:
-        return redirect(url_for("get_panelist_details",
-                                panelist=panelist_slug))
-
-    panelist_details = ww_panelist.details.retrieve_by_slug(panelist_slug,
-                                                            database_connection)
-
-    if not panelist_details:
-        return redirect(url_for("get_panelists"))
-
-    # Template expects a list of panelists(s)
-    panelists = []
-    panelists.append(panelist_details)
-    return render_template("panelists/single.html",
-                           panelist_name=panelist_details["name"],
-                           panelists=panelists)
-
-@app.route("/panelists/all")
-def get_panelists_all():
-    """Presents statistics and appearance details for all panelists"""
-    database_connection.reconnect()
-    panelists = ww_panelist.details.retrieve_all(database_connection)
-
-    if not panelists:
-        return redirect(url_for("get_panelists"))
-
-    return render_template("panelists/all.html", panelists=panelists)
-
-@app.route("/panelists/random")
-def get_panelists_random():
-    """Presents a random panelist from the database"""
-    database_connection.reconnect()
-    panelist_slug = random.random_panelist_slug(database_connection)
-
-    return redirect_url(url_for("get_panelist_details",
-                                panelist=panelist_slug
-                               ))
-
-#endregion
-
-
-#region Scorekeeper Routes
-@app.route("/scorekeeper")
-def get_scorekeeper():
-    """Redirect /scorekeeper to /scorekeepers"""
-    return redirect(url_for("get_scorekeepers"), code=301)
-
-@app.route("/scorekeepers")
-def get_scorekeepers():
-    """Presents a list of scorekeepers"""
-    database_connection.reconnect()
-    scorekeepers_list = ww_scorekeeper.info.retrieve_all(database_connection)
-    if not scorekeepers_list:
-        return redirect(url_for("index"))
-
-    return render_template("scorekeepers/scorekeepers.html",
-                           scorekeepers=scorekeepers_list)
-
-@app.route("/scorekeepers/<string:scorekeeper>")
-def get_scorekeeper_details(scorekeeper: str):
-    """Presents appearance details for a scorekeeper"""
-    database_connection.reconnect()
-    scorekeeper_slug = slugify(scorekeeper)
-    if scorekeeper and scorekeeper != scorekeeper_slug:
-        return redirect(url_for("get_scorekeeper_details",
-                                scorekeeper=scorekeeper_slug))
-
-    scorekeeper_details = ww_scorekeeper.details.retrieve_by_slug(scorekeeper_slug,
-                                                                  database_connection)
-
-    if not scorekeeper_details:
-        return redirect(url_for("get_scorekeepers"))
-
-    # Template expects a list of scorekeepers(s)
-    scorekeepers = []
-    scorekeepers.append(scorekeeper_details)
-    return render_template("scorekeepers/single.html",
-                           scorekeeper_name=scorekeeper_details["name"],
-                           scorekeepers=scorekeepers)
-
-@app.route("/scorekeepers/all")
-def get_scorekeepers_all():
-    """Presents appearance details for all scorekeepers"""
-    database_connection.reconnect()
-    scorekeepers = ww_scorekeeper.details.retrieve_all(database_connection)
-    if not scorekeepers:
-        return redirect(url_for("get_scorekeepers"))
-
-    return render_template("scorekeepers/all.html", scorekeepers=scorekeepers)
-
-@app.route("/scorekeepers/random")
-def get_scorekeepers_random():
-    """Presents a random scorekeeper from the database"""
-    database_connection.reconnect()
-    scorekeeper_slug = random.random_scorekeeper_slug(database_connection)
-
-    return redirect_url(url_for("get_scorekeeper_details",
-                                scorekeeper=scorekeeper_slug
-                               ))
-
-#endregion
-
-
-#region Show Routes
-@app.route("/show")
-def get_show():
-    """Redirect /show to /shows"""
-    return redirect(url_for("get_shows"), code=301)
-
-@app.route("/shows")
-def get_shows():
-    """Presents a list of available show years"""
-    database_connection.reconnect()
-    show_years = retrieve_show_years()
-
-    if not show_years:
-        return redirect(url_for("index"))
-
-    return render_template("shows/shows.html", show_years=show_years)
-
-@app.route("/shows/<int:year>")
-def get_shows_year(year: int):
-    """Presents a list of available show months for a given year"""
-    database_connection.reconnect()
-    try:
-        date_year = date(year=year, month=1, day=1)
-        show_months = ww_show.info.retrieve_months_by_year(show_year=year,
-                                                           database_connection=database_connection)
-
-        if not show_months:
-            return redirect(url_for("get_shows"))
-
-        months = []
-        for month in show_months:
-            months.append(date(year=year, month=month, day=1))
-
-        return render_template("shows/year.html",
-                               year=date_year,
-                               show_months=months)
-    except ValueError:
-        return redirect(url_for("get_shows"))
-
-@app.route("/shows/<string:show_date>")
-def get_shows_date(show_date: str):
-    """Convert an ISO-like date string into a datetime value and
-    redirect the request with the parsed year, month and day"""
-    try:
-        parsed_date = parser.parse(show_date)
-        return redirect(url_for("get_show_year_month_day",
-                                year=parsed_date.year,
-                                month=parsed_date.month,
-                                day=parsed_date.day,
-                                ), code=301)
-    except ValueError:
-        return redirect(url_for("get_shows"))
-
-@app.route("/shows/<int:year>/<int:month>")
-def get_shows_year_month(year: int, month: int):
-    """Presents a list of available shows for a given year and month"""
-    database_connection.reconnect()
-    try:
-        year_month = date(year=year, month=month, day=1)
-        show_list = ww_show.details.retrieve_by_year_month(show_year=year,
-                                                           show_month=month,
-                                                           database_connection=database_connection)
-        if not show_list:
-            return redirect(url_for("get_shows_year", year=year))
-
-        return render_template("shows/year_month.html",
-                               year_month=year_month,
-                               shows=show_list,
-                               format_location_name=formatting.format_location_name)
-    except ValueError:
-        return redirect(url_for("get_shows_year", year=year))
-
-@app.route("/shows/<int:year>/<int:month>/<int:day>")
-def get_show_year_month_day(year: int, month: int, day: int):
-    """Presents show details for a given year, month and day"""
-    database_connection.reconnect()
-    try:
-        show_date = date(year=year, month=month, day=day)
-        details = ww_show.details.retrieve_by_date(show_year=year,
-                                                   show_month=month,
-                                                   show_day=day,
-                                                   database_connection=database_connection)
-        if not details:
-            return redirect(url_for("get_shows_year_month",
-                                    year=year,
-                                    month=month))
-
-        # Template expects a list of show(s)
-        show_list = []
-        show_list.append(details)
-        return render_template("shows/single.html",
-                               show_date=show_date,
-                               shows=show_list,
-                               format_location_name=formatting.format_location_name)
-    except ValueError:
-        return redirect(url_for("get_shows"))
-
-@app.route("/shows/<int:year>/all")
-def get_shows_year_all(year: int):
-    """Presents details for all shows available for a given year"""
-    database_connection.reconnect()
-    shows_list = ww_show.details.retrieve_by_year(show_year=year,
-                                                  database_connection=database_connection)
-    if not shows_list:
-        return redirect(url_for("get_shows_year", year=year))
-
-    return render_template("shows/year_all.html",
-                           year=year,
-                           shows=shows_list,
-                           format_location_name=formatting.format_location_name)
-
-@app.route("/shows/all")
-def get_shows_all():
-    """Presents details for all shows across all available years"""
-    database_connection.reconnect()
-    show_years = retrieve_show_years(reverse_order=False)
-
-    if not show_years:
-        return redirect(url_for("get_shows"))
-
-    show_by_years = OrderedDict()
-    for year in show_years:
-        shows = ww_show.details.retrieve_by_year(show_year=year,
-                                                 database_connection=database_connection)
-        show_by_years[year] = shows
-
-    return render_template("shows/all.html",
-                           show_years=show_years,
-                           shows=show_by_years,
-                           format_location_name=formatting.format_location_name)
-
-@app.route("/shows/on-this-day")
-def get_shows_on_this_day():
-    """Presents details for shows that have aired on this day"""
-    database_connection.reconnect()
-    show_ids = on_this_day.retrieve_on_this_day_show_ids(database_connection)
-
-    show_list = []
-    for show_id in show_ids:
-        show = ww_show.details.retrieve_by_id(show_id=show_id,
-                                              database_connection=database_connection)
-
-        if show:
-            show_list.append(show)
-
-    return render_template("shows/on_this_day.html",
-                           shows=show_list,
-                           format_location_name=formatting.format_location_name)
-
-@app.route("/shows/random")
-def get_shows_random():
-    """Presents a random show from the database"""
-    database_connection.reconnect()
-    show_date = random.random_show_date(database_connection)
-
-    try:
-        parsed_date = parser.parse(show_date)
-        return redirect_url(url_for("get_show_year_month_day",
-                                    year=parsed_date.year,
-                                    month=parsed_date.month,
-                                    day=parsed_date.day,
-                                    ))
-    except ValueError:
-        return redirect(url_for("get_shows"))
-
-@app.route("/shows/recent")
-def get_shows_recent():
-    """Redirects /shows/recent to / as the index page presents a list
-    of recent show details"""
-    return redirect(url_for("index"))
-
-#endregion
-
-
-#region NPR Show Redirect Routes
-@app.route("/s/<string:show_date>")
-def npr_show_redirect(show_date: str):
-    """Takes an ISO-like date string and redirects to the appropriate
-    show page on NPR's website."""
-    database_connection.reconnect()
-    show_date_object = utility.date_string_to_date(date_string=show_date)
-
-    if not show_date_object:
-        return redirect(url_for("index"))
-
-    if ww_show.utility.date_exists(show_year=show_date_object.year,
-                                   show_month=show_date_object.month,
-                                   show_day=show_date_object.day,
-                                   database_connection=database_connection):
-        current_url_prefix = "https://www.npr.org/programs/wait-wait-dont-tell-me/archive?date="
-        legacy_url_prefix = "https://legacy.npr.org/programs/waitwait/archrndwn"
-        legacy_url_suffix = ".waitwait.html"
-        if show_date_object >= datetime(year=2006, month=1, day=7):
-            show_date_string = show_date_object.strftime("%m-%d-%Y")
-            url = f"{current_url_prefix}{show_date_string}"
-        else:
-            show_date_string = show_date_object.strftime("%y%m%d")
-            year = show_date_object.strftime("%Y")
-            month = show_date_object.strftime("%b").lower()
-            url = f"{legacy_url_prefix}/{year}/{month}/{show_date_string}{legacy_url_suffix}"
-
-    return redirect(url)
+#region CLI Commands
+@app.cli.command("benchmark-render")
+@click.option("--iterations", default=5, show_default=True,
+              type=click.IntRange(min=1),
+              help="Number of renders for each page")
+def benchmark_render_command(iterations: int = 5):
+    """Report the time taken to build the view models for /shows/all and
+    /panelists/all and to render each page from them"""
+    # pylint: disable=import-outside-toplevel
+    from stats.templating import measure_render
+    from stats.views.panelists import retrieve_panelists_all_view
+    from stats.views.shows import retrieve_shows_all_view
+
+    pages = (("/shows/all", "shows/all.html", retrieve_shows_all_view,
+              lambda shows: {"show_years": list(shows), "shows": shows}),
+             ("/panelists/all", "panelists/all.html", retrieve_panelists_all_view,
+              lambda panelists: {"panelists": panelists}))
+    for path, template_name, build_view, build_context in pages:
+        with app.test_request_context(path):
+            start_time = time.perf_counter()
+            view_model = build_view()
+            build_time = time.perf_counter() - start_time
+
+        timings = sorted(measure_render(app,
+                                        path,
+                                        template_name,
+                                        build_context(view_model),
+                                        iterations=iterations))
+        print(f"{path}: view model {build_time * 1000:.2f} ms; "
+              f"render min {timings[0] * 1000:.2f} ms, "
+              f"median {timings[len(timings) // 2] * 1000:.2f} ms, "
+              f"max {timings[-1] * 1000:.2f} ms")
+
+@app.cli.command("build-assets")
+def build_assets_command():
+    """Build content-hashed and precompressed copies of static assets"""
+    # pylint: disable=import-outside-toplevel
+    from stats.assets import build_assets
+
+    manifest = build_assets(app.static_folder,
+                            static_url_path=app.static_url_path)
+    for source_path, hashed_path in sorted(manifest.items()):
+        print(f"{source_path} -> {hashed_path}")
+
+@app.cli.command("check-sqlite")
+@click.argument("path", required=False)
+def check_sqlite_command(path: str = None):
+    """Run the libwwdtm and stats package retrievals used by the routes
+    against a SQLite snapshot and report any that fail"""
+    # pylint: disable=import-outside-toplevel
+    from stats.sqlite_check import check_retrievals
+
+    if not path:
+        path = config.get("sqlite", {}).get("path", DEFAULT_SQLITE_PATH)
+
+    connection = SQLiteConnection(path, time_zone=config["settings"]["app_time_zone"])
+    results = check_retrievals(connection)
+    connection.close()
+    for result in results:
+        print(f"{result['name']}: {result['status']} ({result['elapsed_ms']:.2f} ms)")
+        if result["error"]:
+            print(f"    {result['error']}")
+
+    failures = [result for result in results if result["status"] == "error"]
+    if failures:
+        raise click.ClickException(f"{len(failures)} of {len(results)} retrievals "
+                                   f"failed against {path}")
+
+    record_check(path, checked_versions())
+    print(f"All {len(results)} retrievals ran against {path}")
+
+@app.cli.command("compile-templates")
+def compile_templates_command():
+    """Compile all templates and write them to the bytecode cache"""
+    if not app.jinja_env.bytecode_cache:
+        print("Template bytecode cache is not configured; templates will "
+              "only be compiled in memory")
+
+    timings = compile_templates(app.jinja_env)
+    for template_name, elapsed in sorted(timings.items()):
+        print(f"{template_name}: {elapsed * 1000:.2f} ms")
+
+    print(f"Compiled {len(timings)} templates in {sum(timings.values()) * 1000:.2f} ms")
+
+@app.cli.command("export-sqlite")
+@click.argument("path", required=False)
+def export_sqlite_command(path: str = None):
+    """Snapshot the ww_* tables from MySQL into a local SQLite file"""
+    # pylint: disable=import-outside-toplevel
+    from stats.sqlite_backend import export_database
+
+    if not path:
+        path = config.get("sqlite", {}).get("path", DEFAULT_SQLITE_PATH)
+
+    mysql_connection = mysql.connector.connect(**config["database"])
+    row_counts = export_database(mysql_connection, path)
+    mysql_connection.close()
+    for table, row_count in sorted(row_counts.items()):
+        print(f"{table}: {row_count} rows")
+
+    print(f"Exported {len(row_counts)} tables to {path}")
+
+@app.cli.command("import-report")
+@click.option("--module", default="app", show_default=True,
+              help="Module to import")
+@click.option("--limit", default=DEFAULT_IMPORT_REPORT_LIMIT, show_default=True,
+              help="Number of packages and imports to list")
+@click.option("--repeat", default=3, show_default=True,
+              type=click.IntRange(min=1),
+              help="Number of times to import the module")
+@click.option("--json", "as_json", is_flag=True,
+              help="Print the report as JSON")
+def import_report_command(module: str, limit: int, repeat: int, as_json: bool):
+    """Report the time taken to import the application in a new
+    interpreter, as a uWSGI worker does when it spawns or reloads"""
+    # pylint: disable=import-outside-toplevel
+    from stats.import_time import import_time_report
+
+    report = import_time_report(module, limit=limit, repeat=repeat)
+    if not report:
+        print(f"Unable to measure the import time for {module}")
+        return
+
+    if as_json:
+        print(json.dumps(report, indent=2))
+        return
+
+    runs = ", ".join(f"{run:.2f} ms" for run in report["runs_ms"])
+    print(f"{module}: {report['total_ms']:.2f} ms for {report['modules']} modules (runs: {runs})")
+    print()
+    print("Packages by self time:")
+    for package, elapsed in report["packages"].items():
+        print(f"  {package}: {elapsed:.2f} ms")
+
+    print()
+    print("Direct imports by cumulative time:")
+    for name, elapsed in report["direct_imports"].items():
+        print(f"  {name}: {elapsed:.2f} ms")
+
+@app.cli.command("measure-templates")
+def measure_templates_command():
+    """Report template load times with and without the bytecode cache"""
+    # pylint: disable=import-outside-toplevel
+    from stats.templating import measure_template_compilation
+
+    results = measure_template_compilation(app)
+    for label, elapsed in results.items():
+        print(f"{label}: {elapsed * 1000:.2f} ms")
+
+@app.cli.command("slow-log-report")
+@click.argument("path", required=False)
+@click.option("--limit", default=10, show_default=True,
+              help="Number of routes and queries to list")
+def slow_log_report_command(path: str = None, limit: int = 10):
+    """Summarize a slow log by route and by query fingerprint"""
+    # pylint: disable=import-outside-toplevel
+    from stats.slow_log import aggregate_entries, read_log
+
+    if not path:
+        path = config["settings"].get("slow_log_path", DEFAULT_SLOW_LOG_PATH)
+
+    summary = aggregate_entries(read_log(path))
+    print("Slowest routes by total time:")
+    for route, route_summary in list(summary["routes"].items())[:limit]:
+        print(f"  {route}: {route_summary['requests']} requests, "
+              f"{route_summary['total_ms']} ms total, {route_summary['mean_ms']} ms mean, "
+              f"{route_summary['max_ms']} ms max")
+
+    print()
+    print("Slowest queries by total time:")
+    for fingerprint, query_summary in list(summary["queries"].items())[:limit]:
+        routes = ", ".join(f"{route} ({count})"
+                           for route, count in query_summary["routes"].most_common())
+        print(f"  [{fingerprint}] {query_summary['count']} times, "
+              f"{query_summary['total_ms']} ms total, {query_summary['mean_ms']} ms mean, "
+              f"{query_summary['max_ms']} ms max")
+        print(f"    {query_summary['query']}")
+        print(f"    Routes: {routes}")
+        if query_summary["explain"]:
+            for row in query_summary["explain"]:
+                print(f"    EXPLAIN: {json.dumps(row, default=str)}")
+
+def print_replay_report(report: Dict):
+    """Print a replay report as text"""
+    statuses = ", ".join(f"{status}: {count}" for status, count in report["statuses"].items())
+    latencies = ", ".join(f"{label} {value}" for label, value in report["latency_ms"].items())
+    print(f"Requests: {report['requests']} in {report['elapsed']} s "
+          f"({report['throughput']} req/s)")
+    print(f"Error rate: {report['error_rate']:.2%}")
+    print(f"Statuses: {statuses}")
+    print(f"Latency (ms): {latencies}")
+    print()
+    for category, summary in report["categories"].items():
+        latencies = ", ".join(f"{label} {value}"
+                              for label, value in summary["latency_ms"].items())
+        print(f"{category} ({report['route_mix'][category]}%, {summary['requests']} "
+              f"requests, {summary['error_rate']:.2%} errors): {latencies}")
+    print()
+    for simulation in report["cache_simulation"]:
+        if simulation["hit_ratio"] is None:
+            continue
+
+        categories = ", ".join(f"{category} {ratio:.2%}"
+                               for category, ratio in sorted(simulation["categories"].items()))
+        print(f"Simulated cache with {simulation['max_entries']} entries: "
+              f"{simulation['hit_ratio']:.2%} hit ratio ({categories})")
+
+@app.cli.command("replay-log")
+@click.argument("log_file", type=click.File("r"))
+@click.option("--base-url", default=None,
+              help="Replay against a running instance instead of in-process")
+@click.option("--concurrency", default=4, show_default=True,
+              help="Number of concurrent workers when replaying against "
+                   "--base-url; in-process replays use one")
+@click.option("--speed", default=0.0, show_default=True,
+              help="Time compression factor for log timestamps; 0 replays "
+                   "requests as fast as possible")
+@click.option("--limit", default=None, type=int,
+              help="Maximum number of requests to replay")
+@click.option("--include-static", is_flag=True,
+              help="Include requests for static files")
+@click.option("--cache-size", "cache_sizes", multiple=True, type=int,
+              default=DEFAULT_REPLAY_CACHE_SIZES, show_default=True,
+              help="Response cache sizes to simulate")
+@click.option("--cache-ttl", default=None, type=float,
+              help="Response cache TTL in seconds to simulate")
+@click.option("--json", "as_json", is_flag=True,
+              help="Print the report as JSON")
+def replay_log_command(log_file, base_url: str, concurrency: int, speed: float,
+                       limit: int, include_static: bool, cache_sizes,
+                       cache_ttl: float, as_json: bool):
+    """Replay GET requests from an nginx or uWSGI access log and report
+    throughput, latency, error rates and simulated cache hit ratios"""
+    # pylint: disable=import-outside-toplevel,too-many-arguments,too-many-positional-arguments
+    from stats import replay
+
+    requests = replay.parse_log(log_file,
+                                include_static=include_static,
+                                limit=limit)
+    if not requests:
+        print(f"No GET requests found in {log_file.name}")
+        return
+
+    if base_url:
+        fetch = replay.http_client(base_url)
+    else:
+        # Requests served in-process share a single database connection,
+        # which cannot be used by more than one thread at a time
+        fetch = replay.wsgi_client(app)
+        concurrency = 1
+
+    start_time = time.perf_counter()
+    results = replay.replay(requests, fetch, concurrency=concurrency, speed=speed)
+    report = replay.summarize(results, time.perf_counter() - start_time)
+    report["target"] = base_url or "in-process"
+    report["concurrency"] = concurrency
+    report["route_mix"] = replay.route_mix(requests)
+    report["cache_simulation"] = [replay.simulate_cache(requests, size, ttl=cache_ttl)
+                                  for size in cache_sizes]
+
+    if as_json:
+        print(json.dumps(report, indent=2))
+        return
+
+    if not base_url:
+        print("Replayed in-process with a single worker thread. Throughput and "
+              "latency are for one process, not a multi-worker deployment.")
+    print_replay_report(report)
 
 #endregion
 
@@ -817,7 +617,6 @@ config = load_config()
 app.jinja_env.globals["app_version"] = APP_VERSION
 app.jinja_env.globals["libwwdtm_version"] = WWDTM_VERSION
 app.jinja_env.globals["current_date"] = date.today()
-app.jinja_env.globals["date_string_to_date"] = utility.date_string_to_date
 app.jinja_env.globals["ga_property_code"] = config["settings"]["ga_property_code"]
 app.jinja_env.globals["current_year"] = utility.current_year
 app.jinja_env.globals["rank_map"] = dicts.PANELIST_RANKS
@@ -830,8 +629,95 @@ app.jinja_env.globals["graphs_url"] = config["settings"]["graphs_url"]
 app.jinja_env.globals["reports_url"] = config["settings"]["reports_url"]
 app.jinja_env.globals["site_url"] = config["settings"]["site_url"]
 
-database_connection = mysql.connector.connect(**config["database"])
-database_connection.autocommit = True
+asset_manifest = AssetManifest(app)
+
+if config["settings"].get("template_bytecode_cache"):
+    app.jinja_env.bytecode_cache = create_bytecode_cache(
+        config["settings"]["template_bytecode_cache"])
+
+# Compiling templates before uWSGI forks workers allows each worker to
+# start with a populated template cache
+if config["settings"].get("template_preload", False):
+    compile_templates(app.jinja_env)
+
+database_connection = connect_database()
+
+data_version = DataVersionTracker(
+    database_connection,
+    check_interval=load_int_setting("data_version_check_interval",
+                                    DEFAULT_DATA_VERSION_CHECK_INTERVAL))
+app.jinja_env.globals["data_version"] = data_version.current
+app.jinja_env.fragment_cache.max_entries = load_int_setting("fragment_cache_entries",
+                                                            DEFAULT_FRAGMENT_CACHE_ENTRIES)
+page_size = load_int_setting("page_size", DEFAULT_PAGE_SIZE)
+
+view_model_cache = ViewModelCache(data_version)
+
+# Caches are created, and the modules they depend on imported, the first
+# time a route uses them
+services = ServiceRegistry()
+services["config"] = config
+services["database_connection"] = database_connection
+services["data_version"] = data_version
+services["page_size"] = page_size
+services["view_model_cache"] = view_model_cache
+services.register("guest_leaderboard", create_guest_leaderboard)
+services.register("location_index_cache", create_location_index_cache)
+services.register("panelist_comparison_cache", create_panelist_comparison_cache)
+services.register("panelist_milestones_cache", create_panelist_milestones_cache)
+services.register("recent_shows_cache", create_recent_shows_cache)
+services.register("year_in_review_cache", create_year_in_review_cache)
+services.init_app(app)
+if config["settings"].get("preload_views") is None:
+    register_blueprints(app, preload=preforking_server())
+else:
+    register_blueprints(app, preload=config["settings"]["preload_views"])
+
+response_compressor = None
+if config["settings"].get("compression_enabled", True):
+    response_compressor = ResponseCompressor(
+        app,
+        min_size=load_int_setting("compression_min_size", DEFAULT_COMPRESSION_MIN_SIZE),
+        gzip_level=load_int_setting("compression_gzip_level", DEFAULT_COMPRESSION_GZIP_LEVEL),
+        brotli_quality=load_int_setting("compression_brotli_quality",
+                                        DEFAULT_COMPRESSION_BROTLI_QUALITY),
+        cache_entries=load_int_setting("compression_cache_entries",
+                                       DEFAULT_COMPRESSION_CACHE_ENTRIES),
+        cache_ttl=load_int_setting("compression_cache_ttl", DEFAULT_COMPRESSION_CACHE_TTL),
+        cache_key=compression_cache_key,
+        streaming=config["settings"].get("compression_streaming", True))
+
+# Registered after the compressor so that responses are stored before
+# they are compressed
+stale_response_cache = None
+if database_connection.circuit_breaker:
+    stale_response_cache = StaleResponseCache(
+        max_entries=load_int_setting("stale_response_entries",
+                                     DEFAULT_STALE_RESPONSE_ENTRIES),
+        max_bytes=load_int_setting("stale_response_max_mb",
+                                   DEFAULT_STALE_RESPONSE_MAX_MB) * 1024 * 1024)
+    stale_response_cache.init_app(app)
+
+slow_log = None
+if config["settings"].get("slow_log_enabled", False):
+    from stats.slow_log import SlowLog  # pylint: disable=import-outside-toplevel
+    slow_log = SlowLog(config["settings"].get("slow_log_path", DEFAULT_SLOW_LOG_PATH),
+                       request_threshold=load_int_setting("slow_request_threshold_ms",
+                                                          DEFAULT_SLOW_REQUEST_THRESHOLD_MS) / 1000,
+                       query_threshold=load_int_setting("slow_query_threshold_ms",
+                                                        DEFAULT_SLOW_QUERY_THRESHOLD_MS) / 1000,
+                       explain=config["settings"].get("slow_log_explain", True))
+    slow_log.init_app(app, database_connection)
+
+memory_monitor = None
+if config["settings"].get("memory_tracing_enabled", False):
+    from stats.memory import MemoryMonitor  # pylint: disable=import-outside-toplevel
+    memory_monitor = MemoryMonitor(
+        tracing=True,
+        snapshot_interval=load_int_setting("memory_snapshot_interval",
+                                           DEFAULT_MEMORY_SNAPSHOT_INTERVAL),
+        top_sites=load_int_setting("memory_top_sites", DEFAULT_MEMORY_TOP_SITES))
+    memory_monitor.init_app(app, report_token=config["settings"].get("memory_report_token"))
 
 if __name__ == "__main__":
     app.run(debug=False, host="0.0.0.0", port="9248")
@@ -1,8 +1,28 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2018-2021 Linh Pham
 # stats.wwdt.me is relased under the terms of the Apache License 2.0
-"""Explicitly listing all stats modules"""
+"""Explicitly listing all stats modules. Modules are imported the first
+time they are accessed, so that importing one module does not import all
+of the others."""
 
-from stats import dicts, locations, random, shows, utility
+import importlib
+from typing import Callable, List
 
-__all__ = ["dicts", "locations", "random", "shows", "utility"]
+__all__ = ["assets", "circuit_breaker", "compression", "data_version",
+           "dicts", "fragment_cache", "guests", "import_time", "locations",
+           "memory", "pagination", "panelists", "random", "replay",
+           "replicas", "services", "shows", "slow_log", "sqlite_backend",
+           "sqlite_check", "templating", "utility", "view_models", "views"]
+
+def lazy_modules(package: str, modules: List[str]) -> Callable:
+    """Returns a module __getattr__ function for a package that imports
+    the listed submodules the first time they are accessed"""
+    def module_getattr(name: str):
+        if name in modules:
+            return importlib.import_module(f"{package}.{name}")
+
+        raise AttributeError(f"module {package!r} has no attribute {name!r}")
+
+    return module_getattr
+
+__getattr__ = lazy_modules(__name__, __all__)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Static asset fingerprinting functions used by the Stats Page"""
+
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+from typing import Dict, List
+
+from flask import Flask, request, Response, send_from_directory, url_for
+
+from stats.compression import (brotli, compress_bytes, negotiate_encoding,
+                               DEFAULT_BROTLI_QUALITY)
+
+#region Constants
+DIST_DIRECTORY = "dist"
+MANIFEST_FILE = "manifest.json"
+HASH_LENGTH = 12
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Extensions of files that are already compressed and do not benefit
+# from having precompressed siblings
+COMPRESSED_EXTENSIONS = (".gif", ".jpeg", ".jpg", ".png", ".webp",
+                         ".woff", ".woff2")
+
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+CSS_URL_PATTERN = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+#endregion
+
+#region Build Functions
+def _file_hash(data: bytes) -> str:
+    """Returns a short content hash for a bytes object"""
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+def _hashed_name(path: str, file_hash: str) -> str:
+    """Inserts a content hash into a path before the file extension"""
+    root, extension = posixpath.splitext(path)
+    return f"{root}.{file_hash}{extension}"
+
+def _rewrite_css_urls(css: str, css_path: str, manifest: Dict[str, str],
+                      static_url_path: str) -> str:
+    """Rewrite url() references in a stylesheet to point to the hashed
+    versions of the referenced files, relative to the hashed stylesheet"""
+    css_directory = posixpath.dirname(css_path)
+
+    def replace_url(match):
+        reference = match.group(2).strip()
+        if reference.startswith(("data:", "http:", "https:", "//", "#")):
+            return match.group(0)
+
+        split_at = len(reference)
+        for delimiter in ("?", "#"):
+            if delimiter in reference:
+                split_at = min(split_at, reference.index(delimiter))
+        target, suffix = reference[:split_at], reference[split_at:]
+
+        prefix = static_url_path.rstrip("/") + "/"
+        if target.startswith(prefix):
+            target = target[len(prefix):]
+        elif target.startswith("/"):
+            return match.group(0)
+        else:
+            target = posixpath.normpath(posixpath.join(css_directory, target))
+
+        if target not in manifest:
+            return match.group(0)
+
+        relative = posixpath.relpath(manifest[target],
+                                     posixpath.join(DIST_DIRECTORY, css_directory))
+        return f"url(\"{relative}{suffix}\")"
+
+    return CSS_URL_PATTERN.sub(replace_url, css)
+
+def _write_file(path: str, data: bytes, brotli_quality: int):
+    """Write a file along with precompressed siblings, if applicable"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as output_file:
+        output_file.write(data)
+
+    if path.lower().endswith(COMPRESSED_EXTENSIONS):
+        return
+
+    for encoding, suffix in ENCODING_SUFFIXES.items():
+        if encoding == "br" and not brotli:
+            continue
+
+        compressed = compress_bytes(data,
+                                    encoding,
+                                    gzip_level=9,
+                                    brotli_quality=brotli_quality)
+        if len(compressed) < len(data):
+            with open(path + suffix, "wb") as output_file:
+                output_file.write(compressed)
+
+def _source_files(static_folder: str, dist_folder: str) -> List[str]:
+    """Returns the paths of all files under the static folder, outside of
+    the dist directory, relative to the static folder"""
+    source_files = []
+    for root, directories, files in os.walk(static_folder):
+        directories[:] = sorted(directory for directory in directories
+                                if os.path.join(root, directory) != dist_folder)
+        for file_name in sorted(files):
+            full_path = os.path.join(root, file_name)
+            relative_path = os.path.relpath(full_path, static_folder)
+            source_files.append(relative_path.replace(os.sep, "/"))
+
+    return source_files
+
+def build_assets(static_folder: str,
+                 static_url_path: str = "/static",
+                 brotli_quality: int = DEFAULT_BROTLI_QUALITY) -> Dict[str, str]:
+    """Copies all files under the static folder into a dist directory
+    with content-hashed file names, writes precompressed .gz and .br
+    siblings and a manifest mapping original paths to hashed paths.
+    Returns the manifest."""
+    dist_folder = os.path.join(static_folder, DIST_DIRECTORY)
+    if os.path.isdir(dist_folder):
+        shutil.rmtree(dist_folder)
+
+    # Stylesheets are processed last so that url() references can be
+    # rewritten to the hashed names of the files they point to
+    source_files = _source_files(static_folder, dist_folder)
+    source_files.sort(key=lambda path: path.endswith(".css"))
+
+    manifest = {}
+    for source_path in source_files:
+        with open(os.path.join(static_folder, source_path), "rb") as source_file:
+            data = source_file.read()
+
+        if source_path.endswith(".css"):
+            css = _rewrite_css_urls(data.decode("utf-8"), source_path,
+                                    manifest, static_url_path)
+            data = css.encode("utf-8")
+
+        hashed_path = posixpath.join(DIST_DIRECTORY,
+                                     _hashed_name(source_path, _file_hash(data)))
+        _write_file(os.path.join(static_folder, hashed_path), data, brotli_quality)
+        manifest[source_path] = hashed_path
+
+    with open(os.path.join(dist_folder, MANIFEST_FILE), "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+
+    return manifest
+
+def load_manifest(static_folder: str) -> Dict[str, str]:
+    """Load the asset manifest, returning an empty dictionary if one has
+    not been built"""
+    manifest_path = os.path.join(static_folder, DIST_DIRECTORY, MANIFEST_FILE)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+
+#endregion
+
+#region Asset Manifest Class
+class AssetManifest:
+    """Rewrites url_for("static", ...) calls in templates to use hashed
+    asset file names and serves hashed assets with long-lived cache
+    headers and precompressed siblings"""
+
+    def __init__(self, app: Flask = None):
+        self.manifest = {}
+        self.hashed_files = set()
+        self.static_folder = None
+        self._static_view = None
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        """Load the manifest and register with a Flask application"""
+        self.static_folder = app.static_folder
+        self.manifest = load_manifest(self.static_folder)
+        self.hashed_files = set(self.manifest.values())
+
+        app.jinja_env.globals["url_for"] = self.url_for
+        if self.manifest:
+            self._static_view = app.view_functions["static"]
+            app.view_functions["static"] = self.send_static_file
+
+    def url_for(self, endpoint: str, **values) -> str:
+        """Wrapper around Flask's url_for that swaps static file names for
+        their hashed equivalents"""
+        if endpoint == "static" and values.get("filename") in self.manifest:
+            values["filename"] = self.manifest[values["filename"]]
+
+        return url_for(endpoint, **values)
+
+    def send_static_file(self, filename: str) -> Response:
+        """Serve a static file. Hashed files are served with an immutable
+        Cache-Control header and, if the client accepts it, from a
+        precompressed sibling file"""
+        if filename not in self.hashed_files:
+            return self._static_view(filename=filename)
+
+        encodings = [encoding for encoding, suffix in ENCODING_SUFFIXES.items()
+                     if os.path.isfile(os.path.join(self.static_folder,
+                                                    filename + suffix))]
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding"),
+                                      encodings) if encodings else None
+        if encoding:
+            mimetype, _ = mimetypes.guess_type(filename)
+            response = send_from_directory(self.static_folder,
+                                           filename + ENCODING_SUFFIXES[encoding],
+                                           mimetype=mimetype or "application/octet-stream")
+            response.headers["Content-Encoding"] = encoding
+        else:
+            response = send_from_directory(self.static_folder, filename)
+
+        if encodings:
+            response.vary.add("Accept-Encoding")
+
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+#endregion
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Database circuit breaker and stale response cache used by the Stats
+Page
+
+The circuit opens once enough database operations fail or run past the
+latency threshold within a rolling window. While it is open, database
+access fails immediately instead of waiting on connection timeouts, and
+pages that have been served successfully before are served from the
+stale response cache. Once the open period has elapsed, a single request
+is let through to probe the database and the circuit closes again if it
+succeeds. A probe that has not finished within another open period is
+assumed to be lost, and the next request takes over as the probe."""
+
+from collections import deque, OrderedDict
+from datetime import datetime, timezone
+import re
+import threading
+import time
+from typing import Optional
+import zlib
+
+from flask import Flask, request, Response
+
+#region Constants
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_FAILURE_WINDOW = 30
+DEFAULT_LATENCY_THRESHOLD = 2.0
+DEFAULT_OPEN_SECONDS = 30
+DEFAULT_STALE_ENTRIES = 512
+DEFAULT_STALE_MAX_BYTES = 16 * 1024 * 1024
+STALE_COMPRESSION_LEVEL = 6
+
+STALE_MIMETYPES = ("application/xml", "text/html", "text/xml")
+STALE_HEADER = "X-Stale-Response"
+
+BODY_TAG_PATTERN = re.compile(rb"<body[^>]*>", re.IGNORECASE)
+STALE_NOTICE = ('<div class="stale-notice">The database is currently '
+                'unavailable. This page was last updated {}.</div>')
+#endregion
+
+#region Exceptions
+class CircuitOpenError(Exception):
+    """Raised instead of accessing the database while the circuit is
+    open"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Database circuit is open")
+        self.retry_after = retry_after
+
+#endregion
+
+#region Circuit Breaker Class
+class CircuitBreaker:  # pylint: disable=too-many-instance-attributes
+    """Tracks database failures and slow operations across requests and
+    decides whether database access should be attempted"""
+
+    def __init__(self,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 failure_window: int = DEFAULT_FAILURE_WINDOW,
+                 latency_threshold: float = DEFAULT_LATENCY_THRESHOLD,
+                 open_seconds: int = DEFAULT_OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.latency_threshold = latency_threshold
+        self.open_seconds = open_seconds
+        self.state = STATE_CLOSED
+        self.logger = None
+        self._failures = deque()
+        self._opened_at = 0.0
+        self._probe = None
+        self._probe_started_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask):
+        """Register request hooks with a Flask application"""
+        self.logger = app.logger
+        app.teardown_request(self.end_request)
+
+    def _log(self, message: str, *args):
+        if self.logger:
+            self.logger.warning(message, *args)
+
+    def _open(self, now: float):
+        self.state = STATE_OPEN
+        self._opened_at = now
+        self._probe = None
+        self._failures.clear()
+        self._log("Database circuit opened for %s seconds", self.open_seconds)
+
+    def _start_probe(self, now: float):
+        self._probe = threading.get_ident()
+        self._probe_started_at = now
+
+    def retry_after(self) -> int:
+        """Returns the number of seconds until the next probe is allowed:
+        the rest of the open period, or while a probe is in flight, the
+        time left before it is assumed to be lost"""
+        with self._lock:
+            if self.state == STATE_OPEN:
+                started_at = self._opened_at
+            elif self.state == STATE_HALF_OPEN and self._probe is not None:
+                started_at = self._probe_started_at
+            else:
+                return 0
+
+            return max(int(started_at + self.open_seconds - time.monotonic()) + 1, 1)
+
+    def allow(self) -> bool:
+        """Returns whether database access should be attempted. Once the
+        open period has elapsed, only the first request to ask is allowed
+        through, as the probe."""
+        if self.state == STATE_CLOSED:
+            return True
+
+        with self._lock:
+            now = time.monotonic()
+            if self.state == STATE_OPEN:
+                if now - self._opened_at < self.open_seconds:
+                    return False
+
+                self.state = STATE_HALF_OPEN
+                self._start_probe(now)
+                return True
+
+            if self.state == STATE_HALF_OPEN:
+                if (self._probe is None
+                        or now - self._probe_started_at >= self.open_seconds):
+                    self._start_probe(now)
+                return self._probe == threading.get_ident()
+
+            return True
+
+    def check(self):
+        """Raise CircuitOpenError if database access should not be
+        attempted"""
+        if not self.allow():
+            raise CircuitOpenError(self.retry_after())
+
+    def record_failure(self):
+        """Record a failed database operation, opening the circuit once
+        the failure threshold has been reached within the window"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == STATE_HALF_OPEN:
+                if self._probe == threading.get_ident():
+                    self._open(now)
+                return
+
+            if self.state == STATE_OPEN:
+                return
+
+            self._failures.append(now)
+            while self._failures and now - self._failures[0] > self.failure_window:
+                self._failures.popleft()
+            if len(self._failures) >= self.failure_threshold:
+                self._open(now)
+
+    def record_latency(self, elapsed: float):
+        """Record a completed database operation. Operations slower than
+        the latency threshold count as failures; otherwise a successful
+        probe closes the circuit."""
+        if self.latency_threshold and elapsed >= self.latency_threshold:
+            self.record_failure()
+            return
+
+        if self.state != STATE_HALF_OPEN:
+            return
+
+        with self._lock:
+            if self.state == STATE_HALF_OPEN and self._probe == threading.get_ident():
+                self.state = STATE_CLOSED
+                self._probe = None
+                self._log("Database circuit closed")
+
+    def end_request(self, exception: Exception = None):
+        """Release the probe if the probing request finished without
+        accessing the database"""
+        # pylint: disable=unused-argument
+        if self.state != STATE_HALF_OPEN:
+            return
+
+        with self._lock:
+            if self._probe == threading.get_ident():
+                self._probe = None
+
+    def status(self) -> dict:
+        """Returns the current circuit state"""
+        return {
+            "state": self.state,
+            "recent_failures": len(self._failures),
+            "retry_after": self.retry_after()
+        }
+
+#endregion
+
+#region Stale Response Cache Class
+class StaleResponseCache:
+    """Keeps the most recent successful response for each page so that it
+    can be served while the database is unavailable. Bodies are stored
+    zlib compressed, and the least recently stored pages are removed once
+    either the number of pages or the total size of the stored bodies
+    exceeds its limit."""
+
+    def __init__(self,
+                 max_entries: int = DEFAULT_STALE_ENTRIES,
+                 max_bytes: int = DEFAULT_STALE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask):
+        """Register the cache with a Flask application. This must happen
+        after response compression is set up so that responses are stored
+        before they are compressed."""
+        app.after_request(self.store_response)
+
+    def store_response(self, response: Response) -> Response:
+        """Store a copy of a successful page response"""
+        if request.method != "GET" or response.status_code != 200:
+            return response
+
+        if (response.is_streamed
+                or response.direct_passthrough
+                or "Content-Encoding" in response.headers
+                or STALE_HEADER in response.headers
+                or response.mimetype not in STALE_MIMETYPES):
+            return response
+
+        data = zlib.compress(response.get_data(), STALE_COMPRESSION_LEVEL)
+        if len(data) > self.max_bytes:
+            return response
+
+        entry = (data, response.mimetype, time.time())
+        with self._lock:
+            previous = self._entries.pop(request.full_path, None)
+            if previous:
+                self.size -= len(previous[0])
+            self._entries[request.full_path] = entry
+            self.size += len(data)
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, (removed_data, _, _) = self._entries.popitem(last=False)
+                self.size -= len(removed_data)
+
+        return response
+
+    def response(self) -> Optional[Response]:
+        """Returns the stored response for the current request, marked as
+        stale, or None if there is no stored response"""
+        with self._lock:
+            entry = self._entries.get(request.full_path)
+        if not entry:
+            return None
+
+        data, mimetype, stored_at = entry
+        data = zlib.decompress(data)
+        if mimetype == "text/html":
+            updated = datetime.fromtimestamp(stored_at, timezone.utc)
+            notice = STALE_NOTICE.format(updated.strftime("%Y-%m-%d %H:%M:%S %Z"))
+            data = BODY_TAG_PATTERN.sub(lambda match: match.group(0) + notice.encode("utf-8"),
+                                        data,
+                                        count=1)
+
+        response = Response(data, status=200, mimetype=mimetype)
+        response.headers[STALE_HEADER] = "1"
+        response.headers["Age"] = str(max(int(time.time() - stored_at), 0))
+        response.headers["Warning"] = '110 - "Response is Stale"'
+        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+        return response
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+#endregion
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Response compression functions used by the Stats Page"""
+
+from collections import OrderedDict
+import threading
+import time
+from typing import Callable, Hashable, Iterable, Iterator, List, Optional
+import zlib
+
+from flask import Flask, request, Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#region Constants
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 5
+DEFAULT_CACHE_ENTRIES = 128
+DEFAULT_CACHE_TTL = 300
+
+COMPRESSIBLE_MIMETYPES = ("application/javascript",
+                          "application/json",
+                          "application/xml",
+                          "image/svg+xml",
+                          "text/css",
+                          "text/html",
+                          "text/javascript",
+                          "text/plain",
+                          "text/xml")
+#endregion
+
+#region Encoding Functions
+def available_encodings() -> List[str]:
+    """Returns a list of supported content encodings, in order of
+    server preference"""
+    if brotli:
+        return ["br", "gzip"]
+
+    return ["gzip"]
+
+def negotiate_encoding(accept_encoding: str,
+                       encodings: List[str] = None) -> Optional[str]:
+    """Parses an Accept-Encoding header value and returns the supported
+    encoding with the highest quality value. Ties are broken using the
+    server preference order. Returns None if no encoding is acceptable."""
+    if not accept_encoding:
+        return None
+
+    if not encodings:
+        encodings = available_encodings()
+
+    qualities = {}
+    for item in accept_encoding.split(","):
+        parts = item.strip().split(";")
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        qualities[coding] = quality
+
+    best_encoding = None
+    best_quality = 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best_encoding = encoding
+            best_quality = quality
+
+    return best_encoding
+
+def compress_bytes(data: bytes,
+                   encoding: str,
+                   gzip_level: int = DEFAULT_GZIP_LEVEL,
+                   brotli_quality: int = DEFAULT_BROTLI_QUALITY) -> bytes:
+    """Compress a bytes object using the requested encoding"""
+    if encoding == "br" and brotli:
+        return brotli.compress(data, quality=brotli_quality)
+
+    if encoding == "gzip":
+        compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+def compress_stream(chunks: Iterable[bytes],
+                    encoding: str,
+                    gzip_level: int = DEFAULT_GZIP_LEVEL,
+                    brotli_quality: int = DEFAULT_BROTLI_QUALITY) -> Iterator[bytes]:
+    """Incrementally compress an iterable of bytes, flushing after each
+    chunk so that streamed output reaches the client without waiting for
+    the full response body"""
+    if encoding == "br" and brotli:
+        compressor = brotli.Compressor(quality=brotli_quality)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            output = compressor.process(chunk) + compressor.flush()
+            if output:
+                yield output
+        yield compressor.finish()
+    elif encoding == "gzip":
+        compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            output = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if output:
+                yield output
+        yield compressor.flush()
+    else:
+        raise ValueError(f"Unsupported content encoding: {encoding}")
+
+#endregion
+
+#region Compressed Response Cache Class
+class CompressedResponseCache:
+    """Least recently used cache of compressed response bodies, keyed by
+    a response key, such as the request URL and data version, and the
+    content encoding. Entries expire after ttl seconds so that pages that
+    change over time without a data change, such as shows on this day,
+    are not served stale for long."""
+
+    def __init__(self,
+                 max_entries: int = DEFAULT_CACHE_ENTRIES,
+                 ttl: int = DEFAULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, encoding: str) -> Optional[bytes]:
+        """Returns compressed bytes for a response key and encoding, if
+        any have been stored within the last ttl seconds"""
+        key = (key, encoding)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] >= self.ttl:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def store(self, key: Hashable, encoding: str, data: bytes):
+        """Stores compressed bytes for a response key and encoding"""
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+
+        key = (key, encoding)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        """Remove all cache entries"""
+        with self._lock:
+            self._entries.clear()
+
+#endregion
+
+#region Compressor Class
+class ResponseCompressor:
+    """Compresses outgoing responses based on the client's Accept-Encoding
+    request header. If a cache key function is given, compressed bodies
+    are cached under the key it returns for a response, so that repeated
+    hits on a page are only compressed once. Pages include the time they
+    were rendered, so the body itself cannot be used as the key."""
+
+    def __init__(self,
+                 app: Flask = None,
+                 *,
+                 min_size: int = DEFAULT_MIN_SIZE,
+                 gzip_level: int = DEFAULT_GZIP_LEVEL,
+                 brotli_quality: int = DEFAULT_BROTLI_QUALITY,
+                 cache_entries: int = DEFAULT_CACHE_ENTRIES,
+                 cache_ttl: int = DEFAULT_CACHE_TTL,
+                 cache_key: Callable[[Response], Optional[Hashable]] = None,
+                 streaming: bool = True):
+        # pylint: disable=too-many-arguments
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.streaming = streaming
+        self.cache_key = cache_key
+        self.cache = CompressedResponseCache(max_entries=cache_entries, ttl=cache_ttl)
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        """Register the compressor with a Flask application"""
+        app.after_request(self.compress_response)
+
+    def compressed_body(self, data: bytes, encoding: str, key: Hashable = None) -> bytes:
+        """Returns a compressed copy of data, using the cache if a response
+        with the same key has recently been compressed with the same
+        encoding. Responses without a key are not cached."""
+        compressed = self.cache.get(key, encoding) if key is not None else None
+        if compressed is None:
+            compressed = compress_bytes(data,
+                                        encoding,
+                                        gzip_level=self.gzip_level,
+                                        brotli_quality=self.brotli_quality)
+            if key is not None:
+                self.cache.store(key, encoding, compressed)
+
+        return compressed
+
+    def compress_response(self, response: Response) -> Response:
+        """Compress a response if the client accepts a supported encoding
+        and the response is eligible for compression"""
+        if (response.status_code != 200
+                or response.direct_passthrough
+                or "Content-Encoding" in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding"))
+        if not encoding:
+            return response
+
+        if response.is_streamed:
+            if not self.streaming:
+                return response
+
+            response.response = compress_stream(response.response,
+                                                encoding,
+                                                gzip_level=self.gzip_level,
+                                                brotli_quality=self.brotli_quality)
+            response.headers.pop("Content-Length", None)
+            response.headers["Content-Encoding"] = encoding
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        key = self.cache_key(response) if self.cache_key else None
+        response.set_data(self.compressed_body(data, encoding, key))
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+#endregion
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Data version tracking used by the Stats Page to decide when cached
+data needs to be rebuilt"""
+
+import hashlib
+import time
+
+import mysql.connector
+
+#region Constants
+DATA_TABLES = ("ww_guests",
+               "ww_hosts",
+               "ww_locations",
+               "ww_panelists",
+               "ww_scorekeepers",
+               "ww_shows",
+               "ww_showbluffmap",
+               "ww_showdescriptions",
+               "ww_showguestmap",
+               "ww_showhostmap",
+               "ww_showlocationmap",
+               "ww_shownotes",
+               "ww_showpnlmap",
+               "ww_showskmap")
+
+DEFAULT_CHECK_INTERVAL = 60
+#endregion
+
+#region Retrieve Functions
+def retrieve_data_version(database_connection: mysql.connector.connect) -> str:
+    """Returns a short version string derived from the checksums of all
+    of the ww_* tables used to generate pages"""
+    # SQLite snapshots record the version of the data they were exported from
+    if hasattr(database_connection, "snapshot_version"):
+        database_connection.reconnect()
+        return database_connection.snapshot_version()
+
+    database_connection.reconnect()
+    cursor = database_connection.cursor(dictionary=True)
+    query = f"CHECKSUM TABLE {', '.join(DATA_TABLES)};"
+    cursor.execute(query)
+    result = cursor.fetchall()
+    cursor.close()
+
+    digest = hashlib.sha1()
+    for row in result:
+        digest.update(f"{row['Table']}:{row['Checksum']};".encode("utf-8"))
+
+    return digest.hexdigest()[:16]
+
+#endregion
+
+#region Tracker Class
+class DataVersionTracker:
+    """Keeps track of the current data version, only querying the
+    database for a new version once the check interval has elapsed"""
+
+    def __init__(self,
+                 database_connection: mysql.connector.connect,
+                 check_interval: int = DEFAULT_CHECK_INTERVAL):
+        self.database_connection = database_connection
+        self.check_interval = check_interval
+        self._version = None
+        self._checked_at = 0.0
+
+    def current(self) -> str:
+        """Returns the current data version"""
+        now = time.monotonic()
+        if self._version is None or now - self._checked_at >= self.check_interval:
+            self._version = retrieve_data_version(self.database_connection)
+            self._checked_at = now
+
+        return self._version
+
+    def invalidate(self):
+        """Force the next call to current() to query the database"""
+        self._version = None
+
+#endregion
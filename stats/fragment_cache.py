@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Jinja template fragment cache used by the Stats Page
+
+Provides a {% cache %} tag that renders the enclosed block once for a
+given key and reuses the rendered output on every page that renders a
+block with the same key, for example:
+
+    {% cache "show", show.id, data_version() %}
+    ...
+    {% endcache %}
+"""
+
+from collections import OrderedDict
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from jinja2.parser import Parser
+from markupsafe import Markup
+
+#region Constants
+DEFAULT_MAX_ENTRIES = 4096
+#endregion
+
+#region Fragment Cache Class
+class FragmentCache:  # pylint: disable=duplicate-code
+    """Least recently used cache of rendered template fragments"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[Markup]:
+        """Returns a rendered fragment for a key, if any"""
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is not None:
+                self._entries.move_to_end(key)
+
+        return fragment
+
+    def store(self, key: Tuple, fragment: Markup):
+        """Stores a rendered fragment for a key"""
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = fragment
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        """Remove all cached fragments"""
+        with self._lock:
+            self._entries.clear()
+
+#endregion
+
+#region Extension Class
+class FragmentCacheExtension(Extension):
+    """Jinja extension that adds the {% cache %} tag. The tag takes one
+    or more comma-separated expressions that together form the cache key,
+    which should include an entity identifier and the data version."""
+
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser: Parser) -> nodes.Node:
+        """Parse a {% cache key, ... %} ... {% endcache %} block"""
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            key_parts.append(parser.parse_expression())
+
+        body = parser.parse_statements(["name:endcache"], drop_needle=True)
+        call = self.call_method("_render_fragment", [nodes.List(key_parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_fragment(self, key_parts: List, caller: Callable) -> Markup:
+        """Returns the cached fragment for the key or renders and caches
+        the fragment if it has not yet been cached"""
+        cache = self.environment.fragment_cache
+        key = tuple(key_parts)
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = caller()
+            cache.store(key, fragment)
+
+        return fragment
+
+#endregion
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Explicitly listing all guests modules, which are imported the first time
+they are accessed"""
+
+from stats import lazy_modules
+
+__all__ = ["leaderboard"]
+
+__getattr__ = lazy_modules(__name__, __all__)
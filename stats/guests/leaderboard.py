@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Not My Job guest leaderboard used by the Stats Page
+
+Guest appearance, win and scoring exception totals are materialized per
+guest and per year into a local SQLite database. When the data version
+changes, only appearances from shows that aired after the last show
+already counted are read and added to the totals. Appearances that were
+already counted are checked with a single aggregate query, and the totals
+are only rebuilt from scratch if that summary no longer matches."""
+
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import mysql.connector
+
+from stats.data_version import DataVersionTracker
+
+#region Constants
+LEADERBOARD_METRICS = ("appearances", "wins", "exceptions")
+DEFAULT_LEADERBOARD_PATH = ":memory:"
+DEFAULT_LEADERBOARD_LIMIT = 10
+
+SCHEMA = ("CREATE TABLE IF NOT EXISTS guests ("
+          "guestid INTEGER PRIMARY KEY, "
+          "name TEXT NOT NULL, "
+          "slug TEXT NOT NULL);",
+          "CREATE TABLE IF NOT EXISTS guest_year_totals ("
+          "guestid INTEGER NOT NULL, "
+          "year INTEGER NOT NULL, "
+          "appearances INTEGER NOT NULL DEFAULT 0, "
+          "scored INTEGER NOT NULL DEFAULT 0, "
+          "total_score INTEGER NOT NULL DEFAULT 0, "
+          "wins INTEGER NOT NULL DEFAULT 0, "
+          "exceptions INTEGER NOT NULL DEFAULT 0, "
+          "PRIMARY KEY (guestid, year));",
+          "CREATE INDEX IF NOT EXISTS guest_year_totals_year "
+          "ON guest_year_totals (year);",
+          "CREATE TABLE IF NOT EXISTS leaderboard_state ("
+          "name TEXT PRIMARY KEY, "
+          "value TEXT);")
+
+APPEARANCE_FILTER = ("FROM ww_showguestmap gm "
+                     "JOIN ww_shows s ON s.showid = gm.showid "
+                     "JOIN ww_guests g ON g.guestid = gm.guestid "
+                     "WHERE s.bestof = 0 AND s.repeatshowid IS NULL "
+                     "AND g.guestslug <> 'none' "
+                     "AND s.showdate <= NOW() ")
+#endregion
+
+#region Retrieve Functions
+def retrieve_guests(database_connection: mysql.connector.connect) -> List[Dict]:
+    """Returns the ID, name and slug for all guests"""
+    database_connection.reconnect()
+    cursor = database_connection.cursor(dictionary=True)
+    query = ("SELECT g.guestid, g.guest, g.guestslug FROM ww_guests g "
+             "WHERE g.guestslug <> 'none';")
+    cursor.execute(query)
+    result = cursor.fetchall()
+    cursor.close()
+
+    if not result:
+        return []
+
+    return result
+
+def retrieve_guest_appearances(database_connection: mysql.connector.connect,
+                               after: str = None) -> List[Dict]:
+    """Returns Not My Job appearances for regular shows, ordered by show
+    date. If a date is given, only appearances from shows that aired after
+    that date are returned."""
+    database_connection.reconnect()
+    cursor = database_connection.cursor(dictionary=True)
+    query = ("SELECT gm.guestid, s.showid, s.showdate, gm.guestscore, gm.exception "
+             + APPEARANCE_FILTER
+             + ("AND s.showdate > %s " if after else "")
+             + "ORDER BY s.showdate ASC, s.showid ASC, gm.guestid ASC;")
+    cursor.execute(query, (after, ) if after else ())
+    result = cursor.fetchall()
+    cursor.close()
+
+    if not result:
+        return []
+
+    return result
+
+def retrieve_appearance_summary(database_connection: mysql.connector.connect,
+                                through: str) -> str:
+    """Returns the summary of the Not My Job appearances from shows that
+    aired on or before a date, as calculated by appearance_summary"""
+    database_connection.reconnect()
+    cursor = database_connection.cursor()
+    query = ("SELECT COUNT(*), COUNT(gm.guestscore), "
+             "COALESCE(SUM(gm.guestscore), 0), COALESCE(SUM(gm.exception), 0), "
+             "COALESCE(SUM(gm.guestid), 0), COALESCE(SUM(gm.guestid * s.showid), 0), "
+             "COALESCE(SUM(gm.guestid * gm.guestscore), 0), "
+             "COALESCE(SUM(gm.guestid * gm.exception), 0) "
+             + APPEARANCE_FILTER
+             + "AND s.showdate <= %s;")
+    cursor.execute(query, (through, ))
+    result = cursor.fetchone()
+    cursor.close()
+
+    return _format_summary(int(value) for value in result)
+
+def appearance_summary(appearances: List[Dict], summary: str = None) -> str:
+    """Returns the number of appearances, scored appearances and
+    scoring exceptions, the total score, and sums of the guest ID weighted
+    by the show ID, score and scoring exception for each appearance. The
+    sums detect changes to appearances already counted, including an
+    appearance moved from one guest or show to another. Summaries of
+    separate sets of appearances add up, so the summary of new appearances
+    can be added to a previous summary."""
+    totals = [int(value) for value in summary.split(":")] if summary else [0] * 8
+    for appearance in appearances:
+        guest_id = appearance["guestid"]
+        score = appearance["guestscore"]
+        exception = int(appearance["exception"] or 0)
+        totals[0] += 1
+        totals[1] += 0 if score is None else 1
+        totals[2] += int(score or 0)
+        totals[3] += exception
+        totals[4] += guest_id
+        totals[5] += guest_id * appearance["showid"]
+        totals[6] += guest_id * int(score or 0)
+        totals[7] += guest_id * exception
+
+    return _format_summary(totals)
+
+def _format_summary(totals: Sequence[int]) -> str:
+    return ":".join(str(value) for value in totals)
+
+#endregion
+
+#region Leaderboard Class
+class GuestLeaderboard:
+    """Materialized guest totals stored in a local SQLite database, kept
+    up to date with the Stats Page database when the data version
+    changes. Each thread opens its own connection to the leaderboard
+    database, so an in-memory leaderboard is built once per thread."""
+
+    def __init__(self,
+                 database_connection: mysql.connector.connect,
+                 data_version: DataVersionTracker,
+                 path: str = DEFAULT_LEADERBOARD_PATH):
+        self.database_connection = database_connection
+        self.data_version = data_version
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        """Returns the leaderboard database connection for the current
+        thread, opening it if needed"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Connections are only used by the thread that opened them, but
+            # close() may be called from another thread
+            connection = sqlite3.connect(self.path,
+                                         isolation_level=None,
+                                         check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+
+        return connection
+
+    def _state(self) -> Dict[str, str]:
+        rows = self._db.execute("SELECT name, value FROM leaderboard_state;")
+        return {row["name"]: row["value"] for row in rows}
+
+    def _set_state(self, **values):
+        self._db.executemany("INSERT OR REPLACE INTO leaderboard_state (name, value) "
+                             "VALUES (?, ?);",
+                             [(name, str(value)) for name, value in values.items()])
+
+    def _apply(self, appearances: List[Dict]):
+        """Add appearances to the per guest and per year totals"""
+        totals = {}
+        for appearance in appearances:
+            key = (appearance["guestid"], appearance["showdate"].year)
+            row = totals.setdefault(key, [0, 0, 0, 0, 0])
+            score = appearance["guestscore"]
+            exception = bool(appearance["exception"])
+            row[0] += 1
+            if score is not None:
+                row[1] += 1
+                row[2] += int(score)
+            if (score is not None and score >= 2) or exception:
+                row[3] += 1
+            if exception:
+                row[4] += 1
+
+        self._db.executemany("INSERT INTO guest_year_totals "
+                             "(guestid, year, appearances, scored, total_score, "
+                             "wins, exceptions) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                             "ON CONFLICT (guestid, year) DO UPDATE SET "
+                             "appearances = appearances + excluded.appearances, "
+                             "scored = scored + excluded.scored, "
+                             "total_score = total_score + excluded.total_score, "
+                             "wins = wins + excluded.wins, "
+                             "exceptions = exceptions + excluded.exceptions;",
+                             [key + tuple(row) for key, row in totals.items()])
+
+    def update(self, version: str = None) -> int:
+        """Bring the materialized totals up to date and return the number
+        of appearances that were added. Totals are rebuilt from scratch if
+        appearances that were already counted have changed. If the totals
+        already reflect the given data version, nothing is updated."""
+        state = self._state()
+        if version and state.get("data_version") == version:
+            return 0
+
+        # Read from the Stats Page database before taking the write lock so
+        # that other processes sharing the leaderboard file are not blocked
+        # while the queries run
+        watermark = state.get("watermark")
+        summary = state.get("summary")
+        rebuild = not (watermark and summary
+                       and retrieve_appearance_summary(self.database_connection,
+                                                       watermark) == summary)
+        guests = retrieve_guests(self.database_connection)
+        appearances = retrieve_guest_appearances(self.database_connection,
+                                                 after=None if rebuild else watermark)
+
+        # Take the write lock up front so that only one process sharing the
+        # leaderboard file applies a given set of new appearances
+        self._db.execute("BEGIN IMMEDIATE;")
+        try:
+            current_state = self._state()
+            if version and current_state.get("data_version") == version:
+                self._db.execute("COMMIT;")
+                return 0
+
+            # Another process sharing the leaderboard file updated it while
+            # the appearances were read, so they may already be counted
+            if not rebuild and (current_state.get("watermark") != watermark
+                                or current_state.get("summary") != summary):
+                self._db.execute("COMMIT;")
+                return self.update(version)
+
+            if rebuild:
+                self._db.execute("DELETE FROM guest_year_totals;")
+                watermark = ""
+                summary = None
+
+            self._db.execute("DELETE FROM guests;")
+            self._db.executemany("INSERT INTO guests (guestid, name, slug) "
+                                 "VALUES (?, ?, ?);",
+                                 [(guest["guestid"], guest["guest"], guest["guestslug"])
+                                  for guest in guests])
+
+            self._apply(appearances)
+            self._set_state(
+                watermark=appearances[-1]["showdate"].isoformat() if appearances else watermark,
+                summary=appearance_summary(appearances, summary),
+                data_version=version or "")
+            self._db.execute("COMMIT;")
+        except Exception:
+            self._db.execute("ROLLBACK;")
+            raise
+
+        return len(appearances)
+
+    def refresh(self):
+        """Update the materialized totals if the data version has changed"""
+        version = self.data_version.current()
+        if version != getattr(self._local, "version", None):
+            self.update(version)
+            self._local.version = version
+
+    def top(self,
+            metric: str = "wins",
+            year: int = None,
+            limit: int = DEFAULT_LEADERBOARD_LIMIT) -> List[Dict]:
+        """Returns the top guests ordered by appearances, wins or scoring
+        exceptions, either overall or for a given year"""
+        if metric not in LEADERBOARD_METRICS:
+            raise ValueError(f"Unknown leaderboard metric: {metric}")
+
+        self.refresh()
+        query = ("SELECT g.guestid, g.name, g.slug, "
+                 "SUM(t.appearances) AS appearances, SUM(t.scored) AS scored, "
+                 "SUM(t.total_score) AS total_score, SUM(t.wins) AS wins, "
+                 "SUM(t.exceptions) AS exceptions "
+                 "FROM guest_year_totals t "
+                 "JOIN guests g ON g.guestid = t.guestid "
+                 f"{'WHERE t.year = ?' if year else ''} "
+                 "GROUP BY g.guestid, g.name, g.slug "
+                 f"HAVING SUM(t.{metric}) > 0 "
+                 f"ORDER BY {metric} DESC, appearances DESC, g.name ASC "
+                 "LIMIT ?;")
+        parameters = (year, limit) if year else (limit, )
+        rows = self._db.execute(query, parameters).fetchall()
+
+        return [self._guest_totals(row) for row in rows]
+
+    def standing(self, guest_id: int) -> Optional[Dict]:
+        """Returns overall totals for a guest, along with their rank by
+        wins and by appearances"""
+        self.refresh()
+        query = ("WITH totals AS ("
+                 "SELECT guestid, SUM(appearances) AS appearances, "
+                 "SUM(scored) AS scored, SUM(total_score) AS total_score, "
+                 "SUM(wins) AS wins, SUM(exceptions) AS exceptions "
+                 "FROM guest_year_totals GROUP BY guestid) "
+                 "SELECT g.guestid, g.name, g.slug, t.*, "
+                 "(SELECT COUNT(*) FROM totals o WHERE o.wins > t.wins) + 1 "
+                 "AS wins_rank, "
+                 "(SELECT COUNT(*) FROM totals o WHERE o.appearances > t.appearances) + 1 "
+                 "AS appearances_rank "
+                 "FROM totals t JOIN guests g ON g.guestid = t.guestid "
+                 "WHERE t.guestid = ?;")
+        row = self._db.execute(query, (guest_id, )).fetchone()
+
+        if not row:
+            return None
+
+        standing = self._guest_totals(row)
+        standing["wins_rank"] = row["wins_rank"]
+        standing["appearances_rank"] = row["appearances_rank"]
+        return standing
+
+    def years(self) -> List[int]:
+        """Returns the years with at least one counted appearance"""
+        self.refresh()
+        rows = self._db.execute("SELECT DISTINCT year FROM guest_year_totals "
+                                "ORDER BY year ASC;").fetchall()
+
+        return [row["year"] for row in rows]
+
+    @staticmethod
+    def _guest_totals(row: sqlite3.Row) -> Dict:
+        appearances = row["appearances"]
+        return {
+            "id": row["guestid"],
+            "name": row["name"],
+            "slug": row["slug"],
+            "appearances": appearances,
+            "shows_with_scores": row["scored"],
+            "total_score": row["total_score"],
+            "wins": row["wins"],
+            "exceptions": row["exceptions"],
+            "win_rate": round(100 * row["wins"] / appearances, 2) if appearances else None
+        }
+
+    def close(self):
+        """Close all connections to the leaderboard database"""
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
+
+#endregion
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Import time measurement functions used by the Stats Page
+
+The application module is imported in a fresh interpreter with Python's
+-X importtime option, which is what a uWSGI worker does when it spawns or
+reloads, and the per-module timings written to stderr are summarized by
+top-level package and by the modules imported directly by the
+application."""
+
+from collections import OrderedDict
+import re
+import subprocess
+import sys
+from typing import Dict, Iterable, List, Optional
+
+#region Constants
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \|"
+                                 r"(?P<indent>\s+)(?P<module>\S+)\s*$")
+DEFAULT_MODULE = "app"
+DEFAULT_LIMIT = 20
+DEFAULT_REPEAT = 3
+#endregion
+
+#region Parsing Functions
+def parse_import_times(lines: Iterable[str]) -> List[Dict]:
+    """Returns the module name, nesting depth, self time and cumulative
+    time, in microseconds, for each line of -X importtime output"""
+    entries = []
+    for line in lines:
+        match = IMPORT_TIME_PATTERN.match(line)
+        if not match:
+            continue
+
+        entries.append({
+            "module": match.group("module"),
+            "depth": (len(match.group("indent")) - 1) // 2,
+            "self_us": int(match.group("self")),
+            "cumulative_us": int(match.group("cumulative"))
+        })
+
+    return entries
+
+def summarize_import_times(entries: List[Dict],
+                           module: str = DEFAULT_MODULE,
+                           limit: int = DEFAULT_LIMIT) -> Dict:
+    """Returns the total import time for a module in milliseconds, along
+    with the top-level packages that took the most time to import and the
+    modules it imported directly that took the most time"""
+    # Modules imported while importing the module being measured are
+    # listed right before it and nested one or more levels deeper
+    tree = []
+    total = None
+    for entry in entries:
+        if entry["depth"] == 0:
+            if entry["module"] == module:
+                tree.append(entry)
+                total = entry["cumulative_us"]
+                break
+
+            tree = []
+        else:
+            tree.append(entry)
+
+    if total is None:
+        tree = []
+
+    packages = {}
+    for entry in tree:
+        package = entry["module"].split(".", 1)[0]
+        packages[package] = packages.get(package, 0) + entry["self_us"]
+
+    direct_imports = [entry for entry in tree if entry["depth"] == 1]
+
+    return {
+        "module": module,
+        "total_ms": round(total / 1000, 2) if total is not None else None,
+        "modules": len(tree),
+        "packages": OrderedDict((package, round(self_us / 1000, 2))
+                                for package, self_us in sorted(packages.items(),
+                                                               key=lambda item: item[1],
+                                                               reverse=True)[:limit]),
+        "direct_imports": OrderedDict((entry["module"], round(entry["cumulative_us"] / 1000, 2))
+                                      for entry in sorted(direct_imports,
+                                                          key=lambda entry: entry["cumulative_us"],
+                                                          reverse=True)[:limit])
+    }
+
+#endregion
+
+#region Measurement Functions
+def measure_import_time(module: str = DEFAULT_MODULE,
+                        python: str = None,
+                        cwd: str = None) -> List[Dict]:
+    """Import a module in a new interpreter with -X importtime and return
+    the parsed timings"""
+    result = subprocess.run([python or sys.executable, "-X", "importtime",
+                             "-c", f"import {module}"],
+                            cwd=cwd,
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE,
+                            universal_newlines=True,
+                            check=False)
+    entries = parse_import_times(result.stderr.splitlines())
+    if result.returncode != 0 and not entries:
+        raise RuntimeError(f"Unable to import {module}: {result.stderr.strip()}")
+
+    return entries
+
+def import_time_report(module: str = DEFAULT_MODULE,
+                       limit: int = DEFAULT_LIMIT,
+                       repeat: int = DEFAULT_REPEAT,
+                       cwd: str = None) -> Optional[Dict]:
+    """Measure the import time for a module repeat times and return the
+    summary for the run with the median total import time"""
+    summaries = [summarize_import_times(measure_import_time(module, cwd=cwd),
+                                        module=module,
+                                        limit=limit)
+                 for _ in range(max(repeat, 1))]
+    summaries = sorted((summary for summary in summaries if summary["total_ms"] is not None),
+                       key=lambda summary: summary["total_ms"])
+    if not summaries:
+        return None
+
+    report = summaries[len(summaries) // 2]
+    report["runs_ms"] = [summary["total_ms"] for summary in summaries]
+    return report
+
+#endregion
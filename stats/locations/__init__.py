@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2018-2020 Linh Pham
 # stats.wwdt.me is relased under the terms of the Apache License 2.0
-"""Explicitly listing all locations modules"""
+"""Explicitly listing all locations modules, which are imported the first time
+they are accessed"""
 
-from stats.locations import formatting
+from stats import lazy_modules
 
-__all__ = ["formatting"]
+__all__ = ["formatting", "index"]
+
+__getattr__ = lazy_modules(__name__, __all__)
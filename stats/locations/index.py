@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Location index functions used by the Stats Page to group locations by
+state and city"""
+
+from typing import Dict, List, Optional
+
+import mysql.connector
+
+from stats.data_version import DataVersionTracker
+from stats.locations.formatting import format_location_name
+
+#region Constants
+# Placeholder locations that are not listed on the Stats Page
+PLACEHOLDER_LOCATION_IDS = (3, 38)
+#endregion
+
+#region Retrieve Functions
+def retrieve_location_recordings(database_connection: mysql.connector.connect) -> List[Dict]:
+    """Returns every location along with its recording counts and the
+    dates of its first and most recent recordings in a single query"""
+    # pylint: disable=duplicate-code
+    database_connection.reconnect()
+    cursor = database_connection.cursor(dictionary=True)
+    query = ("SELECT l.locationid, l.venue, l.city, l.state, l.locationslug, "
+             "COUNT(s.showid) AS all_shows, "
+             "SUM(CASE WHEN s.bestof = 0 AND s.repeatshowid IS NULL "
+             "THEN 1 ELSE 0 END) AS regular_shows, "
+             "MIN(s.showdate) AS first_recording, "
+             "MAX(s.showdate) AS last_recording "
+             "FROM ww_locations l "
+             "LEFT JOIN ww_showlocationmap lm ON lm.locationid = l.locationid "
+             "LEFT JOIN ww_shows s ON s.showid = lm.showid "
+             "AND s.showdate <= NOW() "
+             "GROUP BY l.locationid, l.venue, l.city, l.state, l.locationslug "
+             "ORDER BY l.venue ASC, l.city ASC, l.state ASC;")
+    cursor.execute(query)
+    result = cursor.fetchall()
+    cursor.close()
+
+    if not result:
+        return []
+
+    return result
+
+def _date_string(value) -> Optional[str]:
+    if value is None:
+        return None
+
+    # Aggregates of date columns lose their declared type under the SQLite
+    # backend and are returned as ISO 8601 strings
+    if isinstance(value, str):
+        return value
+
+    return value.isoformat()
+
+def _merge_range(group: Dict, location: Dict):
+    """Add a location's recording counts and dates to a state or city
+    group"""
+    group["recordings"]["regular_shows"] += location["recordings"]["regular_shows"]
+    group["recordings"]["all_shows"] += location["recordings"]["all_shows"]
+    first = location["first_recording"]
+    last = location["last_recording"]
+    if first and (not group["first_recording"] or first < group["first_recording"]):
+        group["first_recording"] = first
+    if last and (not group["last_recording"] or last > group["last_recording"]):
+        group["last_recording"] = last
+
+def _new_group(**kwargs) -> Dict:
+    group = {
+        "recordings": {"regular_shows": 0, "all_shows": 0},
+        "first_recording": None,
+        "last_recording": None
+    }
+    group.update(kwargs)
+    return group
+
+#endregion
+
+#region Index Class
+class LocationIndex:  # pylint: disable=duplicate-code
+    """Locations grouped by state and city, with display names, recording
+    counts and recording date ranges computed once per location"""
+
+    def __init__(self, rows: List[Dict]):
+        # The state lookup tables are only loaded once an index is built,
+        # as this module is imported by every worker at startup
+        import us  # pylint: disable=import-outside-toplevel
+
+        self.locations = []
+        self._by_id = {}
+        states = {}
+        for row in rows:
+            location = {
+                "id": row["locationid"],
+                "venue": row["venue"],
+                "city": row["city"],
+                "state": row["state"],
+                "slug": row["locationslug"],
+                "recordings": {
+                    "regular_shows": int(row["regular_shows"] or 0),
+                    "all_shows": int(row["all_shows"] or 0)
+                },
+                "first_recording": _date_string(row["first_recording"]),
+                "last_recording": _date_string(row["last_recording"])
+            }
+            location["display_name"] = format_location_name(location)
+            self._by_id[location["id"]] = location
+            if location["id"] in PLACEHOLDER_LOCATION_IDS:
+                continue
+
+            self.locations.append(location)
+            if not location["state"]:
+                continue
+
+            abbreviation = location["state"].strip().upper()
+            if abbreviation not in states:
+                state_info = us.states.lookup(abbreviation)
+                states[abbreviation] = _new_group(
+                    abbreviation=abbreviation,
+                    name=state_info.name if state_info else abbreviation,
+                    slug=abbreviation.lower(),
+                    cities={})
+
+            state = states[abbreviation]
+            _merge_range(state, location)
+            city_name = location["city"] or ""
+            if city_name not in state["cities"]:
+                state["cities"][city_name] = _new_group(name=city_name,
+                                                        locations=[])
+
+            city = state["cities"][city_name]
+            city["locations"].append(location)
+            _merge_range(city, location)
+
+        self.states = sorted(states.values(), key=lambda state: state["name"])
+        self._by_slug = {}
+        for state in self.states:
+            state["cities"] = sorted(state["cities"].values(),
+                                     key=lambda city: city["name"])
+            state["location_count"] = sum(len(city["locations"])
+                                          for city in state["cities"])
+            self._by_slug[state["slug"]] = state
+
+    def display_name(self, location_id: int) -> Optional[str]:
+        """Returns the precomputed display name for a location"""
+        location = self._by_id.get(location_id)
+        if not location:
+            return None
+
+        return location["display_name"]
+
+    def state(self, state_slug: str) -> Optional[Dict]:
+        """Returns the locations grouped by city for a state, territory
+        or province"""
+        return self._by_slug.get(state_slug.lower())
+
+#endregion
+
+#region Cache Class
+class LocationIndexCache:  # pylint: disable=too-few-public-methods
+    """Holds a LocationIndex built from a single aggregate query and
+    rebuilds it when the data version changes"""
+
+    def __init__(self,
+                 database_connection: mysql.connector.connect,
+                 data_version: DataVersionTracker):
+        self.database_connection = database_connection
+        self.data_version = data_version
+        self._index = None
+        self._version = None
+
+    def retrieve(self) -> LocationIndex:
+        """Returns the location index for the current data version"""
+        version = self.data_version.current()
+        if self._index is None or version != self._version:
+            rows = retrieve_location_recordings(self.database_connection)
+            self._index = LocationIndex(rows)
+            self._version = version
+
+        return self._index
+
+#endregion
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Per-worker memory accounting used by the Stats Page
+
+Tracks peak and retained tracemalloc allocations for each route, along
+with the top allocation sites for a sample of requests. Workers that grow
+too large are recycled by uWSGI's reload-on-rss option."""
+
+import hmac
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from flask import abort, Flask, jsonify, request, Response
+
+#region Constants
+DEFAULT_TRACE_FRAMES = 1
+DEFAULT_SNAPSHOT_INTERVAL = 50
+DEFAULT_TOP_SITES = 10
+
+STATUS_PATH = "/proc/self/status"
+#endregion
+
+#region Utility Functions
+def current_rss() -> Optional[int]:
+    """Returns the resident set size of the current process in bytes.
+    Falls back to the peak resident set size where /proc is not
+    available."""
+    try:
+        with open(STATUS_PATH, "r", encoding="utf-8") as status_file:
+            for line in status_file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+def _megabytes(value: int) -> Optional[float]:
+    if value is None:
+        return None
+
+    return round(value / (1024 * 1024), 2)
+
+def allocation_sites(before: tracemalloc.Snapshot,
+                     after: tracemalloc.Snapshot,
+                     limit: int = DEFAULT_TOP_SITES) -> List[Dict]:
+    """Returns the source lines that allocated the most memory between two
+    snapshots"""
+    # Leave out the memory used by tracemalloc to take the snapshots
+    filters = (tracemalloc.Filter(False, tracemalloc.__file__), )
+    statistics = after.filter_traces(filters).compare_to(before.filter_traces(filters),
+                                                         "lineno")
+    sites = []
+    for statistic in statistics[:limit]:
+        frame = statistic.traceback[0]
+        sites.append({
+            "site": f"{frame.filename}:{frame.lineno}",
+            "size_kb": round(statistic.size_diff / 1024, 2),
+            "count": statistic.count_diff
+        })
+
+    return sites
+
+#endregion
+
+#region Memory Monitor Class
+class MemoryMonitor:  # pylint: disable=too-many-instance-attributes
+    """Records tracemalloc peak and retained allocations per route"""
+
+    def __init__(self,
+                 tracing: bool = False,
+                 trace_frames: int = DEFAULT_TRACE_FRAMES,
+                 snapshot_interval: int = DEFAULT_SNAPSHOT_INTERVAL,
+                 top_sites: int = DEFAULT_TOP_SITES):
+        self.tracing = tracing
+        self.trace_frames = trace_frames
+        self.snapshot_interval = snapshot_interval
+        self.top_sites = top_sites
+        self.routes = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+
+    def init_app(self, app: Flask, report_token: str = None):
+        """Register request hooks and, if a report token is set, the
+        memory report endpoint"""
+        if self.tracing and not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_frames)
+
+        app.before_request(self.begin_request)
+        app.after_request(self.end_request)
+        if report_token:
+            def memory_report():
+                """Returns the memory report for the worker serving the
+                request. The token is only accepted from a header, so that
+                it is not written to access logs."""
+                token = request.headers.get("X-Report-Token", "")
+                if not hmac.compare_digest(token.encode("utf-8"),
+                                           report_token.encode("utf-8")):
+                    abort(404)
+
+                return jsonify(self.report())
+
+            app.add_url_rule("/debug/memory", "memory_report", memory_report)
+
+    def begin_request(self):
+        """Record the traced memory at the start of a request"""
+        if not self.tracing:
+            return
+
+        # tracemalloc tracks a single peak per process, so peaks are only
+        # attributed to a route when requests are not served concurrently.
+        # reset_peak is not available before Python 3.9, in which case the
+        # memory retained at the end of the request is used as the peak.
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        self._local.start_memory = tracemalloc.get_traced_memory()[0]
+        self._local.snapshot = None
+        route = self.routes.get(request.endpoint)
+        if self.snapshot_interval and (not route
+                                       or route["requests"] % self.snapshot_interval == 0):
+            self._local.snapshot = tracemalloc.take_snapshot()
+
+    def end_request(self, response: Response) -> Response:
+        """Record allocations for the request"""
+        start_memory = getattr(self._local, "start_memory", None)
+        if self.tracing and start_memory is not None:
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            if not hasattr(tracemalloc, "reset_peak"):
+                peak_memory = current_memory
+            self._local.start_memory = None
+            with self._lock:
+                route = self.routes.setdefault(request.endpoint, {"requests": 0,
+                                                                  "peak_kb": 0.0,
+                                                                  "total_peak_kb": 0.0,
+                                                                  "retained_kb": 0.0,
+                                                                  "top_sites": None})
+                peak = (peak_memory - start_memory) / 1024
+                route["requests"] += 1
+                route["total_peak_kb"] += peak
+                route["peak_kb"] = max(route["peak_kb"], round(peak, 2))
+                route["retained_kb"] += (current_memory - start_memory) / 1024
+
+            snapshot = getattr(self._local, "snapshot", None)
+            if snapshot:
+                self._local.snapshot = None
+                route["top_sites"] = allocation_sites(snapshot,
+                                                      tracemalloc.take_snapshot(),
+                                                      self.top_sites)
+
+        return response
+
+    def report(self) -> Dict:
+        """Returns memory details for the current worker and per route
+        allocation statistics"""
+        routes = {}
+        with self._lock:
+            for endpoint, route in self.routes.items():
+                routes[endpoint] = {
+                    "requests": route["requests"],
+                    "peak_kb": route["peak_kb"],
+                    "mean_peak_kb": round(route["total_peak_kb"] / route["requests"], 2),
+                    "retained_kb": round(route["retained_kb"], 2),
+                    "top_sites": route["top_sites"]
+                }
+
+        traced_memory = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None
+        return {
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self._started_at, 1),
+            "rss_mb": _megabytes(current_rss()),
+            "tracing": tracemalloc.is_tracing(),
+            "traced_mb": _megabytes(traced_memory[0]) if traced_memory else None,
+            "routes": dict(sorted(routes.items(),
+                                  key=lambda item: item[1]["peak_kb"],
+                                  reverse=True))
+        }
+
+#endregion
@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Batched detail retrieval functions used by the Stats Page browse pages
+
+libwwdtm retrieves details one show or one entity at a time, running
+several queries for each. The functions below retrieve the details shown
+on a page of shows, guests, hosts, locations, panelists or scorekeepers
+with a fixed number of queries for the whole page. Details are returned
+with the same keys as the libwwdtm details used by the templates."""
+
+from collections import OrderedDict
+import statistics
+from typing import Callable, Dict, List, Optional, Sequence
+
+import mysql.connector
+
+#region Constants
+RANK_KEYS = OrderedDict((("1", "first"),
+                         ("1t", "first_tied"),
+                         ("2", "second"),
+                         ("2t", "second_tied"),
+                         ("3", "third")))
+
+SHOW_COLUMNS = "s.showid, s.showdate, s.bestof, s.repeatshowid"
+SHOW_DETAILS_QUERY = ("SELECT " + SHOW_COLUMNS + ", o.showdate AS originalshowdate, "
+                      "l.locationid, l.city, l.state, l.venue, l.locationslug, "
+                      "h.hostid, h.host, h.hostslug, hm.guest AS hostguest, "
+                      "sk.scorekeeperid, sk.scorekeeper, sk.scorekeeperslug, "
+                      "skm.guest AS scorekeeperguest, "
+                      "skm.description AS scorekeeperdescription, "
+                      "sd.showdescription, sn.shownotes, "
+                      "cp.panelistid AS chosenid, cp.panelist AS chosenname, "
+                      "cp.panelistslug AS chosenslug, "
+                      "rp.panelistid AS correctid, rp.panelist AS correctname, "
+                      "rp.panelistslug AS correctslug "
+                      "FROM ww_shows s "
+                      "LEFT JOIN ww_shows o ON o.showid = s.repeatshowid "
+                      "LEFT JOIN ww_showlocationmap lm ON lm.showid = s.showid "
+                      "LEFT JOIN ww_locations l ON l.locationid = lm.locationid "
+                      "LEFT JOIN ww_showhostmap hm ON hm.showid = s.showid "
+                      "LEFT JOIN ww_hosts h ON h.hostid = hm.hostid "
+                      "LEFT JOIN ww_showskmap skm ON skm.showid = s.showid "
+                      "LEFT JOIN ww_scorekeepers sk ON sk.scorekeeperid = skm.scorekeeperid "
+                      "LEFT JOIN ww_showdescriptions sd ON sd.showid = s.showid "
+                      "LEFT JOIN ww_shownotes sn ON sn.showid = s.showid "
+                      "LEFT JOIN ww_showbluffmap b ON b.showid = s.showid "
+                      "LEFT JOIN ww_panelists cp ON cp.panelistid = b.chosenbluffpnlid "
+                      "LEFT JOIN ww_panelists rp ON rp.panelistid = b.correctbluffpnlid "
+                      "WHERE s.showid IN ({});")
+#endregion
+
+#region Utility Functions
+def _fetch(database_connection: mysql.connector.connect,
+           query: str,
+           keys: Sequence) -> List[Dict]:
+    """Run a query with one placeholder for each key in its IN list and
+    return all rows"""
+    # pylint: disable=duplicate-code
+    database_connection.reconnect()
+    cursor = database_connection.cursor(dictionary=True)
+    cursor.execute(query.format(", ".join(["%s"] * len(keys))), tuple(keys))
+    result = cursor.fetchall()
+    cursor.close()
+
+    if not result:
+        return []
+
+    return result
+
+def _date_string(value) -> Optional[str]:
+    return value.isoformat() if value else None
+
+def _is_regular(row: Dict) -> bool:
+    return not row["bestof"] and row["repeatshowid"] is None
+
+def _person(person_id, name: str, slug: str, **values) -> Optional[Dict]:
+    if person_id is None:
+        return None
+
+    person = {"id": person_id, "name": name, "slug": slug}
+    person.update(values)
+    return person
+
+def _group_appearances(rows: List[Dict],
+                       entity: Callable[[Dict], Dict],
+                       appearance: Callable[[Dict], Dict] = None,
+                       appearances_key: str = "appearances") -> Dict[str, Dict]:
+    """Group rows of entity columns joined to the shows they appeared
+    on, in show date order, into details keyed by slug along with their
+    appearance counts and list of appearances"""
+    details = {}
+    for row in rows:
+        slug = row["slug"]
+        if slug not in details:
+            details[slug] = entity(row)
+            details[slug][appearances_key] = {
+                "count": {"regular_shows": 0, "all_shows": 0},
+                "shows": []
+            }
+
+        if row["showid"] is None:
+            continue
+
+        appearances = details[slug][appearances_key]
+        appearances["count"]["all_shows"] += 1
+        if _is_regular(row):
+            appearances["count"]["regular_shows"] += 1
+
+        show = {"show_id": row["showid"],
+                "date": _date_string(row["showdate"]),
+                "best_of": bool(row["bestof"]),
+                "repeat_show": row["repeatshowid"] is not None}
+        if appearance:
+            show.update(appearance(row))
+        appearances["shows"].append(show)
+
+    return details
+
+def _scoring_statistics(scores: List[int]) -> Optional[Dict]:
+    if not scores:
+        return None
+
+    return {
+        "minimum": min(scores),
+        "maximum": max(scores),
+        "mean": round(statistics.mean(scores), 4),
+        "median": statistics.median(scores),
+        "standard_deviation": round(statistics.pstdev(scores), 4),
+        "total": sum(scores)
+    }
+
+def _ranking_statistics(ranks: List[str]) -> Dict:
+    counts = OrderedDict((key, 0) for key in RANK_KEYS.values())
+    for rank in ranks:
+        if rank in RANK_KEYS:
+            counts[RANK_KEYS[rank]] += 1
+
+    return {
+        "rank": counts,
+        "percentage": OrderedDict((key, round(100 * count / len(ranks), 4) if ranks else 0)
+                                  for key, count in counts.items())
+    }
+
+#endregion
+
+#region Entity Retrieve Functions
+def retrieve_guest_details(slugs: List[str],
+                           database_connection: mysql.connector.connect) -> Dict[str, Dict]:
+    """Returns details and appearances for the Not My Job guests with the
+    given slugs, keyed by slug"""
+    if not slugs:
+        return {}
+
+    query = ("SELECT g.guestid AS id, g.guest AS name, g.guestslug AS slug, "
+             + SHOW_COLUMNS + ", gm.guestscore, gm.exception "
+             "FROM ww_guests g "
+             "LEFT JOIN ww_showguestmap gm ON gm.guestid = g.guestid "
+             "LEFT JOIN ww_shows s ON s.showid = gm.showid "
+             "WHERE g.guestslug IN ({}) "
+             "ORDER BY g.guestslug ASC, s.showdate ASC;")
+    return _group_appearances(_fetch(database_connection, query, slugs),
+                              lambda row: _person(row["id"], row["name"], row["slug"]),
+                              lambda row: {"score": row["guestscore"],
+                                           "score_exception": bool(row["exception"])})
+
+def retrieve_host_details(slugs: List[str],
+                          database_connection: mysql.connector.connect) -> Dict[str, Dict]:
+    """Returns details and appearances for the hosts with the given
+    slugs, keyed by slug"""
+    if not slugs:
+        return {}
+
+    query = ("SELECT h.hostid AS id, h.host AS name, h.hostslug AS slug, "
+             + SHOW_COLUMNS + ", hm.guest "
+             "FROM ww_hosts h "
+             "LEFT JOIN ww_showhostmap hm ON hm.hostid = h.hostid "
+             "LEFT JOIN ww_shows s ON s.showid = hm.showid "
+             "WHERE h.hostslug IN ({}) "
+             "ORDER BY h.hostslug ASC, s.showdate ASC;")
+    return _group_appearances(_fetch(database_connection, query, slugs),
+                              lambda row: _person(row["id"], row["name"], row["slug"]),
+                              lambda row: {"guest": bool(row["guest"])})
+
+def retrieve_scorekeeper_details(slugs: List[str],
+                                 database_connection: mysql.connector.connect) -> Dict[str, Dict]:
+    """Returns details and appearances for the scorekeepers with the given
+    slugs, keyed by slug"""
+    if not slugs:
+        return {}
+
+    query = ("SELECT sk.scorekeeperid AS id, sk.scorekeeper AS name, "
+             "sk.scorekeeperslug AS slug, "
+             + SHOW_COLUMNS + ", skm.guest "
+             "FROM ww_scorekeepers sk "
+             "LEFT JOIN ww_showskmap skm ON skm.scorekeeperid = sk.scorekeeperid "
+             "LEFT JOIN ww_shows s ON s.showid = skm.showid "
+             "WHERE sk.scorekeeperslug IN ({}) "
+             "ORDER BY sk.scorekeeperslug ASC, s.showdate ASC;")
+    return _group_appearances(_fetch(database_connection, query, slugs),
+                              lambda row: _person(row["id"], row["name"], row["slug"]),
+                              lambda row: {"guest": bool(row["guest"])})
+
+def retrieve_location_details(slugs: List[str],
+                              database_connection: mysql.connector.connect) -> Dict[str, Dict]:
+    """Returns details and recordings for the locations with the given
+    slugs, keyed by slug"""
+    if not slugs:
+        return {}
+
+    query = ("SELECT l.locationid AS id, l.city, l.state, l.venue, "
+             "l.locationslug AS slug, "
+             + SHOW_COLUMNS + " "
+             "FROM ww_locations l "
+             "LEFT JOIN ww_showlocationmap lm ON lm.locationid = l.locationid "
+             "LEFT JOIN ww_shows s ON s.showid = lm.showid "
+             "WHERE l.locationslug IN ({}) "
+             "ORDER BY l.locationslug ASC, s.showdate ASC;")
+    return _group_appearances(_fetch(database_connection, query, slugs),
+                              lambda row: {"id": row["id"],
+                                           "city": row["city"],
+                                           "state": row["state"],
+                                           "venue": row["venue"],
+                                           "slug": row["slug"]},
+                              appearances_key="recordings")
+
+def retrieve_panelist_details(slugs: List[str],
+                              database_connection: mysql.connector.connect) -> Dict[str, Dict]:
+    """Returns details, appearances, scoring and ranking statistics and
+    Bluff the Listener counts for the panelists with the given slugs,
+    keyed by slug. Statistics, ranks and milestones only count regular
+    shows."""
+    if not slugs:
+        return {}
+
+    query = ("SELECT p.panelistid AS id, p.panelist AS name, p.panelistslug AS slug, "
+             + SHOW_COLUMNS + ", pm.panelistlrndstart, pm.panelistlrndcorrect, "
+             "pm.panelistscore, pm.showpnlrank "
+             "FROM ww_panelists p "
+             "LEFT JOIN ww_showpnlmap pm ON pm.panelistid = p.panelistid "
+             "LEFT JOIN ww_shows s ON s.showid = pm.showid "
+             "WHERE p.panelistslug IN ({}) "
+             "ORDER BY p.panelistslug ASC, s.showdate ASC;")
+    rows = _fetch(database_connection, query, slugs)
+    details = _group_appearances(rows,
+                                 lambda row: _person(row["id"], row["name"], row["slug"]),
+                                 lambda row: {"lightning_round_start": row["panelistlrndstart"],
+                                              "lightning_round_correct": row["panelistlrndcorrect"],
+                                              "score": row["panelistscore"],
+                                              "rank": row["showpnlrank"]})
+
+    regular_rows = {}
+    for row in rows:
+        if row["showid"] is not None and _is_regular(row):
+            regular_rows.setdefault(row["slug"], []).append(row)
+
+    for slug, panelist in details.items():
+        panelist_rows = regular_rows.get(slug, [])
+        scores = [int(row["panelistscore"]) for row in panelist_rows
+                  if row["panelistscore"] is not None]
+        ranks = [row["showpnlrank"] for row in panelist_rows if row["showpnlrank"]]
+        appearances = panelist["appearances"]
+        appearances["count"]["shows_with_scores"] = len(scores)
+        appearances["milestones"] = {
+            milestone: {"show_id": row["showid"], "show_date": _date_string(row["showdate"])}
+            for milestone, row in (("first", panelist_rows[0]),
+                                   ("most_recent", panelist_rows[-1]))
+        } if panelist_rows else None
+        panelist["statistics"] = {
+            "scoring": _scoring_statistics(scores),
+            "ranking": _ranking_statistics(ranks)
+        } if scores else None
+        panelist["bluffs"] = {"chosen": 0, "correct": 0}
+
+    query = ("SELECT p.panelistslug AS slug, "
+             "SUM(CASE WHEN b.chosenbluffpnlid = p.panelistid THEN 1 ELSE 0 END) AS chosen, "
+             "SUM(CASE WHEN b.correctbluffpnlid = p.panelistid THEN 1 ELSE 0 END) AS correct "
+             "FROM ww_panelists p "
+             "JOIN ww_showbluffmap b ON b.chosenbluffpnlid = p.panelistid "
+             "OR b.correctbluffpnlid = p.panelistid "
+             "JOIN ww_shows s ON s.showid = b.showid "
+             "WHERE s.bestof = 0 AND s.repeatshowid IS NULL "
+             "AND p.panelistslug IN ({}) "
+             "GROUP BY p.panelistslug;")
+    for row in _fetch(database_connection, query, slugs):
+        details[row["slug"]]["bluffs"] = {"chosen": int(row["chosen"]),
+                                          "correct": int(row["correct"])}
+
+    return details
+
+#endregion
+
+#region Show Retrieve Functions
+def retrieve_show_details(show_ids: List[int],
+                          database_connection: mysql.connector.connect) -> Dict[int, Dict]:
+    """Returns the location, host, scorekeeper, panelists, Bluff the
+    Listener panelists, guests, description and notes for the shows with
+    the given IDs, keyed by show ID"""
+    if not show_ids:
+        return {}
+
+    details = {}
+    for row in _fetch(database_connection, SHOW_DETAILS_QUERY, show_ids):
+        if row["showid"] in details:
+            continue
+
+        show = {
+            "id": row["showid"],
+            "date": _date_string(row["showdate"]),
+            "best_of": bool(row["bestof"]),
+            "repeat_show": row["repeatshowid"] is not None,
+            "original_show_date": _date_string(row["originalshowdate"]),
+            "location": {"id": row["locationid"],
+                         "city": row["city"],
+                         "state": row["state"],
+                         "venue": row["venue"],
+                         "slug": row["locationslug"]} if row["locationid"] else None,
+            "description": row["showdescription"],
+            "notes": row["shownotes"],
+            "host": _person(row["hostid"], row["host"], row["hostslug"],
+                            guest=bool(row["hostguest"])),
+            "scorekeeper": _person(row["scorekeeperid"], row["scorekeeper"],
+                                   row["scorekeeperslug"],
+                                   guest=bool(row["scorekeeperguest"]),
+                                   description=row["scorekeeperdescription"]),
+            "panelists": [],
+            "bluff": {
+                "chosen_panelist": _person(row["chosenid"], row["chosenname"],
+                                           row["chosenslug"]),
+                "correct_panelist": _person(row["correctid"], row["correctname"],
+                                            row["correctslug"])
+            },
+            "guests": []
+        }
+        details[row["showid"]] = show
+
+    query = ("SELECT pm.showid, p.panelistid, p.panelist, p.panelistslug, "
+             "pm.panelistlrndstart, pm.panelistlrndcorrect, pm.panelistscore, "
+             "pm.showpnlrank "
+             "FROM ww_showpnlmap pm "
+             "JOIN ww_panelists p ON p.panelistid = pm.panelistid "
+             "WHERE pm.showid IN ({}) "
+             "ORDER BY pm.showid ASC, pm.panelistscore DESC, pm.showpnlrank ASC;")
+    for row in _fetch(database_connection, query, show_ids):
+        details[row["showid"]]["panelists"].append(
+            _person(row["panelistid"], row["panelist"], row["panelistslug"],
+                    lightning_round_start=row["panelistlrndstart"],
+                    lightning_round_correct=row["panelistlrndcorrect"],
+                    score=row["panelistscore"],
+                    rank=row["showpnlrank"]))
+
+    query = ("SELECT gm.showid, g.guestid, g.guest, g.guestslug, gm.guestscore, "
+             "gm.exception "
+             "FROM ww_showguestmap gm "
+             "JOIN ww_guests g ON g.guestid = gm.guestid "
+             "WHERE gm.showid IN ({}) "
+             "ORDER BY gm.showid ASC, g.guest ASC;")
+    for row in _fetch(database_connection, query, show_ids):
+        details[row["showid"]]["guests"].append(
+            _person(row["guestid"], row["guest"], row["guestslug"],
+                    score=row["guestscore"],
+                    score_exception=bool(row["exception"])))
+
+    return details
+
+#endregion
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Keyset pagination functions used by the Stats Page
+
+Pages are addressed by the slug or show date of the last entry on the
+previous page (after) or of the first entry on the following page
+(before), so a page only reads the keys it needs and page boundaries do
+not shift when entries are added elsewhere in the list."""
+
+from datetime import date
+from typing import Dict, List, Optional
+
+import mysql.connector
+
+from stats.locations.index import PLACEHOLDER_LOCATION_IDS
+
+#region Constants
+DEFAULT_PAGE_SIZE = 25
+
+# Table, slug column and filter excluding placeholder entries for each
+# paginated entity
+SLUG_ENTITIES = {
+    "guests": ("ww_guests", "guestslug", "guestslug <> 'none'"),
+    "hosts": ("ww_hosts", "hostslug", "hostslug <> 'tbd'"),
+    "locations": ("ww_locations", "locationslug",
+                  "locationid NOT IN ("
+                  + ", ".join(str(location_id) for location_id in PLACEHOLDER_LOCATION_IDS)
+                  + ")"),
+    "panelists": ("ww_panelists", "panelistslug", "panelistslug <> 'multiple'"),
+    "scorekeepers": ("ww_scorekeepers", "scorekeeperslug", None)
+}
+#endregion
+
+#region Utility Functions
+def parse_show_date_cursor(value: str) -> Optional[date]:
+    """Returns the show date for a show date cursor, or None if the cursor
+    is not a valid ISO 8601 date"""
+    if not value:
+        return None
+
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+def _page(keys: List, after, before, page_size: int) -> Dict:
+    """Trim a list of up to page_size + 1 keys, in list order, and return
+    the page along with the cursors for the adjacent pages"""
+    if before is not None:
+        has_previous = len(keys) > page_size
+        keys = keys[-page_size:]
+        has_next = True
+    else:
+        has_next = len(keys) > page_size
+        keys = keys[:page_size]
+        has_previous = after is not None
+
+    return {
+        "keys": keys,
+        "after": keys[-1] if keys and has_next else None,
+        "before": keys[0] if keys and has_previous else None
+    }
+
+#endregion
+
+#region Retrieve Functions
+def retrieve_slug_page(entity: str,
+                       database_connection: mysql.connector.connect,
+                       after: str = None,
+                       before: str = None,
+                       page_size: int = DEFAULT_PAGE_SIZE) -> Dict:
+    """Returns one page of slugs for an entity, in slug order, along with
+    the after and before cursors for the next and previous pages"""
+    table, slug_column, entity_filter = SLUG_ENTITIES[entity]
+    conditions = []
+    parameters = []
+    if entity_filter:
+        conditions.append(entity_filter)
+    if before is not None:
+        conditions.append(f"{slug_column} < %s")
+        parameters.append(before)
+        order = "DESC"
+    else:
+        if after is not None:
+            conditions.append(f"{slug_column} > %s")
+            parameters.append(after)
+        order = "ASC"
+
+    database_connection.reconnect()
+    cursor = database_connection.cursor()
+    query = f"SELECT {slug_column} FROM {table} "
+    if conditions:
+        query += "WHERE " + " AND ".join(conditions) + " "
+    query += f"ORDER BY {slug_column} {order} LIMIT %s;"
+    parameters.append(page_size + 1)
+    cursor.execute(query, tuple(parameters))
+    result = cursor.fetchall()
+    cursor.close()
+
+    slugs = [row[0] for row in result]
+    if before is not None:
+        slugs.reverse()
+
+    return _page(slugs, after, before, page_size)
+
+def retrieve_show_page(database_connection: mysql.connector.connect,
+                       after: date = None,
+                       before: date = None,
+                       page_size: int = DEFAULT_PAGE_SIZE) -> Dict:
+    """Returns one page of show IDs in show date order, along with the
+    show date cursors for the next and previous pages"""
+    database_connection.reconnect()
+    cursor = database_connection.cursor()
+    if before is not None:
+        query = ("SELECT showid, showdate FROM ww_shows WHERE showdate < %s "
+                 "ORDER BY showdate DESC LIMIT %s;")
+        cursor.execute(query, (before, page_size + 1, ))
+    elif after is not None:
+        query = ("SELECT showid, showdate FROM ww_shows WHERE showdate > %s "
+                 "ORDER BY showdate ASC LIMIT %s;")
+        cursor.execute(query, (after, page_size + 1, ))
+    else:
+        query = ("SELECT showid, showdate FROM ww_shows "
+                 "ORDER BY showdate ASC LIMIT %s;")
+        cursor.execute(query, (page_size + 1, ))
+    result = cursor.fetchall()
+    cursor.close()
+
+    if before is not None:
+        result.reverse()
+
+    show_ids = {row[1]: row[0] for row in result}
+    page = _page([row[1] for row in result], after, before, page_size)
+    page["show_ids"] = [show_ids[show_date] for show_date in page["keys"]]
+    return page
+
+def retrieve_page_cursors(entity: str,
+                          database_connection: mysql.connector.connect,
+                          page_size: int = DEFAULT_PAGE_SIZE) -> List:
+    """Returns the after cursor for every page of an entity, starting
+    with None for the first page. Used to list pages in the sitemap."""
+    database_connection.reconnect()
+    cursor = database_connection.cursor()
+    if entity == "shows":
+        query = "SELECT showdate FROM ww_shows ORDER BY showdate ASC;"
+    else:
+        table, slug_column, entity_filter = SLUG_ENTITIES[entity]
+        where = "WHERE " + entity_filter if entity_filter else ""
+        query = f"SELECT {slug_column} FROM {table} {where} ORDER BY {slug_column} ASC;"
+    cursor.execute(query)
+    result = cursor.fetchall()
+    cursor.close()
+
+    keys = [row[0] for row in result]
+    return [None] + keys[page_size - 1:-1:page_size]
+
+#endregion
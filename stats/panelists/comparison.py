@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Panelist head-to-head comparison functions used by the Stats Page"""
+
+from typing import Dict, List
+
+import mysql.connector
+import numpy
+
+from stats.data_version import DataVersionTracker
+
+#region Constants
+RANK_ORDER = ("1", "1t", "2", "2t", "3")
+#endregion
+
+#region Retrieve Functions
+def retrieve_panelist_scores(database_connection: mysql.connector.connect) -> List[Dict]:
+    """Returns panelist appearance, score and rank rows for all regular
+    shows in a single query, ordered by show date"""
+    # pylint: disable=duplicate-code
+    database_connection.reconnect()
+    cursor = database_connection.cursor(dictionary=True)
+    query = ("SELECT pm.showid, s.showdate, p.panelistid, p.panelist, "
+             "p.panelistslug, pm.panelistscore, pm.showpnlrank "
+             "FROM ww_showpnlmap pm "
+             "JOIN ww_shows s ON s.showid = pm.showid "
+             "JOIN ww_panelists p ON p.panelistid = pm.panelistid "
+             "WHERE s.bestof = 0 AND s.repeatshowid IS NULL "
+             "AND p.panelistslug <> 'multiple' "
+             "ORDER BY s.showdate ASC;")
+    cursor.execute(query)
+    result = cursor.fetchall()
+    cursor.close()
+
+    if not result:
+        return []
+
+    return result
+
+#endregion
+
+#region Comparison Class
+class PanelistComparison:
+    """Head-to-head panelist statistics computed from NumPy arrays of
+    panelist scores and ranks, with one row per show and one column per
+    panelist"""
+
+    def __init__(self, rows: List[Dict]):
+        show_ids = []
+        show_index = {}
+        self.show_dates = []
+        self.panelists = []
+        self.panelist_index = {}
+        for row in rows:
+            if row["showid"] not in show_index:
+                show_index[row["showid"]] = len(show_ids)
+                show_ids.append(row["showid"])
+                self.show_dates.append(row["showdate"].isoformat())
+            if row["panelistslug"] not in self.panelist_index:
+                self.panelist_index[row["panelistslug"]] = len(self.panelists)
+                self.panelists.append({"id": row["panelistid"],
+                                       "name": row["panelist"],
+                                       "slug": row["panelistslug"]})
+
+        shape = (len(show_ids), len(self.panelists))
+        self.appearances = numpy.zeros(shape, dtype=bool)
+        self.scores = numpy.full(shape, numpy.nan)
+        self.ranks = numpy.full(shape, -1, dtype=numpy.int8)
+        for row in rows:
+            show = show_index[row["showid"]]
+            panelist = self.panelist_index[row["panelistslug"]]
+            self.appearances[show, panelist] = True
+            if row["panelistscore"] is not None:
+                self.scores[show, panelist] = float(row["panelistscore"])
+            if row["showpnlrank"] in RANK_ORDER:
+                self.ranks[show, panelist] = RANK_ORDER.index(row["showpnlrank"])
+
+        self._matrices = None
+
+    def all_pairs(self) -> Dict[str, numpy.ndarray]:
+        """Returns panelist by panelist matrices of shared appearances,
+        wins, losses, ties and total score differentials. Each matrix is
+        indexed as [panelist, opponent]."""
+        if self._matrices is not None:
+            return self._matrices
+
+        appearances = self.appearances.astype(numpy.int32)
+        count = len(self.panelists)
+        wins = numpy.zeros((count, count), dtype=numpy.int32)
+        ties = numpy.zeros((count, count), dtype=numpy.int32)
+        scored = numpy.zeros((count, count), dtype=numpy.int32)
+        differential = numpy.zeros((count, count))
+        with numpy.errstate(invalid="ignore"):
+            for panelist in range(count):
+                difference = self.scores[:, [panelist]] - self.scores
+                valid = ~numpy.isnan(difference)
+                wins[panelist] = numpy.count_nonzero(difference > 0, axis=0)
+                ties[panelist] = numpy.count_nonzero(difference == 0, axis=0)
+                scored[panelist] = numpy.count_nonzero(valid, axis=0)
+                differential[panelist] = numpy.where(valid, difference, 0).sum(axis=0)
+
+        self._matrices = {
+            "shared": appearances.T @ appearances,
+            "scored": scored,
+            "wins": wins,
+            "losses": wins.T,
+            "ties": ties,
+            "differential": differential
+        }
+        return self._matrices
+
+    def _pairs(self, indexes: List[int]) -> List[Dict]:
+        """Returns head-to-head statistics for each pair of panelists"""
+        matrices = self.all_pairs()
+        pairs = []
+        for position, panelist in enumerate(indexes):
+            for opponent in indexes[position + 1:]:
+                scored = int(matrices["scored"][panelist, opponent])
+                differential = float(matrices["differential"][panelist, opponent])
+                pairs.append({
+                    "panelist": self.panelists[panelist],
+                    "opponent": self.panelists[opponent],
+                    "shared_appearances": int(matrices["shared"][panelist, opponent]),
+                    "shows_with_scores": scored,
+                    "wins": int(matrices["wins"][panelist, opponent]),
+                    "losses": int(matrices["losses"][panelist, opponent]),
+                    "ties": int(matrices["ties"][panelist, opponent]),
+                    "score_differential": round(differential, 2),
+                    "mean_score_differential": round(differential / scored, 2) if scored else None
+                })
+
+        return pairs
+
+    def compare(self, panelist_slugs: List[str]) -> Dict:
+        """Returns head-to-head statistics for two or more panelists"""
+        indexes = [self.panelist_index[slug] for slug in panelist_slugs
+                   if slug in self.panelist_index]
+        if len(indexes) < 2:
+            return None
+
+        # Rank distributions only cover shows where every selected
+        # panelist appeared together
+        shared_shows = numpy.flatnonzero(self.appearances[:, indexes].all(axis=1))
+        ranks = self.ranks[numpy.ix_(shared_shows, indexes)]
+        scores = self.scores[numpy.ix_(shared_shows, indexes)]
+        panelists = []
+        for column, panelist in enumerate(indexes):
+            counts = numpy.bincount(ranks[:, column][ranks[:, column] >= 0],
+                                    minlength=len(RANK_ORDER))
+            panelist_scores = scores[:, column][~numpy.isnan(scores[:, column])]
+            panelists.append({
+                "panelist": self.panelists[panelist],
+                "ranks": {rank: int(counts[position])
+                          for position, rank in enumerate(RANK_ORDER)},
+                "mean_score": (round(float(panelist_scores.mean()), 2)
+                               if panelist_scores.size else None)
+            })
+
+        return {
+            "shared_shows": [self.show_dates[show] for show in shared_shows],
+            "pairs": self._pairs(indexes),
+            "panelists": panelists
+        }
+
+#endregion
+
+#region Cache Class
+class PanelistComparisonCache:  # pylint: disable=too-few-public-methods
+    """Holds a PanelistComparison built from a single bulk query, along
+    with its all-pairs matrices, and rebuilds it when the data version
+    changes"""
+
+    def __init__(self,
+                 database_connection: mysql.connector.connect,
+                 data_version: DataVersionTracker):
+        self.database_connection = database_connection
+        self.data_version = data_version
+        self._comparison = None
+        self._version = None
+
+    def retrieve(self) -> PanelistComparison:
+        """Returns the comparison for the current data version"""
+        version = self.data_version.current()
+        if self._comparison is None or version != self._version:
+            rows = retrieve_panelist_scores(self.database_connection)
+            self._comparison = PanelistComparison(rows)
+            self._comparison.all_pairs()
+            self._version = version
+
+        return self._comparison
+
+#endregion
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Panelist appearance streak and milestone functions used by the Stats
+Page
+
+The appearance timeline for regular shows is scanned once in show date
+order, keeping running streak and gap state for each panelist. When new
+shows are added, only appearances from those shows are read and scanned,
+and only the panelists that appeared in them are updated. Appearances that
+were already scanned are checked with a single aggregate query."""
+
+from bisect import bisect_right
+from datetime import date
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import mysql.connector
+
+from stats.data_version import DataVersionTracker
+
+#region Constants
+APPEARANCE_MILESTONES = (1, 10, 25, 50, 75, 100, 150, 200, 250, 300, 400, 500)
+WIN_RANKS = ("1", "1t")
+
+APPEARANCE_FILTER = ("FROM ww_showpnlmap pm "
+                     "JOIN ww_shows s ON s.showid = pm.showid "
+                     "JOIN ww_panelists p ON p.panelistid = pm.panelistid "
+                     "WHERE s.bestof = 0 AND s.repeatshowid IS NULL "
+                     "AND p.panelistslug <> 'multiple' "
+                     "AND s.showdate <= NOW() ")
+WIN_FILTER = "pm.showpnlrank IN ('1', '1t')"
+#endregion
+
+#region Retrieve Functions
+def retrieve_panelist_appearances(database_connection: mysql.connector.connect,
+                                  after: date = None) -> List[Dict]:
+    """Returns panelist appearances and ranks for regular shows in show
+    date order, optionally limited to shows that aired after a date"""
+    # pylint: disable=duplicate-code
+    database_connection.reconnect()
+    cursor = database_connection.cursor(dictionary=True)
+    query = ("SELECT pm.showid, s.showdate, pm.panelistid, p.panelistslug, pm.showpnlrank "
+             + APPEARANCE_FILTER
+             + ("AND s.showdate > %s " if after else "")
+             + "ORDER BY s.showdate ASC, pm.showid ASC, pm.panelistid ASC;")
+    cursor.execute(query, (after.isoformat(), ) if after else ())
+    result = cursor.fetchall()
+    cursor.close()
+
+    if not result:
+        return []
+
+    return result
+
+def retrieve_appearance_summary(database_connection: mysql.connector.connect,
+                                through: date) -> Tuple[int, ...]:
+    """Returns the summary of panelist appearances for regular shows that
+    aired on or before a date, matching the summary kept by
+    MilestoneTimeline"""
+    database_connection.reconnect()
+    cursor = database_connection.cursor()
+    query = ("SELECT COUNT(*), COUNT(DISTINCT pm.showid), "
+             f"COALESCE(SUM(CASE WHEN {WIN_FILTER} THEN 1 ELSE 0 END), 0), "
+             "COALESCE(SUM(pm.panelistid), 0), "
+             "COALESCE(SUM(pm.panelistid * pm.showid), 0), "
+             f"COALESCE(SUM(CASE WHEN {WIN_FILTER} THEN pm.panelistid * pm.showid "
+             "ELSE 0 END), 0) "
+             + APPEARANCE_FILTER
+             + "AND s.showdate <= %s;")
+    cursor.execute(query, (through.isoformat(), ))
+    result = cursor.fetchone()
+    cursor.close()
+
+    return tuple(int(value) for value in result)
+
+#endregion
+
+#region Timeline Classes
+class PanelistTimeline:  # pylint: disable=too-many-instance-attributes
+    """Sorted appearance arrays for a single panelist, along with the
+    running state needed to extend streaks and gaps as new appearances
+    are added"""
+
+    def __init__(self, slug: str):
+        self.slug = slug
+        self.show_indexes = []
+        self.dates = []
+        self.wins = 0
+        self.longest_streak = None
+        self.longest_win_streak = None
+        self.longest_gap = None
+        self._streak_start = None
+        self._win_streak_start = None
+        self._win_streak_length = 0
+
+    def add(self, show_index: int, show_date: date, rank: str):
+        """Add an appearance, which must come after all appearances that
+        have already been added"""
+        if self.show_indexes and show_index - self.show_indexes[-1] == 1:
+            streak_length = len(self.show_indexes) - self._streak_start + 1
+        else:
+            if self.show_indexes:
+                gap = {
+                    "shows": show_index - self.show_indexes[-1] - 1,
+                    "days": (show_date - self.dates[-1]).days,
+                    "start": self.dates[-1],
+                    "end": show_date
+                }
+                if not self.longest_gap or gap["shows"] > self.longest_gap["shows"]:
+                    self.longest_gap = gap
+
+            self._streak_start = len(self.show_indexes)
+            streak_length = 1
+
+        self.show_indexes.append(show_index)
+        self.dates.append(show_date)
+        if not self.longest_streak or streak_length > self.longest_streak["length"]:
+            self.longest_streak = {
+                "length": streak_length,
+                "start": self.dates[self._streak_start],
+                "end": show_date
+            }
+
+        # Win streaks count consecutive wins across the panelist's own
+        # appearances, regardless of any shows they did not appear on
+        if rank in WIN_RANKS:
+            self.wins += 1
+            if not self._win_streak_length:
+                self._win_streak_start = show_date
+            self._win_streak_length += 1
+            if (not self.longest_win_streak
+                    or self._win_streak_length > self.longest_win_streak["length"]):
+                self.longest_win_streak = {
+                    "length": self._win_streak_length,
+                    "start": self._win_streak_start,
+                    "end": show_date
+                }
+        else:
+            self._win_streak_length = 0
+
+    def nth_appearance(self, number: int) -> Optional[date]:
+        """Returns the date of the panelist's Nth appearance"""
+        if number < 1 or number > len(self.dates):
+            return None
+
+        return self.dates[number - 1]
+
+    def appearances_through(self, show_date: date) -> int:
+        """Returns the number of appearances on or before a given date"""
+        return bisect_right(self.dates, show_date)
+
+    def milestones(self, last_show_index: int) -> Dict:
+        """Returns streak, gap and appearance milestone details"""
+        current_streak = 0
+        if self.show_indexes and self.show_indexes[-1] == last_show_index:
+            current_streak = len(self.show_indexes) - self._streak_start
+
+        return {
+            "appearances": len(self.dates),
+            "wins": self.wins,
+            "first_appearance": self.dates[0] if self.dates else None,
+            "most_recent_appearance": self.dates[-1] if self.dates else None,
+            "appearance_milestones": [{"appearance": number,
+                                       "date": self.nth_appearance(number)}
+                                      for number in APPEARANCE_MILESTONES
+                                      if number <= len(self.dates)],
+            "longest_streak": self.longest_streak,
+            "current_streak": current_streak,
+            "longest_win_streak": self.longest_win_streak,
+            "current_win_streak": self._win_streak_length,
+            "longest_gap": self.longest_gap
+        }
+
+class MilestoneTimeline:
+    """Appearance timelines for all panelists, built from appearances
+    ordered by show date"""
+
+    def __init__(self):
+        self.show_dates = []
+        self.panelists = {}
+        self._show_ids = {}
+        self._totals = [0] * 6
+
+    @property
+    def summary(self) -> Tuple[int, ...]:
+        """Returns the number of appearances, shows and wins that have
+        been scanned, along with sums of the panelist ID and of the
+        panelist ID weighted by the show ID for all appearances and for
+        wins. The sums detect changes to appearances that were already
+        scanned, including an appearance or win moved from one panelist
+        or show to another."""
+        return tuple(self._totals)
+
+    @property
+    def last_show_date(self) -> Optional[date]:
+        """Returns the date of the most recent show that has been scanned"""
+        return self.show_dates[-1] if self.show_dates else None
+
+    def extend(self, rows: List[Dict]) -> List[str]:
+        """Scan appearances from shows that aired after the last scanned
+        show and return the slugs of the panelists that were updated"""
+        updated = []
+        for row in rows:
+            if row["showid"] not in self._show_ids:
+                self._show_ids[row["showid"]] = len(self.show_dates)
+                self.show_dates.append(row["showdate"])
+
+            weighted_id = row["panelistid"] * row["showid"]
+            self._totals[0] += 1
+            self._totals[3] += row["panelistid"]
+            self._totals[4] += weighted_id
+            if row["showpnlrank"] in WIN_RANKS:
+                self._totals[2] += 1
+                self._totals[5] += weighted_id
+
+            slug = row["panelistslug"]
+            if slug not in self.panelists:
+                self.panelists[slug] = PanelistTimeline(slug)
+            self.panelists[slug].add(self._show_ids[row["showid"]],
+                                     row["showdate"],
+                                     row["showpnlrank"])
+            if slug not in updated:
+                updated.append(slug)
+
+        self._totals[1] = len(self.show_dates)
+        return updated
+
+    def milestones(self, panelist_slug: str) -> Optional[Dict]:
+        """Returns streak and milestone details for a panelist"""
+        timeline = self.panelists.get(panelist_slug)
+        if not timeline:
+            return None
+
+        return timeline.milestones(len(self.show_dates) - 1)
+
+#endregion
+
+#region Cache Class
+class PanelistMilestonesCache:
+    """Holds panelist milestone results for the current data version.
+    When the data version changes, appearances from newly added shows are
+    scanned onto the end of the existing timelines, and only results for
+    the panelists in those shows are recomputed. The timelines are rebuilt
+    from scratch if the summary of the appearances that were already
+    scanned no longer matches the database."""
+
+    def __init__(self,
+                 database_connection: mysql.connector.connect,
+                 data_version: DataVersionTracker):
+        self.database_connection = database_connection
+        self.data_version = data_version
+        self._lock = threading.Lock()
+        self._timeline = None
+        self._results = {}
+        self._version = None
+
+    def _is_current(self, timeline: Optional[MilestoneTimeline]) -> bool:
+        """Returns whether the appearances already scanned by a timeline
+        are unchanged"""
+        if not timeline or not timeline.last_show_date:
+            return False
+
+        return retrieve_appearance_summary(self.database_connection,
+                                           timeline.last_show_date) == timeline.summary
+
+    def update(self) -> List[str]:
+        """Bring the timelines up to date and return the slugs of the
+        panelists whose results were recomputed"""
+        with self._lock:
+            timeline = self._timeline
+            if self._is_current(timeline):
+                rows = retrieve_panelist_appearances(self.database_connection,
+                                                     after=timeline.last_show_date)
+            else:
+                timeline = MilestoneTimeline()
+                self._results = {}
+                rows = retrieve_panelist_appearances(self.database_connection)
+
+            updated = timeline.extend(rows)
+            self._timeline = timeline
+
+            # Current streaks are measured against the latest show, so
+            # results for panelists that missed a new show are stale too
+            if rows:
+                for slug, results in self._results.items():
+                    if slug not in updated and results["current_streak"]:
+                        updated.append(slug)
+
+            for slug in updated:
+                self._results[slug] = timeline.milestones(slug)
+
+            return updated
+
+    def retrieve(self, panelist_slug: str) -> Optional[Dict]:
+        """Returns streak and milestone details for a panelist for the
+        current data version"""
+        version = self.data_version.current()
+        if self._timeline is None or version != self._version:
+            self.update()
+            self._version = version
+
+        return self._results.get(panelist_slug)
+
+#endregion
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Access log replay functions used to load test the Stats Page
+
+Requests are parsed from nginx combined format or uWSGI request logs,
+classified into route categories, and replayed either against a running
+instance over HTTP or against the Flask application in-process. Replays
+report throughput, latency percentiles, error rates and the hit ratios a
+response cache of various sizes would have had for the same traffic."""
+
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import math
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.error import HTTPError, URLError
+from urllib.request import (build_opener, HTTPErrorProcessor,
+                            HTTPRedirectHandler, Request)
+
+#region Constants
+NGINX_LOG_PATTERN = re.compile(r'^\S+ \S+ \S+ \[(?P<time>[^\]]+)\] '
+                               r'"(?P<method>[A-Z]+) (?P<path>\S+)[^"]*" '
+                               r'(?P<status>\d{3}) ')
+NGINX_TIME_FORMAT = "%d/%b/%Y:%H:%M:%S %z"
+
+UWSGI_LOG_PATTERN = re.compile(r'^\[pid: \d+\|app: \S+\|req: \S+\] \S+ .*?'
+                               r'\[(?P<time>\w{3} \w{3} +\d+ [\d:]+ \d{4})\] '
+                               r'(?P<method>[A-Z]+) (?P<path>\S+) => .*?'
+                               r'\(HTTP/[\d.]+ (?P<status>\d{3})\)')
+UWSGI_TIME_FORMAT = "%a %b %d %H:%M:%S %Y"
+
+ROUTE_CATEGORIES = (("static", re.compile(r"^/static/|^/favicon\.ico$")),
+                    ("sitemap", re.compile(r"^/sitemap[\w-]*\.xml$")),
+                    ("random", re.compile(r"/random$")),
+                    ("all", re.compile(r"/all$|/browse$")),
+                    ("redirect", re.compile(r"^/s/|^/(guest|host|location|panelist|"
+                                            r"scorekeeper|show)$")),
+                    ("listing", re.compile(r"^/$|^/(guests|hosts|locations|panelists|"
+                                           r"scorekeepers|shows)$")))
+
+# Categories whose responses would be served from a response cache.
+# Random pages redirect somewhere different on every request.
+CACHEABLE_CATEGORIES = ("sitemap", "all", "listing", "detail")
+
+DEFAULT_CACHE_SIZES = (64, 256, 1024)
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+#endregion
+
+#region Log Parsing Functions
+def classify_path(path: str) -> str:
+    """Returns the route category for a request path. Paths that do not
+    match any other category are treated as detail pages."""
+    path = path.split("?", 1)[0].rstrip("/") or "/"
+    for category, pattern in ROUTE_CATEGORIES:
+        if pattern.search(path):
+            return category
+
+    return "detail"
+
+def parse_log_line(line: str) -> Optional[Dict]:
+    """Returns the method, path, status, timestamp and route category
+    for an nginx combined format or uWSGI request log line"""
+    for pattern, time_format in ((NGINX_LOG_PATTERN, NGINX_TIME_FORMAT),
+                                 (UWSGI_LOG_PATTERN, UWSGI_TIME_FORMAT)):
+        match = pattern.search(line)
+        if not match:
+            continue
+
+        try:
+            timestamp = datetime.strptime(match.group("time"), time_format).timestamp()
+        except ValueError:
+            timestamp = None
+
+        return {
+            "method": match.group("method"),
+            "path": match.group("path"),
+            "status": int(match.group("status")),
+            "timestamp": timestamp,
+            "category": classify_path(match.group("path"))
+        }
+
+    return None
+
+def parse_log(lines: Iterable[str],
+              include_static: bool = False,
+              limit: int = None) -> List[Dict]:
+    """Returns the GET requests from access log lines in log order"""
+    requests = []
+    for line in lines:
+        entry = parse_log_line(line)
+        if not entry or entry["method"] != "GET":
+            continue
+        if entry["category"] == "static" and not include_static:
+            continue
+
+        requests.append(entry)
+        if limit and len(requests) >= limit:
+            break
+
+    return requests
+
+def route_mix(requests: List[Dict]) -> Dict[str, float]:
+    """Returns the percentage of requests in each route category"""
+    counts = Counter(request["category"] for request in requests)
+    total = sum(counts.values())
+    return OrderedDict((category, round(100 * count / total, 2))
+                       for category, count in counts.most_common())
+
+#endregion
+
+#region Cache Simulation Functions
+def simulate_cache(requests: List[Dict],
+                   max_entries: int,
+                   ttl: float = None) -> Dict:
+    """Returns the hit ratio an LRU response cache keyed by request path
+    would have had for a sequence of requests, overall and by category.
+    Entries older than ttl seconds, by log timestamp, count as misses."""
+    cache = OrderedDict()
+    lookups = Counter()
+    hits = Counter()
+    for position, request in enumerate(requests):
+        category = request["category"]
+        if category not in CACHEABLE_CATEGORIES:
+            continue
+
+        key = request["path"]
+        now = request["timestamp"] if request["timestamp"] is not None else position
+        lookups[category] += 1
+        if key in cache and (ttl is None or now - cache[key] < ttl):
+            hits[category] += 1
+            cache.move_to_end(key)
+            continue
+
+        cache[key] = now
+        cache.move_to_end(key)
+        while len(cache) > max_entries:
+            cache.popitem(last=False)
+
+    total_lookups = sum(lookups.values())
+    return {
+        "max_entries": max_entries,
+        "lookups": total_lookups,
+        "hit_ratio": round(sum(hits.values()) / total_lookups, 4) if total_lookups else None,
+        "categories": {category: round(hits[category] / lookups[category], 4)
+                       for category in lookups}
+    }
+
+#endregion
+
+#region Replay Functions
+class _NoRedirectHandler(HTTPRedirectHandler):
+    """Return redirect responses as-is so that redirect routes are timed
+    on their own rather than together with their targets"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        return None
+
+class _StatusProcessor(HTTPErrorProcessor):
+    """Return error responses instead of raising exceptions"""
+
+    def http_response(self, request, response):
+        return response
+
+    https_response = http_response
+
+def http_client(base_url: str, timeout: float = 30) -> Callable[[str], int]:
+    """Returns a function that requests a path from a running instance of
+    the Stats Page and returns the response status code"""
+    opener = build_opener(_NoRedirectHandler, _StatusProcessor)
+    base_url = base_url.rstrip("/")
+
+    def fetch(path: str) -> int:
+        request = Request(base_url + path,
+                          headers={"Accept-Encoding": "gzip, br",
+                                   "User-Agent": "stats-replay"})
+        try:
+            with opener.open(request, timeout=timeout) as response:
+                response.read()
+                return response.status
+        except HTTPError as error:
+            return error.code
+
+    return fetch
+
+def wsgi_client(app) -> Callable[[str], int]:
+    """Returns a function that requests a path from a Flask application
+    in-process and returns the response status code. The application's
+    database connection is shared by every thread in the process, so the
+    function must only be called from one thread at a time."""
+    local = threading.local()
+
+    def fetch(path: str) -> int:
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        response = local.client.get(path, headers={"Accept-Encoding": "gzip, br"})
+        response.close()
+        return response.status_code
+
+    return fetch
+
+def percentile(values: List[float], percent: float) -> Optional[float]:
+    """Returns a percentile of a list of values using the nearest-rank
+    method"""
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+def replay(requests: List[Dict],
+           fetch: Callable[[str], int],
+           concurrency: int = 4,
+           speed: float = 0) -> List[Tuple[Dict, int, float]]:
+    """Replay requests with a given number of concurrent workers and
+    return the status code and latency for each request. With a speed
+    greater than zero, requests are issued following the gaps between log
+    timestamps divided by speed; otherwise they are issued as fast as the
+    workers allow."""
+    def run(request: Dict) -> Tuple[Dict, int, float]:
+        start_time = time.perf_counter()
+        try:
+            status = fetch(request["path"])
+        except (URLError, OSError):
+            status = 0
+        return request, status, time.perf_counter() - start_time
+
+    first_timestamp = next((request["timestamp"] for request in requests
+                            if request["timestamp"] is not None), None)
+    start_time = time.monotonic()
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for request in requests:
+            if speed > 0 and first_timestamp is not None and request["timestamp"] is not None:
+                delay = (request["timestamp"] - first_timestamp) / speed
+                wait = start_time + delay - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+
+            futures.append(executor.submit(run, request))
+
+    return [future.result() for future in futures]
+
+def summarize(results: List[Tuple[Dict, int, float]],
+              elapsed: float,
+              percentiles: Iterable[int] = DEFAULT_PERCENTILES) -> Dict:
+    """Returns throughput, latency percentiles in milliseconds, status
+    counts and error rates for replay results, overall and by category"""
+    def latency_summary(latencies: List[float]) -> Dict:
+        summary = OrderedDict()
+        for percent in percentiles:
+            value = percentile(latencies, percent)
+            summary[f"p{percent}"] = round(value * 1000, 2) if value is not None else None
+        summary["max"] = round(max(latencies) * 1000, 2) if latencies else None
+        return summary
+
+    latencies = [latency for _, _, latency in results]
+    statuses = Counter(status for _, status, _ in results)
+    errors = sum(count for status, count in statuses.items()
+                 if status == 0 or status >= 500)
+    categories = OrderedDict()
+    for category in sorted({request["category"] for request, _, _ in results}):
+        category_results = [result for result in results if result[0]["category"] == category]
+        category_errors = sum(1 for _, status, _ in category_results
+                              if status == 0 or status >= 500)
+        categories[category] = {
+            "requests": len(category_results),
+            "error_rate": round(category_errors / len(category_results), 4),
+            "latency_ms": latency_summary([latency for _, _, latency in category_results])
+        }
+
+    return {
+        "requests": len(results),
+        "elapsed": round(elapsed, 3),
+        "throughput": round(len(results) / elapsed, 2) if elapsed else None,
+        "error_rate": round(errors / len(results), 4) if results else None,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "latency_ms": latency_summary(latencies),
+        "categories": categories
+    }
+
+#endregion
@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Latency-aware read routing across database replicas used by the
+Stats Page"""
+
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import Flask
+import mysql.connector
+
+from stats.circuit_breaker import CircuitBreaker, STATE_CLOSED
+
+#region Constants
+DATABASE_ERRORS = (mysql.connector.Error, sqlite3.Error)
+
+# Errors raised when a database cannot be reached or stops responding, as
+# opposed to errors caused by the query itself
+UNAVAILABLE_ERRORS = (mysql.connector.errors.InterfaceError,
+                      mysql.connector.errors.OperationalError)
+
+# SQLite raises OperationalError for query errors such as syntax errors and
+# unknown functions or columns as well, so only lock and I/O errors count
+SQLITE_UNAVAILABLE_MESSAGES = ("database is locked",
+                               "database table is locked",
+                               "unable to open",
+                               "disk i/o error")
+
+SELECTION_LEAST_LATENCY = "least_latency"
+SELECTION_WEIGHTED = "weighted"
+
+DEFAULT_HEALTH_CHECK_INTERVAL = 30
+DEFAULT_EJECT_AFTER_FAILURES = 3
+DEFAULT_EJECT_SECONDS = 60
+DEFAULT_MAX_LATENCY = 0.5
+DEFAULT_LATENCY_ALPHA = 0.3
+#endregion
+
+#region Error Functions
+def is_unavailable_error(error: Exception) -> bool:
+    """Returns whether an error was raised because the database could not
+    be reached or stopped responding"""
+    if isinstance(error, UNAVAILABLE_ERRORS):
+        return True
+
+    if isinstance(error, sqlite3.OperationalError):
+        message = str(error).lower()
+        return any(text in message for text in SQLITE_UNAVAILABLE_MESSAGES)
+
+    return False
+
+#endregion
+
+#region Replica Class
+class Replica:  # pylint: disable=too-many-instance-attributes
+    """A single database replica, along with its health and latency
+    tracking state"""
+
+    def __init__(self,
+                 name: str,
+                 connect: Callable[[], Any],
+                 weight: int = 1):
+        self.name = name
+        self.weight = max(weight, 0)
+        self.latency = None
+        self.ping_latency = None
+        self.failures = 0
+        self.ejected_until = 0.0
+        self._connect = connect
+        self._connection = None
+        self._ping_connection = None
+
+    @property
+    def connection(self):
+        """Returns the connection to the replica, opening it if needed"""
+        if self._connection is None:
+            self._connection = self._connect()
+
+        return self._connection
+
+    def is_ejected(self, now: float = None) -> bool:
+        """Returns whether the replica is currently ejected"""
+        return (now or time.monotonic()) < self.ejected_until
+
+    def record_latency(self, elapsed: float, alpha: float = DEFAULT_LATENCY_ALPHA):
+        """Update the exponentially weighted moving average query latency
+        used to select a replica"""
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency = alpha * elapsed + (1 - alpha) * self.latency
+
+    def record_ping_latency(self, elapsed: float, alpha: float = DEFAULT_LATENCY_ALPHA):
+        """Update the exponentially weighted moving average health check
+        latency used to decide whether to eject the replica"""
+        if self.ping_latency is None:
+            self.ping_latency = elapsed
+        else:
+            self.ping_latency = alpha * elapsed + (1 - alpha) * self.ping_latency
+
+    def ping(self) -> float:
+        """Run a trivial query against the replica and return the number
+        of seconds it took. Health checks use their own connection so that
+        they can run alongside requests."""
+        start_time = time.perf_counter()
+        if self._ping_connection is None:
+            self._ping_connection = self._connect()
+        connection = self._ping_connection
+        connection.reconnect()
+        cursor = connection.cursor()
+        cursor.execute("SELECT 1;")
+        cursor.fetchall()
+        cursor.close()
+        return time.perf_counter() - start_time
+
+    @staticmethod
+    def _close_connection(connection):
+        try:
+            connection.close()
+        except DATABASE_ERRORS:
+            pass
+
+    def close_ping(self):
+        """Close the health check connection to the replica, if open"""
+        if self._ping_connection is not None:
+            self._close_connection(self._ping_connection)
+            self._ping_connection = None
+
+    def close(self):
+        """Close the connection to the replica, if open"""
+        if self._connection is not None:
+            self._close_connection(self._connection)
+            self._connection = None
+
+    def status(self) -> Dict:
+        """Returns the current replica state"""
+        return {
+            "name": self.name,
+            "weight": self.weight,
+            "latency_ms": round(self.latency * 1000, 2) if self.latency is not None else None,
+            "ping_latency_ms": (round(self.ping_latency * 1000, 2)
+                                if self.ping_latency is not None else None),
+            "failures": self.failures,
+            "ejected": self.is_ejected()
+        }
+
+#endregion
+
+#region Cursor Class
+class TimedCursor:
+    """Cursor wrapper that reports each query, its parameters and the
+    time spent executing it, along with any errors raised because the
+    database could not be reached"""
+
+    def __init__(self,
+                 cursor,
+                 on_execute: Callable[[str, Any, float], None],
+                 on_error: Callable[[Exception], None] = None):
+        self._cursor = cursor
+        self._on_execute = on_execute
+        self._on_error = on_error
+
+    def execute(self, operation: str, params=None, **kwargs):
+        """Execute a query, recording its execution time"""
+        start_time = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, **kwargs)
+        except DATABASE_ERRORS as error:
+            if self._on_error and is_unavailable_error(error):
+                self._on_error(error)
+            raise
+        finally:
+            self._on_execute(operation, params, time.perf_counter() - start_time)
+
+    def executemany(self, operation: str, seq_params, **kwargs):
+        """Execute a query multiple times, recording its execution time"""
+        start_time = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, **kwargs)
+        except DATABASE_ERRORS as error:
+            if self._on_error and is_unavailable_error(error):
+                self._on_error(error)
+            raise
+        finally:
+            self._on_execute(operation, seq_params, time.perf_counter() - start_time)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+#endregion
+
+#region Router Class
+class ReplicaRouter:  # pylint: disable=too-many-instance-attributes
+    """Connection-like object that routes database access to one of a
+    list of replicas. A replica is selected at the start of each request,
+    either by lowest moving average query latency or by weighted random
+    choice. Replicas are pinged by a background thread in each process.
+    Replicas that fail repeatedly, or whose health check latency exceeds the
+    maximum latency, are ejected and reinstated once a later health check
+    succeeds. If a circuit breaker is given, database access raises
+    CircuitOpenError while the circuit is open rather than waiting on
+    unreachable replicas."""
+
+    def __init__(self,
+                 replicas: List[Replica],
+                 *,
+                 selection: str = SELECTION_LEAST_LATENCY,
+                 health_check_interval: int = DEFAULT_HEALTH_CHECK_INTERVAL,
+                 eject_after_failures: int = DEFAULT_EJECT_AFTER_FAILURES,
+                 eject_seconds: int = DEFAULT_EJECT_SECONDS,
+                 max_latency: float = DEFAULT_MAX_LATENCY,
+                 circuit_breaker: CircuitBreaker = None):
+        # pylint: disable=too-many-arguments
+        if not replicas:
+            raise ValueError("At least one replica is required")
+
+        self.replicas = replicas
+        self.selection = selection
+        self.health_check_interval = health_check_interval
+        self.eject_after_failures = eject_after_failures
+        self.eject_seconds = eject_seconds
+        self.max_latency = max_latency
+        self.circuit_breaker = circuit_breaker
+        self.query_listeners = []
+        self._checked_at = 0.0
+        self._local = threading.local()
+        self._health_thread = None
+        self._health_lock = threading.Lock()
+
+    def init_app(self, app: Flask):
+        """Register request hooks with a Flask application"""
+        app.before_request(self.begin_request)
+        app.teardown_request(self.end_request)
+
+    def _eject(self, replica: Replica):
+        replica.ejected_until = time.monotonic() + self.eject_seconds
+
+    def record_failure(self, replica: Replica):
+        """Record a failed operation against a replica, ejecting it once
+        the failure threshold has been reached"""
+        replica.failures += 1
+        if replica.failures >= self.eject_after_failures:
+            self._eject(replica)
+
+    def record_latency(self, replica: Replica, elapsed: float):
+        """Record the execution time of a query against a replica, which is
+        used when selecting a replica but never ejects it, as a single slow
+        query says more about the query than about the replica"""
+        replica.record_latency(elapsed)
+
+    def record_ping_latency(self, replica: Replica, elapsed: float):
+        """Record a successful health check against a replica, ejecting it
+        if its moving average health check latency exceeds the maximum
+        latency"""
+        replica.record_ping_latency(elapsed)
+        if self.max_latency and replica.ping_latency > self.max_latency:
+            self._eject(replica)
+
+    def check_health(self, force: bool = False):
+        """Ping replicas that are not ejected, or whose ejection period has
+        expired, to refresh latency and reinstate recovered replicas"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.health_check_interval:
+            return
+
+        self._checked_at = now
+        for replica in self.replicas:
+            if replica.is_ejected(now):
+                continue
+
+            try:
+                elapsed = replica.ping()
+            except DATABASE_ERRORS as error:
+                replica.close_ping()
+                self.record_failure(replica)
+                if self.circuit_breaker and is_unavailable_error(error):
+                    self.circuit_breaker.record_failure()
+                continue
+
+            if replica.ejected_until:
+                # Start from a fresh latency measurement for a reinstated
+                # replica so that a past slow period does not eject it again
+                replica.latency = None
+                replica.ping_latency = None
+                replica.ejected_until = 0.0
+
+            replica.failures = 0
+            if replica.latency is None:
+                replica.record_latency(elapsed)
+            self.record_ping_latency(replica, elapsed)
+
+    def _run_health_checks(self):
+        while True:
+            # While the circuit is not closed, recovery is detected by the
+            # circuit breaker probe rather than by pinging every replica
+            if not self.circuit_breaker or self.circuit_breaker.state == STATE_CLOSED:
+                self.check_health(force=True)
+            time.sleep(self.health_check_interval)
+
+    def start_health_checks(self):
+        """Start the background health check thread for this process if it
+        is not already running. Threads do not survive a fork, so this is
+        called at the start of each request rather than at import time."""
+        if self.health_check_interval <= 0:
+            return
+
+        if self._health_thread is not None and self._health_thread.is_alive():
+            return
+
+        with self._health_lock:
+            if self._health_thread is None or not self._health_thread.is_alive():
+                self._health_thread = threading.Thread(target=self._run_health_checks,
+                                                       name="replica-health-check",
+                                                       daemon=True)
+                self._health_thread.start()
+
+    def _available(self, exclude: List[Replica] = None) -> List[Replica]:
+        now = time.monotonic()
+        exclude = exclude or []
+        available = [replica for replica in self.replicas
+                     if replica not in exclude and not replica.is_ejected(now)]
+        if available:
+            return available
+
+        # Fail open with the replica that will be reinstated soonest rather
+        # than refusing to serve any requests
+        candidates = [replica for replica in self.replicas if replica not in exclude]
+        if not candidates:
+            return []
+
+        return [min(candidates, key=lambda replica: replica.ejected_until)]
+
+    def select(self, exclude: List[Replica] = None) -> Optional[Replica]:
+        """Select a replica based on the configured selection method"""
+        available = self._available(exclude)
+        if not available:
+            return None
+
+        if self.selection == SELECTION_WEIGHTED:
+            weights = [replica.weight for replica in available]
+            if sum(weights) > 0:
+                return random.choices(available, weights=weights)[0]
+
+            return random.choice(available)
+
+        # Replicas without a latency measurement sort first so that they
+        # get measured
+        return min(available,
+                   key=lambda replica: -1 if replica.latency is None else replica.latency)
+
+    @property
+    def current(self) -> Replica:
+        """Returns the replica selected for the current request"""
+        replica = getattr(self._local, "replica", None)
+        if replica is None:
+            replica = self.select()
+            self._local.replica = replica
+
+        return replica
+
+    def _current_connection(self):
+        """Returns the connection for the selected replica, counting a
+        failure to open it against the circuit breaker"""
+        if self.circuit_breaker:
+            self.circuit_breaker.check()
+
+        try:
+            return self.current.connection
+        except DATABASE_ERRORS as error:
+            if self.circuit_breaker and is_unavailable_error(error):
+                self.circuit_breaker.record_failure()
+            raise
+
+    def begin_request(self):
+        """Make sure health checks are running and select a replica for the
+        request"""
+        self.start_health_checks()
+        self._local.replica = self.select()
+
+    def end_request(self, exception: Exception = None):
+        """Release the replica selected for the request"""
+        # pylint: disable=unused-argument
+        self._local.replica = None
+
+    def reconnect(self, attempts: int = 1, delay: int = 0):
+        """Ensure the selected replica is connected, failing over to other
+        replicas if it cannot be reached"""
+        if self.circuit_breaker:
+            self.circuit_breaker.check()
+
+        tried = []
+        replica = self.current
+        start_time = time.perf_counter()
+        while replica:
+            try:
+                replica.connection.reconnect(attempts=attempts, delay=delay)
+                self._local.replica = replica
+                if self.circuit_breaker:
+                    self.circuit_breaker.record_latency(time.perf_counter() - start_time)
+                return
+            except DATABASE_ERRORS:
+                replica.close()
+                self.record_failure(replica)
+                tried.append(replica)
+                replica = self.select(exclude=tried)
+                if not replica:
+                    if self.circuit_breaker:
+                        self.circuit_breaker.record_failure()
+                    raise
+
+    def add_query_listener(self, listener: Callable[[Replica, str, Any, float], None]):
+        """Register a function to be called with the replica, query,
+        parameters and execution time of every query"""
+        self.query_listeners.append(listener)
+
+    def cursor(self, *args, **kwargs) -> TimedCursor:
+        """Returns a cursor from the selected replica that records query
+        latency for the replica"""
+        cursor = self._current_connection().cursor(*args, **kwargs)
+        replica = self.current
+        failed = []
+
+        def on_error(error: Exception):
+            failed.append(error)
+            if self.circuit_breaker:
+                self.circuit_breaker.record_failure()
+
+        def on_execute(operation: str, params, elapsed: float):
+            self.record_latency(replica, elapsed)
+            if self.circuit_breaker and not failed:
+                self.circuit_breaker.record_latency(elapsed)
+            failed.clear()
+            for listener in self.query_listeners:
+                listener(replica, operation, params, elapsed)
+
+        return TimedCursor(cursor, on_execute, on_error)
+
+    def close(self):
+        """Close all replica connections"""
+        for replica in self.replicas:
+            replica.close()
+            replica.close_ping()
+
+    def status(self) -> List[Dict]:
+        """Returns the state of each replica"""
+        return [replica.status() for replica in self.replicas]
+
+    def __getattr__(self, name: str):
+        # Only called for attributes not defined on the router, such as
+        # snapshot_version on SQLite connections
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        return getattr(self._current_connection(), name)
+
+#endregion
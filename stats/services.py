@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Shared application objects used by the Stats Page
+
+Objects such as the database router, data version tracker and caches are
+stored in a registry attached to the Flask application, so that view
+modules can be imported without importing the application module. Objects
+registered with a factory are created the first time they are used rather
+than when the application starts."""
+
+from functools import partial
+import threading
+from typing import Any, Callable
+
+from flask import current_app, Flask
+from werkzeug.local import LocalProxy
+
+#region Constants
+EXTENSION_NAME = "stats"
+#endregion
+
+#region Service Registry Class
+class ServiceRegistry(dict):
+    """Dictionary of shared objects, some of which are created on first
+    use by calling the factory registered for them"""
+
+    def __init__(self):
+        super().__init__()
+        self._factories = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask):
+        """Attach the registry to a Flask application"""
+        app.extensions[EXTENSION_NAME] = self
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """Register a factory that creates the object for a name the first
+        time it is used"""
+        self._factories[name] = factory
+
+    def __missing__(self, name: str) -> Any:
+        if name not in self._factories:
+            raise KeyError(name)
+
+        with self._lock:
+            if not dict.__contains__(self, name):
+                dict.__setitem__(self, name, self._factories[name]())
+
+            return dict.__getitem__(self, name)
+
+#endregion
+
+#region Accessor Functions
+def service(name: str) -> Any:
+    """Returns a shared object for the current application"""
+    return current_app.extensions[EXTENSION_NAME][name]
+
+def service_proxy(name: str) -> LocalProxy:
+    """Returns a proxy that looks up a shared object for the current
+    application each time it is used"""
+    return LocalProxy(partial(service, name))
+
+#endregion
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2018-2020 Linh Pham
 # stats.wwdt.me is relased under the terms of the Apache License 2.0
-"""Explicitly listing all shows modules"""
+"""Explicitly listing all shows modules, which are imported the first time
+they are accessed"""
 
-from stats.shows import on_this_day
+from stats import lazy_modules
 
-__all__ = ["on_this_day"]
+__all__ = ["on_this_day", "recent", "year_in_review"]
+
+__getattr__ = lazy_modules(__name__, __all__)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Recent shows cache used by the Stats Page home page"""
+
+from datetime import datetime
+from typing import Dict, List
+
+import mysql.connector
+import pytz
+from wwdtm import show as ww_show
+
+from stats.data_version import DataVersionTracker
+
+#region Cache Class
+class RecentShowsCache:  # pylint: disable=too-many-instance-attributes
+    """Holds a precomputed list of recent show details. The list is only
+    rebuilt when the current date in the application time zone rolls
+    over or when the data version changes."""
+
+    def __init__(self,
+                 database_connection: mysql.connector.connect,
+                 data_version: DataVersionTracker,
+                 time_zone: pytz.timezone = pytz.timezone("UTC"),
+                 days_ahead: int = None,
+                 days_back: int = None):
+        self.database_connection = database_connection
+        self.data_version = data_version
+        self.time_zone = time_zone
+        self.days_ahead = days_ahead
+        self.days_back = days_back
+        self._shows = None
+        self._window_date = None
+        self._version = None
+
+    def _build(self) -> List[Dict]:
+        """Retrieve recent show details from the database"""
+        self.database_connection.reconnect()
+        try:
+            recent_shows = ww_show.details.retrieve_recent(self.database_connection,
+                                                           include_days_ahead=self.days_ahead,
+                                                           include_days_back=self.days_back)
+        except AttributeError:
+            recent_shows = ww_show.details.retrieve_recent(self.database_connection)
+
+        if recent_shows:
+            recent_shows.reverse()
+
+        return recent_shows
+
+    def retrieve(self) -> List[Dict]:
+        """Returns the list of recent show details, rebuilding it if the
+        window has rolled over or the data has changed"""
+        window_date = datetime.now(self.time_zone).date()
+        version = self.data_version.current()
+        if (self._shows is None
+                or window_date != self._window_date
+                or version != self._version):
+            self._shows = self._build()
+            self._window_date = window_date
+            self._version = version
+
+        return self._shows
+
+    def invalidate(self):
+        """Force the list of recent shows to be rebuilt on next use"""
+        self._shows = None
+
+#endregion
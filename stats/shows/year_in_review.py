@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Year in review functions used by the Stats Page"""
+
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import mysql.connector
+import pytz
+
+from stats.data_version import DataVersionTracker
+
+#region Retrieve Functions
+def _year_range(year: int):
+    """Returns the first day of a year and of the following year"""
+    return date(year=year, month=1, day=1), date(year=year + 1, month=1, day=1)
+
+def _round(value, digits: int = 2):
+    """Round a Decimal or float value returned by an aggregate query"""
+    if value is None:
+        return None
+
+    return round(float(value), digits)
+
+def retrieve_show_counts(year: int,
+                         database_connection: mysql.connector.connect) -> Dict:
+    """Returns the number of regular, Best Of and repeat shows that aired
+    in a given year"""
+    year_start, year_end = _year_range(year)
+    database_connection.reconnect()
+    cursor = database_connection.cursor(dictionary=True)
+    query = ("SELECT COUNT(s.showid) AS all_shows, "
+             "SUM(CASE WHEN s.bestof = 0 AND s.repeatshowid IS NULL "
+             "THEN 1 ELSE 0 END) AS regular_shows, "
+             "SUM(CASE WHEN s.bestof = 1 THEN 1 ELSE 0 END) AS best_of_shows, "
+             "SUM(CASE WHEN s.repeatshowid IS NOT NULL "
+             "THEN 1 ELSE 0 END) AS repeat_shows "
+             "FROM ww_shows s "
+             "WHERE s.showdate >= %s AND s.showdate < %s "
+             "AND s.showdate <= NOW();")
+    cursor.execute(query, (year_start, year_end, ))
+    result = cursor.fetchone()
+    cursor.close()
+
+    if not result or not result["all_shows"]:
+        return None
+
+    return {
+        "all_shows": int(result["all_shows"]),
+        "regular_shows": int(result["regular_shows"] or 0),
+        "best_of_shows": int(result["best_of_shows"] or 0),
+        "repeat_shows": int(result["repeat_shows"] or 0)
+    }
+
+def retrieve_panelist_statistics(year: int,
+                                 database_connection: mysql.connector.connect) -> List[Dict]:
+    """Returns appearance counts, scoring averages and first place
+    finishes for each panelist that appeared in a regular show in a given
+    year"""
+    year_start, year_end = _year_range(year)
+    database_connection.reconnect()
+    cursor = database_connection.cursor(dictionary=True)
+    query = ("SELECT p.panelist, p.panelistslug, "
+             "COUNT(pm.showid) AS appearances, "
+             "COUNT(pm.panelistscore) AS shows_with_scores, "
+             "AVG(pm.panelistscore) AS mean_score, "
+             "SUM(pm.panelistscore) AS total_score, "
+             "SUM(CASE WHEN pm.showpnlrank IN ('1', '1t') "
+             "THEN 1 ELSE 0 END) AS first_place "
+             "FROM ww_showpnlmap pm "
+             "JOIN ww_shows s ON s.showid = pm.showid "
+             "JOIN ww_panelists p ON p.panelistid = pm.panelistid "
+             "WHERE s.showdate >= %s AND s.showdate < %s "
+             "AND s.showdate <= NOW() "
+             "AND s.bestof = 0 AND s.repeatshowid IS NULL "
+             "AND p.panelistslug <> 'multiple' "
+             "GROUP BY p.panelistid, p.panelist, p.panelistslug "
+             "ORDER BY appearances DESC, p.panelist ASC;")
+    cursor.execute(query, (year_start, year_end, ))
+    result = cursor.fetchall()
+    cursor.close()
+
+    panelists = []
+    for row in result:
+        panelists.append({
+            "name": row["panelist"],
+            "slug": row["panelistslug"],
+            "appearances": int(row["appearances"]),
+            "shows_with_scores": int(row["shows_with_scores"]),
+            "mean_score": _round(row["mean_score"]),
+            "total_score": _round(row["total_score"]),
+            "first_place": int(row["first_place"] or 0)
+        })
+
+    return panelists
+
+def retrieve_guest_statistics(year: int,
+                              database_connection: mysql.connector.connect) -> Dict:
+    """Returns the number of Not My Job appearances, wins and scoring
+    exceptions for regular shows in a given year"""
+    year_start, year_end = _year_range(year)
+    database_connection.reconnect()
+    cursor = database_connection.cursor(dictionary=True)
+    query = ("SELECT COUNT(gm.guestid) AS appearances, "
+             "SUM(CASE WHEN gm.guestscore >= 2 OR gm.exception = 1 "
+             "THEN 1 ELSE 0 END) AS wins, "
+             "SUM(CASE WHEN gm.exception = 1 THEN 1 ELSE 0 END) AS exceptions "
+             "FROM ww_showguestmap gm "
+             "JOIN ww_shows s ON s.showid = gm.showid "
+             "JOIN ww_guests g ON g.guestid = gm.guestid "
+             "WHERE s.showdate >= %s AND s.showdate < %s "
+             "AND s.showdate <= NOW() "
+             "AND s.bestof = 0 AND s.repeatshowid IS NULL "
+             "AND g.guestslug <> 'none' "
+             "AND gm.guestscore IS NOT NULL;")
+    cursor.execute(query, (year_start, year_end, ))
+    result = cursor.fetchone()
+    cursor.close()
+
+    if not result or not result["appearances"]:
+        return None
+
+    appearances = int(result["appearances"])
+    wins = int(result["wins"] or 0)
+    return {
+        "appearances": appearances,
+        "wins": wins,
+        "exceptions": int(result["exceptions"] or 0),
+        "win_rate": round(100 * wins / appearances, 2)
+    }
+
+def retrieve_location_statistics(year: int,
+                                 database_connection: mysql.connector.connect) -> List[Dict]:
+    """Returns the number of regular shows recorded at each location in a
+    given year"""
+    year_start, year_end = _year_range(year)
+    database_connection.reconnect()
+    cursor = database_connection.cursor(dictionary=True)
+    query = ("SELECT l.locationid, l.venue, l.city, l.state, l.locationslug, "
+             "COUNT(lm.showid) AS shows "
+             "FROM ww_showlocationmap lm "
+             "JOIN ww_shows s ON s.showid = lm.showid "
+             "JOIN ww_locations l ON l.locationid = lm.locationid "
+             "WHERE s.showdate >= %s AND s.showdate < %s "
+             "AND s.showdate <= NOW() "
+             "AND s.bestof = 0 AND s.repeatshowid IS NULL "
+             "GROUP BY l.locationid, l.venue, l.city, l.state, l.locationslug "
+             "ORDER BY shows DESC, l.venue ASC;")
+    cursor.execute(query, (year_start, year_end, ))
+    result = cursor.fetchall()
+    cursor.close()
+
+    locations = []
+    for row in result:
+        locations.append({
+            "id": row["locationid"],
+            "venue": row["venue"],
+            "city": row["city"],
+            "state": row["state"],
+            "slug": row["locationslug"],
+            "shows": int(row["shows"])
+        })
+
+    return locations
+
+def retrieve_year_in_review(year: int,
+                            database_connection: mysql.connector.connect) -> Dict:
+    """Returns aggregate statistics for a given year, or None if no shows
+    aired that year"""
+    show_counts = retrieve_show_counts(year, database_connection)
+    if not show_counts:
+        return None
+
+    return {
+        "year": year,
+        "shows": show_counts,
+        "panelists": retrieve_panelist_statistics(year, database_connection),
+        "guests": retrieve_guest_statistics(year, database_connection),
+        "locations": retrieve_location_statistics(year, database_connection)
+    }
+
+#endregion
+
+#region Cache Class
+class YearInReviewCache:  # pylint: disable=too-few-public-methods
+    """Caches year in review statistics per year. Statistics for years
+    before the current year are treated as immutable and are never
+    recomputed, while the current year is recomputed when the data
+    version changes. Years without any shows, and years after the next
+    one, are not cached, so entries are limited to the years with shows."""
+
+    def __init__(self,
+                 database_connection: mysql.connector.connect,
+                 data_version: DataVersionTracker,
+                 time_zone: pytz.timezone = pytz.timezone("UTC")):
+        self.database_connection = database_connection
+        self.data_version = data_version
+        self.time_zone = time_zone
+        self._years = {}
+
+    def retrieve(self, year: int) -> Optional[Dict]:
+        """Returns year in review statistics for a given year, or None if
+        there are no shows for that year"""
+        current_year = datetime.now(self.time_zone).year
+        if year > current_year + 1:
+            return None
+
+        # Entries computed while the year was still in progress are
+        # recomputed once before being frozen
+        version = self.data_version.current() if year >= current_year else None
+        entry = self._years.get(year)
+        if entry and entry[0] == version:
+            return entry[1]
+
+        review = retrieve_year_in_review(year, self.database_connection)
+        if review:
+            self._years[year] = (version, review)
+        else:
+            self._years.pop(year, None)
+
+        return review
+
+#endregion
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Slow request and slow query logging used by the Stats Page
+
+Queries are collected from the replica router for each request. Requests
+that exceed the request threshold, or that run a query exceeding the query
+threshold, are written as JSON lines along with their slow statements and
+the EXPLAIN output for those statements. Statements are grouped by a
+normalized fingerprint so that the same query with different parameters
+can be aggregated."""
+
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+import hashlib
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from flask import Flask, request
+
+from stats.replicas import DATABASE_ERRORS, Replica, ReplicaRouter
+from stats.sqlite_backend import SQLiteConnection
+
+#region Constants
+DEFAULT_REQUEST_THRESHOLD = 0.5
+DEFAULT_QUERY_THRESHOLD = 0.1
+DEFAULT_EXPLAIN_INTERVAL = 300
+
+FINGERPRINT_PATTERNS = ((re.compile(r"'(?:[^'\\]|\\.)*'"), "?"),
+                        (re.compile(r'"(?:[^"\\]|\\.)*"'), "?"),
+                        (re.compile(r"%\(\w+\)s|%s|\?"), "?"),
+                        (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+                        (re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)"), "(?+)"),
+                        (re.compile(r"\s+"), " "))
+#endregion
+
+#region Fingerprint Functions
+def normalize_query(query: str) -> str:
+    """Returns a query with literals and parameter placeholders replaced
+    with ? and whitespace collapsed"""
+    normalized = query.strip().rstrip(";").lower()
+    for pattern, replacement in FINGERPRINT_PATTERNS:
+        normalized = pattern.sub(replacement, normalized)
+
+    return normalized.strip()
+
+def fingerprint_query(normalized_query: str) -> str:
+    """Returns a short fingerprint for a normalized query"""
+    return hashlib.sha1(normalized_query.encode("utf-8")).hexdigest()[:12]
+
+#endregion
+
+#region Aggregate Functions
+def aggregate_entries(entries: Iterable[Dict]) -> Dict:
+    """Aggregate slow log entries by route and by query fingerprint"""
+    routes = {}
+    queries = {}
+    for entry in entries:
+        route = routes.setdefault(entry["route"], {"requests": 0,
+                                                   "total_ms": 0.0,
+                                                   "max_ms": 0.0})
+        route["requests"] += 1
+        route["total_ms"] += entry["total_ms"]
+        route["max_ms"] = max(route["max_ms"], entry["total_ms"])
+        for statement in entry["queries"]:
+            query = queries.setdefault(statement["fingerprint"],
+                                       {"query": statement["normalized"],
+                                        "count": 0,
+                                        "total_ms": 0.0,
+                                        "max_ms": 0.0,
+                                        "routes": Counter(),
+                                        "explain": None})
+            query["count"] += 1
+            query["total_ms"] += statement["elapsed_ms"]
+            query["max_ms"] = max(query["max_ms"], statement["elapsed_ms"])
+            query["routes"][entry["route"]] += 1
+            if statement.get("explain"):
+                query["explain"] = statement["explain"]
+
+    for summary in list(routes.values()) + list(queries.values()):
+        count = summary.get("count", summary.get("requests"))
+        summary["mean_ms"] = round(summary["total_ms"] / count, 2)
+        summary["total_ms"] = round(summary["total_ms"], 2)
+        summary["max_ms"] = round(summary["max_ms"], 2)
+
+    return {
+        "routes": OrderedDict(sorted(routes.items(),
+                                     key=lambda item: item[1]["total_ms"],
+                                     reverse=True)),
+        "queries": OrderedDict(sorted(queries.items(),
+                                      key=lambda item: item[1]["total_ms"],
+                                      reverse=True))
+    }
+
+def read_log(path: str) -> List[Dict]:
+    """Returns the entries from a slow log file, skipping invalid lines"""
+    entries = []
+    with open(path, "r", encoding="utf-8") as log_file:
+        for line in log_file:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+
+    return entries
+
+#endregion
+
+#region Slow Log Class
+class SlowLog:  # pylint: disable=too-many-instance-attributes
+    """Records slow requests and slow queries as JSON lines"""
+
+    def __init__(self,
+                 path: str,
+                 request_threshold: float = DEFAULT_REQUEST_THRESHOLD,
+                 query_threshold: float = DEFAULT_QUERY_THRESHOLD,
+                 explain: bool = True,
+                 explain_interval: int = DEFAULT_EXPLAIN_INTERVAL):
+        self.path = path
+        self.request_threshold = request_threshold
+        self.query_threshold = query_threshold
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self._explained_at = {}
+        self._explain_results = {}
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def init_app(self, app: Flask, router: ReplicaRouter):
+        """Register request hooks with a Flask application and a query
+        listener with the replica router"""
+        app.before_request(self.begin_request)
+        app.after_request(self.end_request)
+        router.add_query_listener(self.record_query)
+
+    def begin_request(self):
+        """Start timing a request"""
+        self._local.start_time = time.perf_counter()
+        self._local.queries = []
+
+    def record_query(self, replica: Replica, query: str, params: Any, elapsed: float):
+        """Record a query run during the current request"""
+        queries = getattr(self._local, "queries", None)
+        if queries is None:
+            return
+
+        queries.append((replica, query, params, elapsed))
+
+    def _explain(self, replica: Replica, query: str, params: Any) -> Optional[List]:
+        """Returns the EXPLAIN output for a SELECT query, run against the
+        replica the query was run on"""
+        if not query.lstrip().lower().startswith("select"):
+            return None
+
+        connection = replica.connection
+        if isinstance(connection, SQLiteConnection):
+            prefix = "EXPLAIN QUERY PLAN "
+        else:
+            prefix = "EXPLAIN "
+
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(prefix + query, params)
+            result = cursor.fetchall()
+            cursor.close()
+        except DATABASE_ERRORS as error:
+            return [{"error": str(error)}]
+
+        return result
+
+    def _statement(self, replica: Replica, query: str, params: Any,
+                   elapsed: float) -> Dict:
+        normalized = normalize_query(query)
+        fingerprint = fingerprint_query(normalized)
+        statement = {
+            "fingerprint": fingerprint,
+            "normalized": normalized,
+            "query": " ".join(query.split()),
+            "params": params,
+            "replica": replica.name,
+            "elapsed_ms": round(elapsed * 1000, 2)
+        }
+
+        if self.explain:
+            # EXPLAIN is run at most once per fingerprint per interval and
+            # only once the request has finished with its cursors
+            now = time.monotonic()
+            explained_at = self._explained_at.get(fingerprint)
+            if explained_at is None or now - explained_at >= self.explain_interval:
+                self._explained_at[fingerprint] = now
+                self._explain_results[fingerprint] = self._explain(replica, query, params)
+            statement["explain"] = self._explain_results.get(fingerprint)
+
+        return statement
+
+    def end_request(self, response):
+        """Write a log entry if the request or any of its queries exceeded
+        the thresholds"""
+        start_time = getattr(self._local, "start_time", None)
+        queries = getattr(self._local, "queries", None) or []
+        self._local.start_time = None
+        self._local.queries = None
+        if start_time is None:
+            return response
+
+        total = time.perf_counter() - start_time
+        slow_queries = [query for query in queries if query[3] >= self.query_threshold]
+        if total < self.request_threshold and not slow_queries:
+            return response
+
+        entry = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "route": request.endpoint,
+            "path": request.path,
+            "view_args": request.view_args,
+            "args": request.args.to_dict(flat=False),
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 2),
+            "query_count": len(queries),
+            "query_ms": round(sum(query[3] for query in queries) * 1000, 2),
+            "queries": [self._statement(*query) for query in slow_queries]
+        }
+        self.write(entry)
+        return response
+
+    def write(self, entry: Dict):
+        """Append an entry to the slow log"""
+        line = json.dumps(entry, default=str)
+        with self._write_lock:
+            with open(self.path, "a", encoding="utf-8") as log_file:
+                log_file.write(line + "\n")
+
+#endregion
@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Embedded SQLite read-only backend used by the Stats Page
+
+Provides an export function that snapshots the ww_* tables from the Stats
+Page MySQL database into a local SQLite database file, and a connection
+class that mimics the subset of the mysql.connector connection and cursor
+interfaces used by libwwdtm and the stats package. Only the parameter
+styles and MySQL functions registered below are emulated, so the
+application only reads from a snapshot once stats.sqlite_check has verified
+that the installed libwwdtm's queries run against it."""
+
+from datetime import date, datetime
+from decimal import Decimal
+import os
+import random
+import re
+import sqlite3
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import mysql.connector
+import pytz
+
+from stats.data_version import retrieve_data_version
+
+#region Constants
+SNAPSHOT_TABLE = "stats_snapshot"
+EXPORT_BATCH_SIZE = 1000
+
+MYSQL_TYPE_MAP = (("tinyint", "INTEGER"),
+                  ("smallint", "INTEGER"),
+                  ("mediumint", "INTEGER"),
+                  ("bigint", "INTEGER"),
+                  ("int", "INTEGER"),
+                  ("bit", "INTEGER"),
+                  ("decimal", "DECIMAL"),
+                  ("numeric", "DECIMAL"),
+                  ("float", "REAL"),
+                  ("double", "REAL"),
+                  ("datetime", "DATETIME"),
+                  ("timestamp", "DATETIME"),
+                  ("date", "DATE"),
+                  ("blob", "BLOB"),
+                  ("binary", "BLOB"),
+                  ("varbinary", "BLOB"))
+
+PARAMETER_PATTERN = re.compile(r"%\((\w+)\)s|%s|%%")
+#endregion
+
+#region Type Adapters and Converters
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DECIMAL", lambda value: Decimal(value.decode("utf-8")))
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode("utf-8")))
+sqlite3.register_converter("DATETIME",
+                           lambda value: datetime.fromisoformat(value.decode("utf-8")))
+#endregion
+
+#region SQL Function Emulation
+def _parse_date(value: Any) -> Optional[datetime]:
+    """Parse a date or datetime string stored in SQLite"""
+    if value is None:
+        return None
+
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+def _date_part(part: str):
+    """Returns a SQL function that extracts part of a date value"""
+    def extract(value):
+        parsed = _parse_date(value)
+        return getattr(parsed, part) if parsed else None
+
+    return extract
+
+def _register_functions(connection: sqlite3.Connection, time_zone: pytz.timezone):
+    """Register MySQL functions used by the Stats Page and libwwdtm that
+    SQLite does not provide"""
+    def now():
+        return datetime.now(time_zone).strftime("%Y-%m-%d %H:%M:%S")
+
+    def curdate():
+        return datetime.now(time_zone).strftime("%Y-%m-%d")
+
+    def concat(*values):
+        if any(value is None for value in values):
+            return None
+
+        return "".join(str(value) for value in values)
+
+    connection.create_function("NOW", 0, now)
+    connection.create_function("CURDATE", 0, curdate)
+    connection.create_function("RAND", 0, random.random)
+    connection.create_function("CONCAT", -1, concat)
+    connection.create_function("YEAR", 1, _date_part("year"))
+    connection.create_function("MONTH", 1, _date_part("month"))
+    connection.create_function("DAY", 1, _date_part("day"))
+    connection.create_function("DAYOFMONTH", 1, _date_part("day"))
+
+def translate_query(query: str, params: Any = None) -> Tuple[str, Any]:
+    """Convert a query using mysql.connector's pyformat parameter style
+    into SQLite's qmark or named parameter style"""
+    def replace(match):
+        token = match.group(0)
+        if token == "%%":
+            return "%"
+        if token == "%s":
+            return "?"
+
+        return ":" + match.group(1)
+
+    if params is None:
+        return query, ()
+
+    return PARAMETER_PATTERN.sub(replace, query), params
+
+#endregion
+
+#region Connection and Cursor Classes
+class SQLiteCursor:
+    """Cursor wrapper returning rows as tuples or, when dictionary is
+    True, as dictionaries keyed by column name"""
+
+    def __init__(self, cursor: sqlite3.Cursor, dictionary: bool = False):
+        self._cursor = cursor
+        self.dictionary = dictionary
+
+    @property
+    def column_names(self) -> Tuple[str]:
+        """Returns column names for the last executed query"""
+        if not self._cursor.description:
+            return ()
+
+        return tuple(column[0] for column in self._cursor.description)
+
+    @property
+    def rowcount(self) -> int:
+        """Returns the number of rows affected by the last query"""
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self) -> int:
+        """Returns the row ID of the last inserted row"""
+        return self._cursor.lastrowid
+
+    def _format_row(self, row: Optional[Sequence]):
+        if row is None or not self.dictionary:
+            return row
+
+        return dict(zip(self.column_names, row))
+
+    def execute(self, query: str, params: Any = None):
+        """Execute a query"""
+        query, params = translate_query(query, params)
+        self._cursor.execute(query, params)
+
+    def executemany(self, query: str, seq_params: List[Any]):
+        """Execute a query once for each set of parameters"""
+        query, _ = translate_query(query, ())
+        self._cursor.executemany(query, seq_params)
+
+    def fetchone(self):
+        """Fetch the next row"""
+        return self._format_row(self._cursor.fetchone())
+
+    def fetchmany(self, size: int = 1) -> List:
+        """Fetch the next set of rows"""
+        return [self._format_row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self) -> List:
+        """Fetch all remaining rows"""
+        return [self._format_row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        """Close the cursor"""
+        self._cursor.close()
+
+class SQLiteConnection:
+    """Read-only connection to an exported SQLite snapshot that provides
+    the parts of the mysql.connector connection interface used by the
+    Stats Page and libwwdtm"""
+
+    def __init__(self, path: str, time_zone: pytz.timezone = pytz.timezone("UTC")):
+        self.path = path
+        self.time_zone = time_zone
+        self.autocommit = True
+        self._connection = None
+        self._file_id = None
+        self.reconnect()
+
+    def _current_file_id(self) -> Tuple[int, float]:
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_mtime
+
+    def reconnect(self, attempts: int = 1, delay: int = 0):
+        """Opens the snapshot, re-opening it if a new snapshot has been
+        exported since the connection was opened. The attempts and delay
+        arguments are accepted for compatibility with mysql.connector."""
+        # pylint: disable=unused-argument
+        file_id = self._current_file_id()
+        if self._connection and file_id == self._file_id:
+            return
+
+        if self._connection:
+            self._connection.close()
+
+        uri = f"file:{os.path.abspath(self.path)}?mode=ro"
+        self._connection = sqlite3.connect(uri,
+                                           uri=True,
+                                           detect_types=sqlite3.PARSE_DECLTYPES,
+                                           check_same_thread=False)
+        _register_functions(self._connection, self.time_zone)
+        self._file_id = file_id
+
+    def is_connected(self) -> bool:
+        """Returns whether the snapshot is open"""
+        return self._connection is not None
+
+    def cursor(self, dictionary: bool = False, **kwargs) -> SQLiteCursor:
+        """Returns a new cursor. Additional mysql.connector cursor options,
+        such as buffered, are accepted and ignored."""
+        # pylint: disable=unused-argument
+        return SQLiteCursor(self._connection.cursor(), dictionary=dictionary)
+
+    def snapshot_version(self) -> str:
+        """Returns the data version recorded when the snapshot was
+        exported"""
+        cursor = self._connection.cursor()
+        cursor.execute(f"SELECT data_version FROM {SNAPSHOT_TABLE};")
+        result = cursor.fetchone()
+        cursor.close()
+        return result[0] if result else None
+
+    def close(self):
+        """Close the connection"""
+        if self._connection:
+            self._connection.close()
+            self._connection = None
+
+#endregion
+
+#region Export Functions
+def _sqlite_type(mysql_type: str) -> str:
+    """Map a MySQL column type to a SQLite declared type"""
+    mysql_type = mysql_type.lower()
+    for prefix, sqlite_type in MYSQL_TYPE_MAP:
+        if mysql_type.startswith(prefix):
+            return sqlite_type
+
+    return "TEXT"
+
+def _quote_names(names: List[str]) -> str:
+    """Returns a comma separated list of quoted SQLite identifiers"""
+    return ", ".join(f"\"{name}\"" for name in names)
+
+def _retrieve_tables(database_connection: mysql.connector.connect) -> List[str]:
+    """Returns a list of ww_* tables in the MySQL database"""
+    cursor = database_connection.cursor()
+    cursor.execute("SHOW TABLES LIKE 'ww\\_%';")
+    result = cursor.fetchall()
+    cursor.close()
+    return [row[0] for row in result]
+
+def _table_indexes(column_names: List[str],
+                   primary_key: List[str],
+                   index_rows: List[Dict]) -> Dict[str, Dict]:
+    """Returns the secondary indexes of a MySQL table, along with an index
+    on every ID column that is not already the leading column of an index,
+    so that every ID column can be used for lookups and joins"""
+    indexes = {}
+    for row in sorted(index_rows, key=lambda row: row["Seq_in_index"]):
+        if row["Key_name"] == "PRIMARY":
+            continue
+        index = indexes.setdefault(row["Key_name"], {"unique": not row["Non_unique"],
+                                                     "columns": []})
+        index["columns"].append(row["Column_name"])
+
+    leading_columns = {index["columns"][0] for index in indexes.values()}
+    if primary_key:
+        leading_columns.add(primary_key[0])
+    for name in column_names:
+        if name.endswith("id") and name not in leading_columns:
+            indexes[f"{name}_idx"] = {"unique": False, "columns": [name]}
+
+    return indexes
+
+def _copy_rows(database_connection: mysql.connector.connect,
+               sqlite_connection: sqlite3.Connection,
+               table: str,
+               column_names: List[str]) -> int:
+    """Copy the rows of a MySQL table into an existing SQLite table in
+    batches. Returns the number of rows copied."""
+    placeholders = ", ".join("?" * len(column_names))
+    insert_query = f"INSERT INTO \"{table}\" VALUES ({placeholders});"
+    select_columns = ", ".join(f"`{name}`" for name in column_names)
+    cursor = database_connection.cursor()
+    cursor.execute(f"SELECT {select_columns} FROM `{table}`;")
+    row_count = 0
+    while True:
+        rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+        if not rows:
+            break
+        sqlite_connection.executemany(insert_query, rows)
+        row_count += len(rows)
+    cursor.close()
+
+    return row_count
+
+def _export_table(database_connection: mysql.connector.connect,
+                  sqlite_connection: sqlite3.Connection,
+                  table: str) -> int:
+    """Copy the structure, indexes and rows of a MySQL table into SQLite.
+    Returns the number of rows copied."""
+    cursor = database_connection.cursor(dictionary=True)
+    cursor.execute(f"SHOW COLUMNS FROM `{table}`;")
+    columns = cursor.fetchall()
+    cursor.execute(f"SHOW INDEX FROM `{table}`;")
+    index_rows = cursor.fetchall()
+    cursor.close()
+
+    column_names = [column["Field"] for column in columns]
+    primary_key = [column["Field"] for column in columns if column["Key"] == "PRI"]
+    definitions = [f"\"{column['Field']}\" {_sqlite_type(column['Type'])}"
+                   for column in columns]
+    if primary_key:
+        definitions.append(f"PRIMARY KEY ({_quote_names(primary_key)})")
+
+    sqlite_connection.execute(f"CREATE TABLE \"{table}\" ({', '.join(definitions)});")
+
+    for index_name, index in _table_indexes(column_names, primary_key, index_rows).items():
+        unique = "UNIQUE " if index["unique"] else ""
+        sqlite_connection.execute(f"CREATE {unique}INDEX \"{table}_{index_name}\" "
+                                  f"ON \"{table}\" ({_quote_names(index['columns'])});")
+
+    return _copy_rows(database_connection, sqlite_connection, table, column_names)
+
+def export_database(database_connection: mysql.connector.connect,
+                    sqlite_path: str) -> Dict[str, int]:
+    """Snapshot all ww_* tables from the MySQL database into an indexed
+    SQLite database file. The snapshot is written to a temporary file and
+    moved into place once complete, so that running application workers
+    pick up the new snapshot on their next reconnect. Returns the number
+    of rows copied per table."""
+    database_connection.reconnect()
+    version = retrieve_data_version(database_connection)
+
+    temp_path = f"{sqlite_path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    sqlite_connection = sqlite3.connect(temp_path)
+    row_counts = {}
+    try:
+        for table in _retrieve_tables(database_connection):
+            row_counts[table] = _export_table(database_connection,
+                                              sqlite_connection,
+                                              table)
+
+        sqlite_connection.execute(f"CREATE TABLE {SNAPSHOT_TABLE} (data_version TEXT, "
+                                  "exported_at DATETIME);")
+        sqlite_connection.execute(f"INSERT INTO {SNAPSHOT_TABLE} VALUES (?, ?);",
+                                  (version, datetime.utcnow()))
+        sqlite_connection.commit()
+        sqlite_connection.execute("ANALYZE;")
+        sqlite_connection.commit()
+    finally:
+        sqlite_connection.close()
+
+    os.replace(temp_path, sqlite_path)
+    return row_counts
+
+#endregion
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Compatibility check for the SQLite snapshot backend used by the Stats
+Page
+
+Runs every libwwdtm retrieval used by the Stats Page routes, along with the
+queries run by the stats package itself, against an exported snapshot.
+Only a subset of MySQL functions is emulated by the SQLite backend, so a
+query that uses other MySQL-only SQL fails here rather than in production.
+libwwdtm catches some database errors and returns None, so SQLite errors
+are recorded as they are raised by the cursor.
+
+Once every retrieval runs without an error, the libwwdtm and application
+versions it passed with are recorded next to the snapshot. The SQLite
+backend can only be enabled for versions that have passed the check."""
+
+from functools import partial
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from stats.sqlite_backend import SQLiteConnection
+
+#region Constants
+CHECK_MARKER_SUFFIX = ".checked"
+
+SAMPLE_QUERIES = {
+    "guest": ("SELECT g.guestslug FROM ww_guests g "
+              "JOIN ww_showguestmap gm ON gm.guestid = g.guestid "
+              "WHERE g.guestslug <> 'none' LIMIT 1;"),
+    "host": "SELECT hostslug FROM ww_hosts WHERE hostslug <> 'tbd' LIMIT 1;",
+    "location": ("SELECT l.locationslug FROM ww_locations l "
+                 "JOIN ww_showlocationmap lm ON lm.locationid = l.locationid "
+                 "WHERE l.locationid NOT IN (3, 38) LIMIT 1;"),
+    "panelist": ("SELECT p.panelistslug FROM ww_panelists p "
+                 "JOIN ww_showpnlmap pm ON pm.panelistid = p.panelistid "
+                 "WHERE p.panelistslug <> 'multiple' LIMIT 1;"),
+    "scorekeeper": "SELECT scorekeeperslug FROM ww_scorekeepers LIMIT 1;",
+    "show": "SELECT showid, showdate FROM ww_shows ORDER BY showdate DESC LIMIT 1;"
+}
+#endregion
+
+#region Recording Connection Classes
+class _RecordingCursor:
+    """Cursor wrapper that records SQLite errors before raising them"""
+
+    def __init__(self, cursor, errors: List[Tuple[str, str]]):
+        self._cursor = cursor
+        self._errors = errors
+
+    def execute(self, query: str, params: Any = None):
+        """Execute a query, recording any SQLite error"""
+        try:
+            self._cursor.execute(query, params)
+        except sqlite3.Error as error:
+            self._errors.append((str(error), " ".join(query.split())))
+            raise
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+class _RecordingConnection:
+    """Connection wrapper that hands out recording cursors"""
+
+    def __init__(self, connection: SQLiteConnection):
+        self._connection = connection
+        self.errors = []
+
+    def cursor(self, *args, **kwargs) -> _RecordingCursor:
+        """Returns a recording cursor"""
+        return _RecordingCursor(self._connection.cursor(*args, **kwargs), self.errors)
+
+    def __getattr__(self, name: str):
+        return getattr(self._connection, name)
+
+#endregion
+
+#region Check Functions
+def _keyword_connection(retrieve: Callable, database_connection, **kwargs) -> Any:
+    """Run a libwwdtm retrieval that takes the connection as the
+    database_connection keyword argument"""
+    return retrieve(database_connection=database_connection, **kwargs)
+
+def _sample_values(connection: SQLiteConnection) -> Dict[str, Any]:
+    """Returns a slug for each entity, and the ID and date of the latest
+    show, to pass to retrievals that look up a single item"""
+    samples = {}
+    for name, query in SAMPLE_QUERIES.items():
+        cursor = connection.cursor()
+        cursor.execute(query)
+        row = cursor.fetchone()
+        cursor.close()
+        if name == "show":
+            samples["show_id"], samples["show_date"] = row if row else (None, None)
+        else:
+            samples[name] = row[0] if row else None
+
+    return samples
+
+def _wwdtm_retrievals(samples: Dict[str, Any]) -> List[Tuple[str, Callable]]:
+    """Returns the name of each libwwdtm retrieval used by the routes along
+    with a function that runs it against a connection"""
+    # pylint: disable=import-outside-toplevel
+    from wwdtm import (guest as ww_guest, host as ww_host,
+                       location as ww_location, panelist as ww_panelist,
+                       scorekeeper as ww_scorekeeper, show as ww_show)
+
+    show_date = samples["show_date"]
+    show_args = {
+        "show_year": show_date.year if show_date else None,
+        "show_month": show_date.month if show_date else None,
+        "show_day": show_date.day if show_date else None
+    }
+    return [
+        ("guest.info.retrieve_all", ww_guest.info.retrieve_all),
+        ("guest.details.retrieve_all", ww_guest.details.retrieve_all),
+        ("guest.details.retrieve_by_slug",
+         partial(ww_guest.details.retrieve_by_slug, samples["guest"])),
+        ("host.info.retrieve_all", ww_host.info.retrieve_all),
+        ("host.details.retrieve_all", ww_host.details.retrieve_all),
+        ("host.details.retrieve_by_slug",
+         partial(ww_host.details.retrieve_by_slug, samples["host"])),
+        ("location.info.retrieve_all",
+         partial(ww_location.info.retrieve_all, sort_by_venue=True)),
+        ("location.details.retrieve_all_recordings",
+         partial(ww_location.details.retrieve_all_recordings, sort_by_venue=True)),
+        ("location.details.retrieve_recordings_by_slug",
+         partial(ww_location.details.retrieve_recordings_by_slug, samples["location"])),
+        ("panelist.info.retrieve_all", ww_panelist.info.retrieve_all),
+        ("panelist.details.retrieve_all", ww_panelist.details.retrieve_all),
+        ("panelist.details.retrieve_by_slug",
+         partial(ww_panelist.details.retrieve_by_slug, samples["panelist"])),
+        ("scorekeeper.info.retrieve_all", ww_scorekeeper.info.retrieve_all),
+        ("scorekeeper.details.retrieve_all", ww_scorekeeper.details.retrieve_all),
+        ("scorekeeper.details.retrieve_by_slug",
+         partial(ww_scorekeeper.details.retrieve_by_slug, samples["scorekeeper"])),
+        ("show.info.retrieve_all_dates_tuple", ww_show.info.retrieve_all_dates_tuple),
+        ("show.info.retrieve_years", ww_show.info.retrieve_years),
+        ("show.info.retrieve_all_show_years_months_tuple",
+         ww_show.info.retrieve_all_show_years_months_tuple),
+        ("show.info.retrieve_months_by_year",
+         partial(_keyword_connection, ww_show.info.retrieve_months_by_year,
+                 show_year=show_args["show_year"])),
+        ("show.details.retrieve_by_year",
+         partial(_keyword_connection, ww_show.details.retrieve_by_year,
+                 show_year=show_args["show_year"])),
+        ("show.details.retrieve_by_year_month",
+         partial(_keyword_connection, ww_show.details.retrieve_by_year_month,
+                 show_year=show_args["show_year"],
+                 show_month=show_args["show_month"])),
+        ("show.details.retrieve_by_date",
+         partial(_keyword_connection, ww_show.details.retrieve_by_date, **show_args)),
+        ("show.details.retrieve_by_id",
+         partial(_keyword_connection, ww_show.details.retrieve_by_id,
+                 show_id=samples["show_id"])),
+        ("show.details.retrieve_recent", ww_show.details.retrieve_recent),
+        ("show.utility.date_exists",
+         partial(_keyword_connection, ww_show.utility.date_exists, **show_args)),
+    ]
+
+def _stats_retrievals(samples: Dict[str, Any]) -> List[Tuple[str, Callable]]:
+    """Returns the name of each stats package retrieval used by the routes
+    along with a function that runs it against a connection"""
+    # pylint: disable=import-outside-toplevel
+    from stats import page_details, pagination, random
+    from stats.locations.index import retrieve_location_recordings
+    from stats.panelists.comparison import retrieve_panelist_scores
+    from stats.shows.on_this_day import retrieve_on_this_day_show_ids
+    from stats.shows.year_in_review import retrieve_year_in_review
+
+    show_date = samples["show_date"]
+    retrievals = [
+        ("stats.random.random_show_date", random.random_show_date),
+        ("stats.shows.on_this_day.retrieve_on_this_day_show_ids",
+         retrieve_on_this_day_show_ids),
+        ("stats.locations.index.retrieve_location_recordings",
+         retrieve_location_recordings),
+        ("stats.panelists.comparison.retrieve_panelist_scores", retrieve_panelist_scores),
+        ("stats.shows.year_in_review.retrieve_year_in_review",
+         partial(retrieve_year_in_review, show_date.year if show_date else None)),
+        ("stats.pagination.retrieve_show_page", pagination.retrieve_show_page),
+        ("stats.page_details.retrieve_show_details",
+         partial(page_details.retrieve_show_details, [samples["show_id"]])),
+    ]
+    for entity in pagination.SLUG_ENTITIES:
+        retrievals.append((f"stats.pagination.retrieve_slug_page({entity})",
+                           partial(pagination.retrieve_slug_page, entity)))
+
+    for sample, retrieve_details in (("guest", page_details.retrieve_guest_details),
+                                     ("host", page_details.retrieve_host_details),
+                                     ("location", page_details.retrieve_location_details),
+                                     ("panelist", page_details.retrieve_panelist_details),
+                                     ("scorekeeper", page_details.retrieve_scorekeeper_details)):
+        retrievals.append((f"stats.page_details.{retrieve_details.__name__}",
+                           partial(retrieve_details, [samples[sample]])))
+
+    return retrievals
+
+def check_retrievals(connection: SQLiteConnection) -> List[Dict]:
+    """Run each retrieval against a snapshot connection and return its
+    status. A retrieval fails if it raises an exception or if SQLite raised
+    an error for any of its queries. Retrievals that return no data are
+    marked as empty, as some, such as shows on this day, can be empty for
+    a complete snapshot."""
+    samples = _sample_values(connection)
+    results = []
+    for name, retrieve in _wwdtm_retrievals(samples) + _stats_retrievals(samples):
+        recording_connection = _RecordingConnection(connection)
+        start_time = time.perf_counter()
+        try:
+            result = retrieve(recording_connection)
+            error = None
+        except Exception as exception:  # pylint: disable=broad-except
+            result = None
+            error = f"{type(exception).__name__}: {exception}"
+
+        if recording_connection.errors:
+            message, query = recording_connection.errors[0]
+            error = f"{message} in: {query}"
+
+        if error:
+            status = "error"
+        elif not result:
+            status = "empty"
+        else:
+            status = "ok"
+
+        results.append({
+            "name": name,
+            "status": status,
+            "error": error,
+            "elapsed_ms": round((time.perf_counter() - start_time) * 1000, 2)
+        })
+
+    return results
+
+#endregion
+
+#region Check Marker Functions
+def check_marker_path(path: str) -> str:
+    """Returns the path of the file recording the versions a snapshot
+    path has passed the check with"""
+    return f"{path}{CHECK_MARKER_SUFFIX}"
+
+def record_check(path: str, versions: Dict[str, str]):
+    """Record that the retrievals for the given libwwdtm and application
+    versions ran against the snapshot at a path without errors"""
+    with open(check_marker_path(path), "w", encoding="utf-8") as marker_file:
+        json.dump(versions, marker_file)
+
+def passed_check(path: str, versions: Dict[str, str]) -> bool:
+    """Returns whether the retrievals for the given libwwdtm and
+    application versions have passed the check against the snapshot at a
+    path"""
+    marker_path = check_marker_path(path)
+    if not os.path.exists(marker_path):
+        return False
+
+    try:
+        with open(marker_path, "r", encoding="utf-8") as marker_file:
+            return json.load(marker_file) == versions
+    except (OSError, ValueError):
+        return False
+
+#endregion
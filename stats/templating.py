@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Template compilation and caching functions used by the Stats Page"""
+
+import os
+import time
+from typing import Any, Dict, List
+
+from flask import Flask, render_template
+from jinja2 import Environment, FileSystemBytecodeCache
+
+#region Constants
+BYTECODE_CACHE_PATTERN = "stats-%s.cache"
+DEFAULT_FIRST_RENDER_PATH = "/about"
+DEFAULT_FIRST_RENDER_TEMPLATE = "pages/about.html"
+#endregion
+
+#region Bytecode Cache Functions
+def create_bytecode_cache(directory: str) -> FileSystemBytecodeCache:
+    """Returns an on-disk Jinja bytecode cache that can be shared between
+    application workers"""
+    os.makedirs(directory, exist_ok=True)
+    return FileSystemBytecodeCache(directory, pattern=BYTECODE_CACHE_PATTERN)
+
+def compile_templates(environment: Environment) -> Dict[str, float]:
+    """Load and compile every template available to the environment.
+    Compiled templates are kept in the environment's template cache and,
+    if a bytecode cache is configured, written to the bytecode cache.
+    Returns the number of seconds spent loading each template."""
+    timings = {}
+    for template_name in environment.list_templates():
+        start_time = time.perf_counter()
+        environment.get_template(template_name)
+        timings[template_name] = time.perf_counter() - start_time
+
+    return timings
+
+def _new_environment(app: Flask,
+                     bytecode_cache: FileSystemBytecodeCache = None) -> Environment:
+    """Returns a new Jinja environment with the application's options,
+    filters and globals"""
+    environment = app.create_jinja_environment()
+    environment.filters.update(app.jinja_env.filters)
+    environment.tests.update(app.jinja_env.tests)
+    environment.globals.update(app.jinja_env.globals)
+    environment.bytecode_cache = bytecode_cache
+    return environment
+
+def _measure_first_render(environment: Environment,
+                          app: Flask,
+                          path: str,
+                          template_name: str) -> float:
+    """Returns the number of seconds taken to load and render a template
+    for the first time in an environment"""
+    with app.test_request_context(path):
+        context = {}
+        app.update_template_context(context)
+        start_time = time.perf_counter()
+        environment.get_template(template_name).render(context)
+        return time.perf_counter() - start_time
+
+def measure_template_compilation(app: Flask,
+                                 path: str = DEFAULT_FIRST_RENDER_PATH,
+                                 template_name: str = DEFAULT_FIRST_RENDER_TEMPLATE
+                                ) -> Dict[str, float]:
+    """Returns the number of seconds needed to render a first page and to
+    load all templates in a new Jinja environment without a bytecode
+    cache, with a cold bytecode cache and with a warm bytecode cache. The
+    first render is measured in an environment of its own, as seen by the
+    first request to a worker that did not preload templates."""
+    bytecode_cache = app.jinja_env.bytecode_cache
+    results = {}
+
+    results["no_cache_first_render"] = _measure_first_render(_new_environment(app),
+                                                             app, path, template_name)
+    environment = _new_environment(app)
+    results["no_cache"] = sum(compile_templates(environment).values())
+
+    if bytecode_cache:
+        bytecode_cache.clear()
+        environment = _new_environment(app, bytecode_cache)
+        results["cold_cache_first_render"] = _measure_first_render(environment, app,
+                                                                   path, template_name)
+        bytecode_cache.clear()
+        environment = _new_environment(app, bytecode_cache)
+        results["cold_cache"] = sum(compile_templates(environment).values())
+
+        environment = _new_environment(app, bytecode_cache)
+        results["warm_cache_first_render"] = _measure_first_render(environment, app,
+                                                                   path, template_name)
+        environment = _new_environment(app, bytecode_cache)
+        results["warm_cache"] = sum(compile_templates(environment).values())
+
+    return results
+
+def measure_render(app: Flask,
+                   path: str,
+                   template_name: str,
+                   context: Dict[str, Any],
+                   iterations: int = 5) -> List[float]:
+    """Returns the number of seconds taken by each of a number of renders
+    of a template for a request path. The fragment cache is cleared before
+    each render so that every fragment is rendered."""
+    timings = []
+    with app.test_request_context(path):
+        # Load the template before timing so that compilation is excluded
+        app.jinja_env.get_template(template_name)
+        for _ in range(iterations):
+            app.jinja_env.fragment_cache.clear()
+            start_time = time.perf_counter()
+            render_template(template_name, **context)
+            timings.append(time.perf_counter() - start_time)
+
+    return timings
+
+#endregion
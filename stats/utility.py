@@ -4,7 +4,6 @@
 """Utility functions used by the Stats Page"""
 
 from datetime import datetime
-from dateutil import parser
 import pytz
 
 #region Date/Time Functions
@@ -15,6 +14,8 @@ def current_year(time_zone: pytz.timezone = pytz.timezone("UTC")):
 
 def date_string_to_date(**kwargs):
     """Used to convert an ISO-style date string into a datetime object"""
+    from dateutil import parser  # pylint: disable=import-outside-toplevel
+
     if "date_string" in kwargs and kwargs["date_string"]:
         try:
             date_object = parser.parse(kwargs["date_string"])
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Render-ready view models used by the Stats Page
+
+Details returned by libwwdtm are annotated with display names, date
+objects, rank labels and resolved URLs before they are rendered, so that
+templates do not call back into Python helpers for every row. View models
+for the largest pages are built once per data version."""
+
+from datetime import date, datetime
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import request, url_for
+
+from stats.data_version import DataVersionTracker
+from stats.dicts import PANELIST_RANKS
+from stats.locations.formatting import format_location_name
+from stats.locations.index import PLACEHOLDER_LOCATION_IDS
+
+#region URL Cache
+# Resolved URLs are kept per script root, endpoint and argument value, and
+# are cleared by ViewModelCache whenever the data version changes, so the
+# number of entries is bounded by the number of current shows and slugs
+_resolved_urls = {}
+_resolved_urls_lock = threading.Lock()
+#endregion
+
+#region Utility Functions
+def parse_show_date(value) -> Optional[date]:
+    """Returns a date object for an ISO 8601 date string, date or
+    datetime value"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not value:
+        return None
+
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+def _cached_url(key: tuple, build: Callable[[], str]) -> str:
+    with _resolved_urls_lock:
+        url = _resolved_urls.get(key)
+    if url is None:
+        url = build()
+        with _resolved_urls_lock:
+            _resolved_urls[key] = url
+
+    return url
+
+def clear_resolved_urls():
+    """Remove all resolved URLs"""
+    with _resolved_urls_lock:
+        _resolved_urls.clear()
+
+def resolve_url(endpoint: str, name: str, value) -> str:
+    """Returns the URL for an endpoint that takes a single argument,
+    building it only once for each value"""
+    return _cached_url((request.script_root, endpoint, value),
+                       lambda: url_for(endpoint, **{name: value}))
+
+def show_url(show_date) -> Optional[str]:
+    """Returns the URL for the show that aired on a given date"""
+    show_date = parse_show_date(show_date)
+    if not show_date:
+        return None
+
+    return _cached_url((request.script_root, "shows.get_show_year_month_day", show_date),
+                       lambda: url_for("shows.get_show_year_month_day",
+                                       year=show_date.year,
+                                       month=show_date.month,
+                                       day=show_date.day))
+
+def _person_view(person: Optional[Dict], endpoint: str, name: str) -> Optional[Dict]:
+    if person and person.get("slug"):
+        person["url"] = resolve_url(endpoint, name, person["slug"])
+
+    return person
+
+#endregion
+
+#region View Model Functions
+def appearances_view(shows: Optional[List[Dict]]) -> Optional[List[Dict]]:
+    """Annotate a list of appearances or recordings with the date object
+    and URL for each show"""
+    for show in shows or []:
+        show["date_object"] = parse_show_date(show.get("date"))
+        show["url"] = show_url(show["date_object"])
+
+    return shows
+
+def location_view(location: Optional[Dict]) -> Optional[Dict]:
+    """Annotate a location with its display name and, for locations that
+    are not placeholders, its URL and the URLs for its recordings"""
+    if not location:
+        return location
+
+    if "display_name" not in location:
+        location["display_name"] = format_location_name(location)
+    if location.get("id") in PLACEHOLDER_LOCATION_IDS:
+        location["url"] = None
+    else:
+        location["url"] = resolve_url("locations.get_location_details",
+                                      "location", location["slug"])
+
+    if location.get("recordings"):
+        appearances_view(location["recordings"].get("shows"))
+
+    return location
+
+def entity_view(entity: Optional[Dict], endpoint: str, name: str) -> Optional[Dict]:
+    """Annotate a guest, host or scorekeeper with its URL and the URLs for
+    each of its appearances"""
+    if not entity:
+        return entity
+
+    _person_view(entity, endpoint, name)
+    if entity.get("appearances"):
+        appearances_view(entity["appearances"].get("shows"))
+
+    return entity
+
+def guest_view(guest: Optional[Dict]) -> Optional[Dict]:
+    """Annotate a Not My Job guest and its appearances"""
+    return entity_view(guest, "guests.get_guest_details", "guest")
+
+def host_view(host: Optional[Dict]) -> Optional[Dict]:
+    """Annotate a host and its appearances"""
+    return entity_view(host, "hosts.get_host_details", "host")
+
+def scorekeeper_view(scorekeeper: Optional[Dict]) -> Optional[Dict]:
+    """Annotate a scorekeeper and its appearances"""
+    return entity_view(scorekeeper, "scorekeepers.get_scorekeeper_details", "scorekeeper")
+
+def panelist_view(panelist: Optional[Dict]) -> Optional[Dict]:
+    """Annotate a panelist with its URL, the URLs for its first and most
+    recent shows, and the URL and rank label for each appearance"""
+    if not panelist:
+        return panelist
+
+    _person_view(panelist, "panelists.get_panelist_details", "panelist")
+    appearances = panelist.get("appearances") or {}
+    milestones = appearances.get("milestones") or {}
+    for milestone in ("first", "most_recent"):
+        if milestones.get(milestone):
+            milestones[milestone]["url"] = show_url(milestones[milestone].get("show_date"))
+
+    appearances_view(appearances.get("shows"))
+    for appearance in appearances.get("shows") or []:
+        appearance["rank_label"] = PANELIST_RANKS.get(appearance.get("rank"))
+
+    return panelist
+
+def show_view(show: Optional[Dict]) -> Optional[Dict]:
+    """Annotate a show with its date object and URLs, along with the
+    display name, rank labels and URLs for its location, host,
+    scorekeeper, panelists, guests and Bluff the Listener panelists"""
+    if not show:
+        return show
+
+    show["date_object"] = parse_show_date(show["date"])
+    show["url"] = show_url(show["date_object"])
+    show["npr_url"] = resolve_url("shows.npr_show_redirect", "show_date", show["date"])
+    show["original_show_url"] = show_url(show.get("original_show_date"))
+
+    location_view(show.get("location"))
+    _person_view(show.get("host"), "hosts.get_host_details", "host")
+    _person_view(show.get("scorekeeper"), "scorekeepers.get_scorekeeper_details", "scorekeeper")
+    for panelist in show.get("panelists") or []:
+        panelist["rank_label"] = PANELIST_RANKS.get(panelist.get("rank"))
+        _person_view(panelist, "panelists.get_panelist_details", "panelist")
+    for guest in show.get("guests") or []:
+        _person_view(guest, "guests.get_guest_details", "guest")
+
+    bluff = show.get("bluff") or {}
+    _person_view(bluff.get("chosen_panelist"), "panelists.get_panelist_details", "panelist")
+    _person_view(bluff.get("correct_panelist"), "panelists.get_panelist_details", "panelist")
+
+    return show
+
+def shows_view(shows: Optional[List[Dict]]) -> Optional[List[Dict]]:
+    """Annotate each show in a list of shows"""
+    for show in shows or []:
+        show_view(show)
+
+    return shows
+
+#endregion
+
+#region Cache Class
+class ViewModelCache:
+    """Holds view models for the current data version, so that the data
+    for the largest pages is retrieved and annotated once per version
+    rather than once per request. Resolved URLs are cleared along with
+    the view models when the data version changes."""
+
+    def __init__(self, data_version: DataVersionTracker):
+        self.data_version = data_version
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._version = None
+
+    def retrieve(self, name: str, build: Callable[[], Any]) -> Any:
+        """Returns the view model for a name, calling build to create it
+        if there is none for the current data version. Empty results are
+        not stored."""
+        version = self.data_version.current()
+        key = (name, request.script_root)
+        with self._lock:
+            if version != self._version:
+                self._entries = {}
+                self._version = version
+                clear_resolved_urls()
+
+            if key in self._entries:
+                return self._entries[key]
+
+        view_model = build()
+        if view_model:
+            with self._lock:
+                if version == self._version:
+                    self._entries[key] = view_model
+
+        return view_model
+
+    def retrieve_many(self,
+                      names: List[str],
+                      build: Callable[[List[str]], Dict[str, Any]]) -> List[Any]:
+        """Returns the view models for a list of names, calling build once
+        with the names that have none for the current data version. build
+        returns the view models for those names keyed by name. Empty
+        results are not stored."""
+        version = self.data_version.current()
+        script_root = request.script_root
+        with self._lock:
+            if version != self._version:
+                self._entries = {}
+                self._version = version
+                clear_resolved_urls()
+
+            view_models = {name: self._entries[(name, script_root)]
+                           for name in names if (name, script_root) in self._entries}
+
+        missing = [name for name in names if name not in view_models]
+        if missing:
+            built = build(missing)
+            with self._lock:
+                for name in missing:
+                    view_models[name] = built.get(name)
+                    if view_models[name] and version == self._version:
+                        self._entries[(name, script_root)] = view_models[name]
+
+        return [view_models[name] for name in names]
+
+    def clear(self):
+        """Remove all stored view models"""
+        with self._lock:
+            self._entries = {}
+            self._version = None
+        clear_resolved_urls()
+
+#endregion
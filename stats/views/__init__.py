@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Lazily loaded blueprints for the Stats Page
+
+URL rules for each blueprint are registered when the application starts,
+but the module implementing a blueprint, along with the libwwdtm modules
+and other libraries it uses, is only imported the first time one of its
+routes is requested."""
+
+from collections import OrderedDict
+import importlib
+
+from flask import Blueprint, Flask
+from werkzeug.utils import import_string
+
+#region Constants
+BLUEPRINT_ROUTES = OrderedDict([
+    ("guests", (("/guest", "get_guest"),
+                ("/guests", "get_guests"),
+                ("/guests/<string:guest>", "get_guest_details"),
+                ("/guests/all", "get_guests_all"),
+                ("/guests/browse", "get_guests_browse"),
+                ("/guests/leaderboard", "get_guests_leaderboard"),
+                ("/guests/random", "get_guests_random"))),
+    ("hosts", (("/host", "get_host"),
+               ("/hosts", "get_hosts"),
+               ("/hosts/<string:host>", "get_host_details"),
+               ("/hosts/all", "get_hosts_all"),
+               ("/hosts/browse", "get_hosts_browse"),
+               ("/hosts/random", "get_hosts_random"))),
+    ("locations", (("/location", "get_location"),
+                   ("/locations", "get_locations"),
+                   ("/locations/states", "get_locations_states"),
+                   ("/locations/states/<string:state>", "get_locations_state"),
+                   ("/locations/<string:location>", "get_location_details"),
+                   ("/locations/all", "get_locations_all"),
+                   ("/locations/browse", "get_locations_browse"),
+                   ("/locations/random", "get_locations_random"))),
+    ("panelists", (("/panelist", "get_panelist"),
+                   ("/panelists", "get_panelists"),
+                   ("/panelists/<string:panelist>", "get_panelist_details"),
+                   ("/panelists/all", "get_panelists_all"),
+                   ("/panelists/browse", "get_panelists_browse"),
+                   ("/panelists/compare", "get_panelists_compare"),
+                   ("/panelists/random", "get_panelists_random"))),
+    ("scorekeepers", (("/scorekeeper", "get_scorekeeper"),
+                      ("/scorekeepers", "get_scorekeepers"),
+                      ("/scorekeepers/<string:scorekeeper>", "get_scorekeeper_details"),
+                      ("/scorekeepers/all", "get_scorekeepers_all"),
+                      ("/scorekeepers/browse", "get_scorekeepers_browse"),
+                      ("/scorekeepers/random", "get_scorekeepers_random"))),
+    ("shows", (("/show", "get_show"),
+               ("/shows", "get_shows"),
+               ("/shows/<int:year>", "get_shows_year"),
+               ("/shows/<string:show_date>", "get_shows_date"),
+               ("/shows/<int:year>/<int:month>", "get_shows_year_month"),
+               ("/shows/<int:year>/<int:month>/<int:day>", "get_show_year_month_day"),
+               ("/shows/<int:year>/review", "get_shows_year_review"),
+               ("/shows/<int:year>/all", "get_shows_year_all"),
+               ("/shows/all", "get_shows_all"),
+               ("/shows/browse", "get_shows_browse"),
+               ("/shows/on-this-day", "get_shows_on_this_day"),
+               ("/shows/random", "get_shows_random"),
+               ("/shows/recent", "get_shows_recent"),
+               ("/s/<string:show_date>", "npr_show_redirect"))),
+    ("sitemaps", (("/sitemap.xml", "sitemap_xml"),
+                  ("/sitemap-pages.xml", "sitemap_pages_xml"),
+                  ("/sitemap-guests.xml", "sitemap_guest_xml"),
+                  ("/sitemap-hosts.xml", "sitemap_host_xml"),
+                  ("/sitemap-locations.xml", "sitemap_location_xml"),
+                  ("/sitemap-panelists.xml", "sitemap_panelist_xml"),
+                  ("/sitemap-scorekeepers.xml", "sitemap_scorekeeper_xml"),
+                  ("/sitemap-shows.xml", "sitemap_shows_xml"))),
+])
+#endregion
+
+#region Lazy View Class
+class LazyView:  # pylint: disable=too-few-public-methods
+    """View function that imports its implementation the first time it
+    is called"""
+
+    def __init__(self, import_name: str):
+        self.__module__, self.__name__ = import_name.rsplit(".", 1)
+        self.import_name = import_name
+        self._view = None
+
+    def __call__(self, *args, **kwargs):
+        if self._view is None:
+            self._view = import_string(self.import_name)
+
+        return self._view(*args, **kwargs)
+
+#endregion
+
+#region Blueprint Functions
+def create_blueprint(name: str) -> Blueprint:
+    """Returns a blueprint with lazily loaded views for each of the routes
+    listed for it in BLUEPRINT_ROUTES"""
+    blueprint = Blueprint(name, __name__)
+    for rule, endpoint in BLUEPRINT_ROUTES[name]:
+        blueprint.add_url_rule(rule,
+                               endpoint,
+                               LazyView(f"{__name__}.{name}.{endpoint}"))
+
+    return blueprint
+
+def register_blueprints(app: Flask, preload: bool = False):
+    """Register all blueprints with a Flask application. With preload set,
+    the modules implementing each blueprint are imported immediately
+    instead of on first use."""
+    for name in BLUEPRINT_ROUTES:
+        app.register_blueprint(create_blueprint(name))
+        if preload:
+            importlib.import_module(f"{__name__}.{name}")
+
+#endregion
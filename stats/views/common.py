@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Common functions used by the Stats Page blueprints"""
+
+from collections import OrderedDict
+from typing import Dict, List
+
+from flask import current_app, request
+from wwdtm import show as ww_show
+
+from stats import pagination
+from stats.services import service, service_proxy
+
+#region Shared Objects
+database_connection = service_proxy("database_connection")
+view_model_cache = service_proxy("view_model_cache")
+#endregion
+
+#region Common Functions
+def redirect_url(url: str):
+    """Returns a redirect response for a given URL"""
+
+    # Use a custom response class to force set response headers
+    # and handle the redirect to prevent browsers from caching redirect
+    response = current_app.response_class(response=None,
+                                          status=302,
+                                          mimetype="text/plain")
+
+    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+    response.headers["Pragma"] = "no-cache"
+    response.headers["Expires"] = 0
+    response.headers["Location"] = url
+    return response
+
+def retrieve_show_dates(reverse_order: bool = False):
+    """Retrieve a list of available show dates"""
+    database_connection.reconnect()
+    show_dates = ww_show.info.retrieve_all_dates_tuple(database_connection)
+    if show_dates and reverse_order:
+        show_dates.reverse()
+
+    return show_dates
+
+def retrieve_show_years(reverse_order: bool = True):
+    """Retrieve a list of available show years"""
+    database_connection.reconnect()
+    years = ww_show.info.retrieve_years(database_connection)
+    if years and reverse_order:
+        years.reverse()
+
+    return years
+
+def retrieve_show_years_months(reverse_order: bool = False):
+    """Retrieve a list of available show years and months"""
+    database_connection.reconnect()
+    years_months = ww_show.info.retrieve_all_show_years_months_tuple(database_connection)
+    if years_months and reverse_order:
+        years_months.reverse()
+
+    return years_months
+
+def retrieve_entity_views(entity: str, keys: List, retrieve_details, view) -> List:
+    """Retrieve the view models for a list of slugs or show IDs, built
+    once per data version. Details for the keys without a view model are
+    retrieved together with a single call to retrieve_details, which
+    returns them keyed by slug or show ID."""
+    names = OrderedDict((f"{entity}:{key}", key) for key in keys)
+
+    def build(missing: List[str]) -> Dict:
+        details = retrieve_details([names[name] for name in missing], database_connection)
+        return {name: view(details.get(names[name])) for name in missing}
+
+    return view_model_cache.retrieve_many(list(names), build)
+
+def retrieve_entity_page(entity: str, retrieve_details, view) -> Dict:
+    """Retrieve one page of slugs for an entity using the after and before
+    cursors from the request, along with the view model for each slug.
+    The details for the entries without a view model for the current
+    data version are retrieved with a fixed number of queries for the
+    whole page."""
+    page = pagination.retrieve_slug_page(entity,
+                                         database_connection,
+                                         after=request.args.get("after"),
+                                         before=request.args.get("before"),
+                                         page_size=service("page_size"))
+    page["entries"] = retrieve_entity_views(entity, page["keys"], retrieve_details, view)
+    return page
+
+#endregion
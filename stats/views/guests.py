@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Guest routes for the Stats Page"""
+
+from flask import redirect, render_template, request, url_for
+from slugify import slugify
+from wwdtm import guest as ww_guest
+
+from stats import page_details, random, view_models
+from stats.guests.leaderboard import LEADERBOARD_METRICS
+from stats.services import service_proxy
+from stats.views.common import (database_connection, redirect_url,
+                                retrieve_entity_page)
+
+#region Shared Objects
+guest_leaderboard = service_proxy("guest_leaderboard")
+#endregion
+
+#region Guest Routes
+def get_guest():
+    """Redirect /guest to /guests"""
+    return redirect(url_for("guests.get_guests"), code=301)
+
+def get_guests():
+    """Presents a list of Not My Job guests"""
+    database_connection.reconnect()
+    guests_list = ww_guest.info.retrieve_all(database_connection)
+
+    if not guests_list:
+        return redirect(url_for("index"))
+
+    return render_template("guests/guests.html", guests=guests_list)
+
+def get_guest_details(guest: str):
+    """Presents appearance details for a Not My Job guest"""
+    guest_slug = slugify(guest)
+    if guest and guest != guest_slug:
+        return redirect(url_for("guests.get_guest_details", guest=guest_slug))
+
+    database_connection.reconnect()
+    guest_details = ww_guest.details.retrieve_by_slug(guest_slug,
+                                                      database_connection)
+
+    if not guest_details:
+        return redirect(url_for("guests.get_guests"))
+
+    # Template expects a list of guests(s)
+    guests = []
+    guests.append(view_models.guest_view(guest_details))
+    return render_template("guests/single.html",
+                           guest_name=guest_details["name"],
+                           guests=guests,
+                           standing=guest_leaderboard.standing(guest_details["id"]))
+
+def get_guests_all():
+    """Presents appearance details for all Not My Job guests"""
+    database_connection.reconnect()
+    guests = [view_models.guest_view(guest)
+              for guest in ww_guest.details.retrieve_all(database_connection) or []]
+
+    if not guests:
+        return redirect(url_for("guests.get_guests"))
+
+    return render_template("guests/all.html", guests=guests)
+
+def get_guests_browse():
+    """Presents appearance details for one page of Not My Job guests"""
+    page = retrieve_entity_page("guests",
+                                page_details.retrieve_guest_details,
+                                view_models.guest_view)
+    if not page["entries"]:
+        return redirect(url_for("guests.get_guests"))
+
+    return render_template("guests/all.html",
+                           guests=page["entries"],
+                           page=page)
+
+def get_guests_leaderboard():
+    """Presents the top Not My Job guests by appearances, wins and
+    scoring exceptions, either overall or for a given year"""
+    year = request.args.get("year", type=int)
+    years = guest_leaderboard.years()
+    if year and year not in years:
+        return redirect(url_for("guests.get_guests_leaderboard"))
+
+    leaderboards = {metric: guest_leaderboard.top(metric, year=year)
+                    for metric in LEADERBOARD_METRICS}
+    return render_template("guests/leaderboard.html",
+                           leaderboards=leaderboards,
+                           year=year,
+                           years=years)
+
+def get_guests_random():
+    """Presents a random guest from the database"""
+    database_connection.reconnect()
+    guest_slug = random.random_guest_slug(database_connection)
+
+    return redirect_url(url_for("guests.get_guest_details",
+                                guest=guest_slug
+                               ))
+
+#endregion
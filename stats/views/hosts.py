@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Host routes for the Stats Page"""
+
+from flask import redirect, render_template, url_for
+from slugify import slugify
+from wwdtm import host as ww_host
+
+from stats import page_details, random, view_models
+from stats.views.common import (database_connection, redirect_url,
+                                retrieve_entity_page)
+
+#region Host Routes
+def get_host():
+    """Redirect /host to /hosts"""
+    return redirect(url_for("hosts.get_hosts"), code=301)
+
+def get_hosts():
+    """Presents a list of show hosts"""
+    database_connection.reconnect()
+    hosts_list = ww_host.info.retrieve_all(database_connection)
+
+    if not hosts_list:
+        return redirect(url_for("index"))
+
+    return render_template("hosts/hosts.html", hosts=hosts_list)
+
+def get_host_details(host: str):
+    """Presents appearance details for a show host"""
+    database_connection.reconnect()
+    host_slug = slugify(host)
+    if host and host != host_slug:
+        return redirect(url_for("hosts.get_host_details", host=host_slug))
+
+    host_details = ww_host.details.retrieve_by_slug(host_slug,
+                                                    database_connection)
+
+    if not host_details:
+        return redirect(url_for("hosts.get_hosts"))
+
+    # Template expects a list of hosts(s)
+    hosts = []
+    hosts.append(view_models.host_view(host_details))
+    return render_template("hosts/single.html",
+                           host_name=host_details["name"],
+                           hosts=hosts)
+
+def get_hosts_all():
+    """Presents appearance details for all show hosts"""
+    database_connection.reconnect()
+    hosts = [view_models.host_view(host)
+             for host in ww_host.details.retrieve_all(database_connection) or []]
+
+    if not hosts:
+        return redirect(url_for("hosts.get_hosts"))
+
+    return render_template("hosts/all.html", hosts=hosts)
+
+def get_hosts_browse():
+    """Presents appearance details for one page of hosts"""
+    page = retrieve_entity_page("hosts",
+                                page_details.retrieve_host_details,
+                                view_models.host_view)
+    if not page["entries"]:
+        return redirect(url_for("hosts.get_hosts"))
+
+    return render_template("hosts/all.html",
+                           hosts=page["entries"],
+                           page=page)
+
+def get_hosts_random():
+    """Presents a random host from the database"""
+    database_connection.reconnect()
+    host_slug = random.random_host_slug(database_connection)
+
+    return redirect_url(url_for("hosts.get_host_details",
+                                host=host_slug
+                               ))
+
+#endregion
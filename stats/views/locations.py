@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Location routes for the Stats Page"""
+
+from flask import redirect, render_template, url_for
+from slugify import slugify
+from wwdtm import location as ww_location
+
+from stats import page_details, random, view_models
+from stats.services import service_proxy
+from stats.views.common import (database_connection, redirect_url,
+                                retrieve_entity_page)
+
+#region Shared Objects
+location_index_cache = service_proxy("location_index_cache")
+#endregion
+
+#region Location Routes
+def get_location():
+    """Redirect /location to /locations"""
+    return redirect(url_for("locations.get_locations"), code=301)
+
+def get_locations():
+    """Presents a list of locations"""
+    location_index = location_index_cache.retrieve()
+
+    if not location_index.locations:
+        return redirect(url_for("index"))
+
+    return render_template("locations/locations.html",
+                           locations=location_index.locations)
+
+def get_locations_states():
+    """Presents a list of states with the number of locations and
+    recordings in each state"""
+    location_index = location_index_cache.retrieve()
+
+    if not location_index.states:
+        return redirect(url_for("locations.get_locations"))
+
+    return render_template("locations/states.html",
+                           states=location_index.states)
+
+def get_locations_state(state: str):
+    """Presents locations in a state, grouped by city"""
+    location_index = location_index_cache.retrieve()
+    state_details = location_index.state(state)
+
+    if not state_details:
+        return redirect(url_for("locations.get_locations_states"))
+
+    if state != state_details["slug"]:
+        return redirect(url_for("locations.get_locations_state",
+                                state=state_details["slug"]))
+
+    return render_template("locations/state.html",
+                           state=state_details)
+
+def get_location_details(location: str):
+    """Presents location details and recordings for a location"""
+    database_connection.reconnect()
+    location_slug = slugify(location)
+    if location and location != location_slug:
+        return redirect(url_for("locations.get_location_details",
+                                location=location_slug))
+
+    location_details = ww_location.details.retrieve_recordings_by_slug(location_slug,
+                                                                       database_connection)
+
+    if not location_details:
+        return redirect(url_for("locations.get_locations"))
+
+    # Redirect back to /locations for certain placeholder locations
+    if "id" in location_details and (location_details["id"] == 3 or
+                                     location_details["id"] == 38):
+        return redirect(url_for("locations.get_locations"))
+
+    # Template expects a list of location(s)
+    locations = []
+    locations.append(view_models.location_view(location_details))
+    return render_template("locations/single.html",
+                           locations=locations,
+                           location_name=location_details["display_name"])
+
+def get_locations_all():
+    """Presents location details and recordings for all locations"""
+    database_connection.reconnect()
+    locations = ww_location.details.retrieve_all_recordings(database_connection,
+                                                            sort_by_venue=True)
+
+    if not locations:
+        return redirect(url_for("locations.get_locations"))
+
+    location_index = location_index_cache.retrieve()
+    for location in locations:
+        if location and "id" in location:
+            location["display_name"] = location_index.display_name(location["id"])
+            view_models.location_view(location)
+
+    return render_template("locations/all.html",
+                           locations=locations)
+
+def get_locations_browse():
+    """Presents location details and recordings for one page of
+    locations"""
+    page = retrieve_entity_page("locations",
+                                page_details.retrieve_location_details,
+                                view_models.location_view)
+    if not page["entries"]:
+        return redirect(url_for("locations.get_locations"))
+
+    location_index = location_index_cache.retrieve()
+    for location in page["entries"]:
+        if location and "id" in location:
+            location["display_name"] = location_index.display_name(location["id"])
+
+    return render_template("locations/all.html",
+                           locations=page["entries"],
+                           page=page)
+
+def get_locations_random():
+    """Presents a random location from the database"""
+    database_connection.reconnect()
+    location_slug = random.random_location_slug(database_connection)
+
+    return redirect_url(url_for("locations.get_location_details",
+                                location=location_slug
+                               ))
+
+#endregion
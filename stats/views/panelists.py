@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Panelist routes for the Stats Page"""
+
+from typing import Dict, List
+
+from flask import redirect, render_template, request, url_for
+from slugify import slugify
+from wwdtm import panelist as ww_panelist
+
+from stats import page_details, random, view_models
+from stats.services import service_proxy
+from stats.views.common import (database_connection, redirect_url,
+                                retrieve_entity_page, view_model_cache)
+
+#region Shared Objects
+panelist_comparison_cache = service_proxy("panelist_comparison_cache")
+panelist_milestones_cache = service_proxy("panelist_milestones_cache")
+#endregion
+
+#region Common Functions
+def retrieve_panelists_all_view() -> List[Dict]:
+    """Retrieve statistics and appearance details for all panelists,
+    annotated for rendering"""
+    database_connection.reconnect()
+    panelists = ww_panelist.details.retrieve_all(database_connection)
+    return [view_models.panelist_view(panelist) for panelist in panelists or []]
+
+#endregion
+
+#region Panelist Routes
+def get_panelist():
+    """Redirect /panelist to /panelists"""
+    return redirect(url_for("panelists.get_panelists"), code=301)
+
+def get_panelists():
+    """Presents a list of panelists"""
+    database_connection.reconnect()
+    panelist_list = ww_panelist.info.retrieve_all(database_connection)
+
+    if not panelist_list:
+        return redirect(url_for("index"))
+
+    return render_template("panelists/panelists.html", panelists=panelist_list)
+
+def get_panelist_details(panelist: str):
+    """Presents statistics and appearance details for a panelist"""
+    database_connection.reconnect()
+    panelist_slug = slugify(panelist)
+    if panelist and panelist != panelist_slug:
+        return redirect(url_for("panelists.get_panelist_details",
+                                panelist=panelist_slug))
+
+    panelist_details = ww_panelist.details.retrieve_by_slug(panelist_slug,
+                                                            database_connection)
+
+    if not panelist_details:
+        return redirect(url_for("panelists.get_panelists"))
+
+    # Template expects a list of panelists(s)
+    panelists = []
+    panelists.append(view_models.panelist_view(panelist_details))
+    return render_template("panelists/single.html",
+                           panelist_name=panelist_details["name"],
+                           panelists=panelists,
+                           milestones=panelist_milestones_cache.retrieve(panelist_slug))
+
+def get_panelists_all():
+    """Presents statistics and appearance details for all panelists"""
+    panelists = view_model_cache.retrieve("panelists_all", retrieve_panelists_all_view)
+
+    if not panelists:
+        return redirect(url_for("panelists.get_panelists"))
+
+    return render_template("panelists/all.html", panelists=panelists)
+
+def get_panelists_browse():
+    """Presents statistics and appearance details for one page of
+    panelists"""
+    page = retrieve_entity_page("panelists",
+                                page_details.retrieve_panelist_details,
+                                view_models.panelist_view)
+    if not page["entries"]:
+        return redirect(url_for("panelists.get_panelists"))
+
+    return render_template("panelists/all.html",
+                           panelists=page["entries"],
+                           page=page)
+
+def get_panelists_compare():
+    """Presents head-to-head statistics for two or more panelists"""
+    comparison = panelist_comparison_cache.retrieve()
+    panelist_slugs = [slugify(slug) for slug in request.args.getlist("panelist") if slug]
+
+    results = None
+    if len(panelist_slugs) >= 2:
+        results = comparison.compare(panelist_slugs)
+
+    panelists = sorted(comparison.panelists, key=lambda panelist: panelist["name"])
+    return render_template("panelists/compare.html",
+                           panelists=panelists,
+                           selected=panelist_slugs,
+                           comparison=results)
+
+def get_panelists_random():
+    """Presents a random panelist from the database"""
+    database_connection.reconnect()
+    panelist_slug = random.random_panelist_slug(database_connection)
+
+    return redirect_url(url_for("panelists.get_panelist_details",
+                                panelist=panelist_slug
+                               ))
+
+#endregion
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Scorekeeper routes for the Stats Page"""
+
+from flask import redirect, render_template, url_for
+from slugify import slugify
+from wwdtm import scorekeeper as ww_scorekeeper
+
+from stats import page_details, random, view_models
+from stats.views.common import (database_connection, redirect_url,
+                                retrieve_entity_page)
+
+#region Scorekeeper Routes
+def get_scorekeeper():
+    """Redirect /scorekeeper to /scorekeepers"""
+    return redirect(url_for("scorekeepers.get_scorekeepers"), code=301)
+
+def get_scorekeepers():
+    """Presents a list of scorekeepers"""
+    database_connection.reconnect()
+    scorekeepers_list = ww_scorekeeper.info.retrieve_all(database_connection)
+    if not scorekeepers_list:
+        return redirect(url_for("index"))
+
+    return render_template("scorekeepers/scorekeepers.html",
+                           scorekeepers=scorekeepers_list)
+
+def get_scorekeeper_details(scorekeeper: str):
+    """Presents appearance details for a scorekeeper"""
+    database_connection.reconnect()
+    scorekeeper_slug = slugify(scorekeeper)
+    if scorekeeper and scorekeeper != scorekeeper_slug:
+        return redirect(url_for("scorekeepers.get_scorekeeper_details",
+                                scorekeeper=scorekeeper_slug))
+
+    scorekeeper_details = ww_scorekeeper.details.retrieve_by_slug(scorekeeper_slug,
+                                                                  database_connection)
+
+    if not scorekeeper_details:
+        return redirect(url_for("scorekeepers.get_scorekeepers"))
+
+    # Template expects a list of scorekeepers(s)
+    scorekeepers = []
+    scorekeepers.append(view_models.scorekeeper_view(scorekeeper_details))
+    return render_template("scorekeepers/single.html",
+                           scorekeeper_name=scorekeeper_details["name"],
+                           scorekeepers=scorekeepers)
+
+def get_scorekeepers_all():
+    """Presents appearance details for all scorekeepers"""
+    database_connection.reconnect()
+    scorekeepers = ww_scorekeeper.details.retrieve_all(database_connection)
+    scorekeepers = [view_models.scorekeeper_view(scorekeeper)
+                    for scorekeeper in scorekeepers or []]
+    if not scorekeepers:
+        return redirect(url_for("scorekeepers.get_scorekeepers"))
+
+    return render_template("scorekeepers/all.html", scorekeepers=scorekeepers)
+
+def get_scorekeepers_browse():
+    """Presents appearance details for one page of scorekeepers"""
+    page = retrieve_entity_page("scorekeepers",
+                                page_details.retrieve_scorekeeper_details,
+                                view_models.scorekeeper_view)
+    if not page["entries"]:
+        return redirect(url_for("scorekeepers.get_scorekeepers"))
+
+    return render_template("scorekeepers/all.html",
+                           scorekeepers=page["entries"],
+                           page=page)
+
+def get_scorekeepers_random():
+    """Presents a random scorekeeper from the database"""
+    database_connection.reconnect()
+    scorekeeper_slug = random.random_scorekeeper_slug(database_connection)
+
+    return redirect_url(url_for("scorekeepers.get_scorekeeper_details",
+                                scorekeeper=scorekeeper_slug
+                               ))
+
+#endregion
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Show routes for the Stats Page"""
+
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict
+
+from dateutil import parser
+from flask import redirect, render_template, request, url_for
+from wwdtm import show as ww_show
+
+from stats import page_details, pagination, random, utility, view_models
+from stats.services import service, service_proxy
+from stats.shows import on_this_day
+from stats.views.common import (database_connection, redirect_url,
+                                retrieve_entity_views, retrieve_show_years,
+                                view_model_cache)
+
+#region Shared Objects
+year_in_review_cache = service_proxy("year_in_review_cache")
+#endregion
+
+#region Common Functions
+def retrieve_shows_all_view() -> Dict:
+    """Retrieve details for all shows, grouped by year and annotated for
+    rendering"""
+    show_years = retrieve_show_years(reverse_order=False)
+    show_by_years = OrderedDict()
+    for year in show_years or []:
+        shows = ww_show.details.retrieve_by_year(show_year=year,
+                                                 database_connection=database_connection)
+        show_by_years[year] = view_models.shows_view(shows)
+
+    return show_by_years
+
+#endregion
+
+#region Show Routes
+def get_show():
+    """Redirect /show to /shows"""
+    return redirect(url_for("shows.get_shows"), code=301)
+
+def get_shows():
+    """Presents a list of available show years"""
+    database_connection.reconnect()
+    show_years = retrieve_show_years()
+
+    if not show_years:
+        return redirect(url_for("index"))
+
+    return render_template("shows/shows.html", show_years=show_years)
+
+def get_shows_year(year: int):
+    """Presents a list of available show months for a given year"""
+    database_connection.reconnect()
+    try:
+        date_year = date(year=year, month=1, day=1)
+        show_months = ww_show.info.retrieve_months_by_year(show_year=year,
+                                                           database_connection=database_connection)
+
+        if not show_months:
+            return redirect(url_for("shows.get_shows"))
+
+        months = []
+        for month in show_months:
+            months.append(date(year=year, month=month, day=1))
+
+        return render_template("shows/year.html",
+                               year=date_year,
+                               show_months=months)
+    except ValueError:
+        return redirect(url_for("shows.get_shows"))
+
+def get_shows_date(show_date: str):
+    """Convert an ISO-like date string into a datetime value and
+    redirect the request with the parsed year, month and day"""
+    try:
+        parsed_date = parser.parse(show_date)
+        return redirect(url_for("shows.get_show_year_month_day",
+                                year=parsed_date.year,
+                                month=parsed_date.month,
+                                day=parsed_date.day,
+                                ), code=301)
+    except ValueError:
+        return redirect(url_for("shows.get_shows"))
+
+def get_shows_year_month(year: int, month: int):
+    """Presents a list of available shows for a given year and month"""
+    database_connection.reconnect()
+    try:
+        year_month = date(year=year, month=month, day=1)
+        show_list = ww_show.details.retrieve_by_year_month(show_year=year,
+                                                           show_month=month,
+                                                           database_connection=database_connection)
+        if not show_list:
+            return redirect(url_for("shows.get_shows_year", year=year))
+
+        return render_template("shows/year_month.html",
+                               year_month=year_month,
+                               shows=view_models.shows_view(show_list))
+    except ValueError:
+        return redirect(url_for("shows.get_shows_year", year=year))
+
+def get_show_year_month_day(year: int, month: int, day: int):
+    """Presents show details for a given year, month and day"""
+    database_connection.reconnect()
+    try:
+        show_date = date(year=year, month=month, day=day)
+        details = ww_show.details.retrieve_by_date(show_year=year,
+                                                   show_month=month,
+                                                   show_day=day,
+                                                   database_connection=database_connection)
+        if not details:
+            return redirect(url_for("shows.get_shows_year_month",
+                                    year=year,
+                                    month=month))
+
+        # Template expects a list of show(s)
+        show_list = []
+        show_list.append(details)
+        return render_template("shows/single.html",
+                               show_date=show_date,
+                               shows=view_models.shows_view(show_list))
+    except ValueError:
+        return redirect(url_for("shows.get_shows"))
+
+def get_shows_year_review(year: int):
+    """Presents aggregate statistics for shows in a given year"""
+    try:
+        date_year = date(year=year, month=1, day=1)
+    except ValueError:
+        return redirect(url_for("shows.get_shows"))
+
+    review = year_in_review_cache.retrieve(year)
+    if not review:
+        return redirect(url_for("shows.get_shows_year", year=year))
+
+    for location in review["locations"] or []:
+        view_models.location_view(location)
+
+    return render_template("shows/year_review.html",
+                           year=date_year,
+                           review=review)
+
+def get_shows_year_all(year: int):
+    """Presents details for all shows available for a given year"""
+    database_connection.reconnect()
+    shows_list = ww_show.details.retrieve_by_year(show_year=year,
+                                                  database_connection=database_connection)
+    if not shows_list:
+        return redirect(url_for("shows.get_shows_year", year=year))
+
+    return render_template("shows/year_all.html",
+                           year=year,
+                           shows=view_models.shows_view(shows_list))
+
+def get_shows_all():
+    """Presents details for all shows across all available years"""
+    show_by_years = view_model_cache.retrieve("shows_all", retrieve_shows_all_view)
+
+    if not show_by_years:
+        return redirect(url_for("shows.get_shows"))
+
+    return render_template("shows/all.html",
+                           show_years=list(show_by_years),
+                           shows=show_by_years)
+
+def get_shows_browse():
+    """Presents details for one page of shows, in show date order"""
+    after = request.args.get("after")
+    before = request.args.get("before")
+    after_date = pagination.parse_show_date_cursor(after)
+    before_date = pagination.parse_show_date_cursor(before)
+    if (after and not after_date) or (before and not before_date):
+        return redirect(url_for("shows.get_shows_browse"))
+
+    page = pagination.retrieve_show_page(database_connection,
+                                         after=after_date,
+                                         before=before_date,
+                                         page_size=service("page_size"))
+    shows = retrieve_entity_views("show",
+                                  page["show_ids"],
+                                  page_details.retrieve_show_details,
+                                  view_models.show_view)
+    if not shows:
+        return redirect(url_for("shows.get_shows"))
+
+    return render_template("shows/browse.html",
+                           shows=shows,
+                           page=page)
+
+def get_shows_on_this_day():
+    """Presents details for shows that have aired on this day"""
+    database_connection.reconnect()
+    show_ids = on_this_day.retrieve_on_this_day_show_ids(database_connection)
+
+    show_list = []
+    for show_id in show_ids:
+        show = ww_show.details.retrieve_by_id(show_id=show_id,
+                                              database_connection=database_connection)
+
+        if show:
+            show_list.append(show)
+
+    return render_template("shows/on_this_day.html",
+                           shows=view_models.shows_view(show_list))
+
+def get_shows_random():
+    """Presents a random show from the database"""
+    database_connection.reconnect()
+    show_date = random.random_show_date(database_connection)
+
+    try:
+        parsed_date = parser.parse(show_date)
+        return redirect_url(url_for("shows.get_show_year_month_day",
+                                    year=parsed_date.year,
+                                    month=parsed_date.month,
+                                    day=parsed_date.day,
+                                    ))
+    except ValueError:
+        return redirect(url_for("shows.get_shows"))
+
+def get_shows_recent():
+    """Redirects /shows/recent to / as the index page presents a list
+    of recent show details"""
+    return redirect(url_for("index"))
+
+#endregion
+
+#region NPR Show Redirect Routes
+def npr_show_redirect(show_date: str):
+    """Takes an ISO-like date string and redirects to the appropriate
+    show page on NPR's website."""
+    database_connection.reconnect()
+    show_date_object = utility.date_string_to_date(date_string=show_date)
+
+    if not show_date_object:
+        return redirect(url_for("index"))
+
+    if ww_show.utility.date_exists(show_year=show_date_object.year,
+                                   show_month=show_date_object.month,
+                                   show_day=show_date_object.day,
+                                   database_connection=database_connection):
+        current_url_prefix = "https://www.npr.org/programs/wait-wait-dont-tell-me/archive?date="
+        legacy_url_prefix = "https://legacy.npr.org/programs/waitwait/archrndwn"
+        legacy_url_suffix = ".waitwait.html"
+        if show_date_object >= datetime(year=2006, month=1, day=7):
+            show_date_string = show_date_object.strftime("%m-%d-%Y")
+            url = f"{current_url_prefix}{show_date_string}"
+        else:
+            show_date_string = show_date_object.strftime("%y%m%d")
+            year = show_date_object.strftime("%Y")
+            month = show_date_object.strftime("%b").lower()
+            url = f"{legacy_url_prefix}/{year}/{month}/{show_date_string}{legacy_url_suffix}"
+
+    return redirect(url)
+
+#endregion
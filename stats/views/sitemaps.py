@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018-2021 Linh Pham
+# stats.wwdt.me is relased under the terms of the Apache License 2.0
+"""Sitemap XML routes for the Stats Page"""
+
+from collections import OrderedDict
+
+from flask import render_template, Response
+from wwdtm import (guest as ww_guest, host as ww_host,
+                   location as ww_location, panelist as ww_panelist,
+                   scorekeeper as ww_scorekeeper)
+
+from stats import pagination
+from stats.services import service, service_proxy
+from stats.views.common import (database_connection, retrieve_show_dates,
+                                retrieve_show_years,
+                                retrieve_show_years_months)
+
+#region Shared Objects
+location_index_cache = service_proxy("location_index_cache")
+#endregion
+
+#region Sitemap XML Route
+def sitemap_xml():
+    """Default Sitemap XML"""
+    show_years = retrieve_show_years(reverse_order=False)
+    sitemap = render_template("sitemaps/sitemap.xml",
+                              show_years=show_years)
+    return Response(sitemap, mimetype="text/xml")
+
+def sitemap_pages_xml():
+    """Supplementary Sitemap XML for Paginated Pages"""
+    pages = OrderedDict()
+    for entity in ("guests", "hosts", "locations", "panelists",
+                   "scorekeepers", "shows"):
+        pages[f"{entity}.get_{entity}_browse"] = pagination.retrieve_page_cursors(
+            entity, database_connection, service("page_size"))
+    sitemap = render_template("sitemaps/pages.xml",
+                              pages=pages)
+    return Response(sitemap, mimetype="text/xml")
+
+def sitemap_guest_xml():
+    """Supplementary Sitemap XML for Guest Pages"""
+    database_connection.reconnect()
+    guests = ww_guest.info.retrieve_all(database_connection)
+    sitemap = render_template("sitemaps/guests.xml",
+                              guests=guests)
+    return Response(sitemap, mimetype="text/xml")
+
+def sitemap_host_xml():
+    """Supplementary Sitemap XML for Host Pages"""
+    database_connection.reconnect()
+    hosts = ww_host.info.retrieve_all(database_connection)
+    sitemap = render_template("sitemaps/hosts.xml",
+                              hosts=hosts)
+    return Response(sitemap, mimetype="text/xml")
+
+def sitemap_location_xml():
+    """Supplementary Sitemap XML for Location Pages"""
+    database_connection.reconnect()
+    locations = ww_location.info.retrieve_all(database_connection,
+                                              sort_by_venue=True)
+    sitemap = render_template("sitemaps/locations.xml",
+                              locations=locations,
+                              states=location_index_cache.retrieve().states)
+    return Response(sitemap, mimetype="text/xml")
+
+def sitemap_panelist_xml():
+    """Supplementary Sitemap XML for Panelist Pages"""
+    database_connection.reconnect()
+    panelists = ww_panelist.info.retrieve_all(database_connection)
+    sitemap = render_template("sitemaps/panelists.xml",
+                              panelists=panelists)
+    return Response(sitemap, mimetype="text/xml")
+
+def sitemap_scorekeeper_xml():
+    """Supplementary Sitemap XML for Scorekeeper Pages"""
+    database_connection.reconnect()
+    scorekeepers = ww_scorekeeper.info.retrieve_all(database_connection)
+    sitemap = render_template("sitemaps/scorekeepers.xml",
+                              scorekeepers=scorekeepers)
+    return Response(sitemap, mimetype="text/xml")
+
+def sitemap_shows_xml():
+    """Supplementary Sitemap XML for Show Pages"""
+    show_dates = retrieve_show_dates(reverse_order=False)
+    show_years_months = retrieve_show_years_months(reverse_order=False)
+    sitemap = render_template("sitemaps/shows.xml",
+                              show_dates=show_dates,
+                              show_years_months=show_years_months)
+    return Response(sitemap, mimetype="text/xml")
+
+#endregion